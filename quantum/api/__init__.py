@@ -26,6 +26,7 @@ import webob.exc
 
 from quantum import manager
 from quantum.api import attachments
+from quantum.api import changes
 from quantum.api import networks
 from quantum.api import ports
 from quantum.common import flags
@@ -105,3 +106,15 @@ class APIRouterV11(APIRouter):
     API routes mappings for Quantum API v1.1
     """
     _version = '1.1'
+
+    def _setup_routes(self, mapper, options):
+        super(APIRouterV11, self)._setup_routes(mapper, options)
+        plugin = manager.QuantumManager.get_plugin(options)
+        # The changes feed is only served by plugins keeping a change log
+        if hasattr(plugin, 'get_changes'):
+            mapper.connect("changes",
+                           '/tenants/{tenant_id}/changes{.format}',
+                           controller=changes.create_resource(plugin,
+                                                              self._version),
+                           action="index",
+                           conditions=dict(method=['GET']))
@@ -15,6 +15,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import hashlib
 import logging
 
 from webob import exc
@@ -61,20 +62,10 @@ def create_resource(version, controller_dict):
     xmlns = controller_dict[version][2]
 
     headers_serializer = HeaderSerializer()
-    xml_serializer = wsgi.XMLDictSerializer(metadata, xmlns)
-    json_serializer = wsgi.JSONDictSerializer()
-    xml_deserializer = wsgi.XMLDeserializer(metadata)
-    json_deserializer = wsgi.JSONDeserializer()
-
-    body_serializers = {
-        'application/xml': xml_serializer,
-        'application/json': json_serializer,
-    }
-
-    body_deserializers = {
-        'application/xml': xml_deserializer,
-        'application/json': json_deserializer,
-    }
+    # the body (de)serializers of the metadata are shared by every
+    # resource and version using it
+    body_serializers = wsgi.CONTENT_TYPES.get_serializers(metadata, xmlns)
+    body_deserializers = wsgi.CONTENT_TYPES.get_deserializers(metadata)
 
     serializer = wsgi.ResponseSerializer(body_serializers, headers_serializer)
     deserializer = wsgi.RequestDeserializer(body_deserializers)
@@ -82,6 +73,24 @@ def create_resource(version, controller_dict):
     return wsgi.Resource(controller, deserializer, serializer)
 
 
+def make_etag(revisions, representation=''):
+    """
+    Returns the ETag of a document showing the resources listed in
+    revisions as (id, revision) pairs, or None if the plugin does not
+    report the revision of any of them.
+
+    The ETag is strong, so it also covers the representation of the
+    resources, such as their API version, content type and view.
+    """
+    if not revisions or [revision for _id, revision in revisions
+                         if revision is None]:
+        return None
+    return hashlib.md5(",".join([representation] +
+                                ["%s:%s" % (resource_id, revision)
+                                 for resource_id, revision in revisions])
+                       ).hexdigest()
+
+
 def APIFaultWrapper(errors=None):
 
     def wrapper(func, **kwargs):
@@ -160,3 +169,59 @@ class QuantumController(object):
                 raise exc.HTTPBadRequest(msg)
             data[param_name] = param_value or param.get('default-value')
         return body
+
+    # Views of a single resource, each with its own ETag
+    _etag_views = ('show', 'detail')
+
+    def _etag_representation(self, content_type, view):
+        return "%s;%s;%s" % (self.version, content_type, view)
+
+    def _set_etag(self, request, revisions, view):
+        """ tags the response to request with the ETag of the resources
+            listed in revisions, shown in view, see make_etag
+        """
+        etag = make_etag(revisions, self._etag_representation(
+            request.best_match_content_type(), view))
+        if etag is not None:
+            request.set_response_etag(etag)
+
+    def _check_if_match(self, request, get_revisions):
+        """ fails with 412 Precondition Failed if request is conditional
+            on an ETag other than the current one of the resource, whose
+            revisions are only fetched with get_revisions if needed.
+            The ETag of any representation of the resource matches.
+        """
+        if 'HTTP_IF_MATCH' not in request.environ:
+            return
+        revisions = get_revisions()
+        etags = [make_etag(revisions,
+                           self._etag_representation(content_type, view))
+                 for content_type in wsgi.CONTENT_TYPES.content_types
+                 for view in self._etag_views]
+        if not [etag for etag in etags if (etag or '') in request.if_match]:
+            msg = "The resource was modified since it was last read"
+            LOG.error(msg)
+            raise exc.HTTPPreconditionFailed(msg)
+
+    def _is_bulk_request(self, body):
+        """ tells whether body lists several resources, under the
+            plural of _resource_name, rather than a single one
+        """
+        return isinstance(body, dict) and \
+               "%ss" % self._resource_name in body
+
+    def _prepare_bulk_request_body(self, body, params):
+        """ verifies required parameters for each resource listed in a
+            bulk request body, and sets default values as
+            _prepare_request_body does.
+
+            returns the list of resources found in the request body
+        """
+        items = body["%ss" % self._resource_name]
+        if not isinstance(items, list):
+            raise exc.HTTPBadRequest("'%ss' must be a list of %s objects"\
+                                     % (self._resource_name,
+                                        self._resource_name))
+        return [self._prepare_request_body({self._resource_name: item or {}},
+                                           params)[self._resource_name]
+                for item in items]
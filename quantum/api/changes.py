@@ -0,0 +1,107 @@
+# Copyright 2011 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import logging
+
+from webob import exc
+
+from quantum.api import api_common as common
+from quantum.api import filters
+from quantum.api.views import changes as changes_view
+from quantum.common import exceptions as exception
+
+LOG = logging.getLogger('quantum.api.changes')
+# Longest wait for changes a request may ask for, in seconds
+MAX_WAIT = 60
+
+
+def create_resource(plugin, version):
+    controller_dict = {
+                        '1.1': [ControllerV11(plugin),
+                                ControllerV11._serialization_metadata,
+                                common.XML_NS_V11]}
+    return common.create_resource(version, controller_dict)
+
+
+class Controller(common.QuantumController):
+    """ Changes API controller for Quantum API
+
+        Lists the changes made to the networks and ports of a tenant
+        after a sequence number, so that clients keeping a copy of
+        them only transfer what changed since their last request.
+        The next link of the response asks for the following changes.
+
+        With the wait parameter, a request finding no changes blocks
+        for up to that many seconds until some are made, so that
+        clients learn about them without polling.
+    """
+
+    _serialization_metadata = {
+            "attributes": {
+                "change": ["seq", "resource", "id", "network-id",
+                           "action"]},
+            "plurals": {"changes": "change"}
+    }
+
+    def __init__(self, plugin):
+        self._resource_name = 'change'
+        super(Controller, self).__init__(plugin)
+
+    def _get_int_param(self, request, name, minimum):
+        """ Returns the value of the integer parameter name of the
+            query string of request, or None if it is not specified
+        """
+        if name not in request.GET:
+            return None
+        try:
+            value = int(request.GET[name])
+            if value < minimum:
+                raise ValueError()
+        except ValueError:
+            msg = "%s must be an integer not less than %d" % (name, minimum)
+            LOG.error(msg)
+            raise exc.HTTPBadRequest(msg)
+        return value
+
+    @common.APIFaultWrapper([exception.ChangesExpired])
+    def index(self, request, tenant_id):
+        """ Returns the changes following the since parameter, or only
+            a link to the changes to come if it is not specified.
+            Waits for wait seconds at most if there are none yet.
+        """
+        since = self._get_int_param(request, 'since', 0)
+        limit = self._get_int_param(request, 'limit', 1)
+        wait = self._get_int_param(request, 'wait', 0)
+        changes = self._plugin.get_changes(tenant_id, since, limit)
+        if since is not None and wait and not changes['changes'] and \
+          hasattr(self._plugin, 'wait_changes'):
+            since = changes['last-seq']
+            if self._plugin.wait_changes(tenant_id, since,
+                                         min(wait, MAX_WAIT)):
+                changes = self._plugin.get_changes(tenant_id, since, limit)
+        builder = changes_view.get_view_builder(request)
+        result = [builder.build(change)['change']
+                  for change in changes['changes']]
+        return dict(changes=result,
+                    changes_links=[filters.build_next_link(
+                        request, 'since', changes['last-seq'])])
+
+
+class ControllerV11(Controller):
+    """Changes resources controller for Quantum v1.1 API"""
+
+    def __init__(self, plugin):
+        self.version = "1.1"
+        super(ControllerV11, self).__init__(plugin)
@@ -26,6 +26,8 @@ _PORTNOTFOUND_EXPL = 'Unable to find a port with the specified identifier.'
 _STATEINVALID_EXPL = 'Unable to update port state with specified value.'
 _PORTINUSE_EXPL = 'A resource is currently attached to the logical port'
 _ALREADYATTACHED_EXPL = 'The resource is already attached to another port'
+_CHANGESEXPIRED_EXPL = 'The requested changes are no longer available.'
+_RESOURCEMODIFIED_EXPL = 'The resource was modified since it was read.'
 
 
 class QuantumHTTPError(webob.exc.HTTPClientError):
@@ -60,6 +62,16 @@ class QuantumHTTPError(webob.exc.HTTPClientError):
                 'code': 440,
                 'title': 'alreadyAttached',
                 'explanation': _ALREADYATTACHED_EXPL
+            },
+            exceptions.ChangesExpired: {
+                'code': 410,
+                'title': 'changesExpired',
+                'explanation': _CHANGESEXPIRED_EXPL
+            },
+            exceptions.ResourceModified: {
+                'code': 412,
+                'title': 'resourceModified',
+                'explanation': _RESOURCEMODIFIED_EXPL
             }
     }
 
@@ -0,0 +1,142 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2011 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Filters and pagination for network and port listings.
+
+The options requested by the client are passed to the plugin as the
+filter_opts keyword argument of get_all_networks and get_all_ports.
+The plugin removes from filter_opts the options it applied while
+fetching the resources, and the API applies the remaining ones.
+"""
+
+import logging
+import urllib
+
+from webob import exc
+
+LOG = logging.getLogger('quantum.api.filters')
+
+# API filters, with the key holding their value in the plugin
+# dictionaries and the column they map to in quantum.db.models
+NETWORK_FILTERS = {'name': ('net-name', 'name'),
+                   'op-status': ('net-op-status', 'op_status')}
+PORT_FILTERS = {'state': ('port-state', 'state'),
+                'op-status': ('port-op-status', 'op_status'),
+                'attachment': ('attachment', 'interface_id')}
+PAGINATION_OPTS = ('marker', 'limit')
+
+
+def build_next_link(request, param, value):
+    """
+    Return a link to the next page of the listing served to request,
+    which starts after value of the query string parameter param.
+    """
+    params = request.GET.copy()
+    params[param] = value
+    query = urllib.urlencode([(key, unicode(value).encode('utf-8'))
+                              for key, value in params.items()])
+    return dict(rel='next', href="%s?%s" % (request.path_url, query))
+
+
+def get_filter_opts(request, filters):
+    """
+    Return the filters and pagination options found in the query
+    string of request.
+    """
+    filter_opts = {}
+    for name in list(filters) + list(PAGINATION_OPTS):
+        if name in request.GET:
+            filter_opts[name] = request.GET[name]
+    if 'limit' in filter_opts:
+        try:
+            filter_opts['limit'] = int(filter_opts['limit'])
+            if filter_opts['limit'] < 1:
+                raise ValueError()
+        except ValueError:
+            msg = "limit must be a positive integer"
+            LOG.error(msg)
+            raise exc.HTTPBadRequest(msg)
+    return filter_opts
+
+
+def pop_db_filters(filter_opts, filters):
+    """
+    Remove from filter_opts the options that db.api.network_list or
+    db.api.port_list can apply, and return them as keyword arguments
+    for those calls.
+
+    Only the filters listed in filters are pushed down. Pagination is
+    pushed down along with all of the filters only, as it must apply to
+    filtered resources.
+    """
+    kwargs = {}
+    for name in filters:
+        if name in filter_opts:
+            kwargs[filters[name][1]] = filter_opts.pop(name)
+    if not [name for name in filter_opts if name not in PAGINATION_OPTS]:
+        for name in PAGINATION_OPTS:
+            if name in filter_opts:
+                kwargs[name] = filter_opts.pop(name)
+    return kwargs
+
+
+def _filter(items, filters, filter_opts, get_details):
+    matches = [(filters[name][0], filter_opts[name])
+               for name in filters if name in filter_opts]
+    if not matches:
+        return items
+    result = []
+    for item in items:
+        if [key for key, _value in matches if key not in item]:
+            item = get_details(item)
+        if not [key for key, value in matches if item.get(key) != value]:
+            result.append(item)
+    return result
+
+
+def _paginate(items, id_key, filter_opts):
+    marker = filter_opts.get('marker')
+    limit = filter_opts.get('limit')
+    if marker is None and limit is None:
+        return items
+    items = sorted(items, key=lambda item: item[id_key])
+    if marker is not None:
+        items = [item for item in items if item[id_key] > marker]
+    return items[:limit]
+
+
+def filter_networks(networks, plugin, tenant_id, filter_opts):
+    """
+    Apply to networks, as returned by the plugin, the options left in
+    filter_opts.
+    """
+    networks = _filter(networks, NETWORK_FILTERS, filter_opts,
+                       lambda net: plugin.get_network_details(
+                                      tenant_id, net['net-id']))
+    return _paginate(networks, 'net-id', filter_opts)
+
+
+def filter_ports(ports, plugin, tenant_id, network_id, filter_opts):
+    """
+    Apply to ports, as returned by the plugin, the options left in
+    filter_opts.
+    """
+    ports = _filter(ports, PORT_FILTERS, filter_opts,
+                    lambda port: plugin.get_port_details(
+                                    tenant_id, network_id, port['port-id']))
+    return _paginate(ports, 'port-id', filter_opts)
@@ -0,0 +1,65 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2011 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import webob.dec
+
+from quantum.common import utils
+from quantum.db import api as db
+from quantum import wsgi
+
+# Request header asking for reads from the primary database
+READ_PRIMARY_HEADER = 'X-Quantum-Read-Primary'
+
+
+class _ErrorResponse(Exception):
+    """Carries an error response out of the unit of work it rolls back"""
+
+    def __init__(self, response):
+        super(_ErrorResponse, self).__init__()
+        self.response = response
+
+
+class UnitOfWorkMiddleware(wsgi.Middleware):
+    """
+    Serves each API request within a single unit of work, which is
+    rolled back if the response is an error, as the faults raised by
+    the controllers are turned into responses before reaching here.
+
+    GET and HEAD requests, which only read, are served from a read
+    replica unless they carry the X-Quantum-Read-Primary header, for
+    clients which must read their own writes.
+    """
+
+    @classmethod
+    def factory(cls, global_config, **local_config):
+        """Paste factory."""
+        def _factory(app):
+            return cls(app)
+        return _factory
+
+    @webob.dec.wsgify
+    def __call__(self, req):
+        read_only = req.method in ('GET', 'HEAD') and \
+          not utils.bool_from_string(req.headers.get(READ_PRIMARY_HEADER))
+        try:
+            with db.unit_of_work(read_only=read_only):
+                response = req.get_response(self.application)
+                if response.status_int >= 400:
+                    raise _ErrorResponse(response)
+                return response
+        except _ErrorResponse, e:
+            return e.response
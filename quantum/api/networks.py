@@ -19,6 +19,7 @@ from webob import exc
 
 from quantum.api import api_common as common
 from quantum.api import faults
+from quantum.api import filters
 from quantum.api.views import networks as networks_view
 from quantum.common import exceptions as exception
 
@@ -47,29 +48,72 @@ class Controller(common.QuantumController):
         self._resource_name = 'network'
         super(Controller, self).__init__(plugin)
 
+    def _network_data(self, tenant_id, network_id):
+        """ Returns a network along with the details of its ports """
+        if hasattr(self._plugin, 'get_network_with_ports'):
+            # fetch the network and the details of its ports at once
+            network = self._plugin.get_network_with_ports(
+                                tenant_id, network_id)
+            ports_data = network.get('net-ports', [])
+        else:
+            # We expect get_network_details to return information
+            # concerning logical ports as well.
+            network = self._plugin.get_network_details(
+                                tenant_id, network_id)
+            port_list = self._plugin.get_all_ports(
+                                tenant_id, network_id)
+            ports_data = [self._plugin.get_port_details(
+                                       tenant_id, network_id, port['port-id'])
+                          for port in port_list]
+        return network, ports_data
+
+    def _revisions(self, network, ports_data):
+        """ The ETag of a network covers its ports, even in the views
+            which do not show them
+        """
+        return [(network['net-id'], network.get('net-revision'))] + \
+               [(port['port-id'], port.get('port-revision'))
+                for port in ports_data]
+
+    def _check_network_if_match(self, request, tenant_id, network_id):
+        self._check_if_match(request,
+                             lambda: self._revisions(*self._network_data(
+                                 tenant_id, network_id)))
+
     def _item(self, request, tenant_id, network_id,
               net_details=True, port_details=False):
-        # We expect get_network_details to return information
-        # concerning logical ports as well.
-        network = self._plugin.get_network_details(
-                            tenant_id, network_id)
-        port_list = self._plugin.get_all_ports(
-                            tenant_id, network_id)
-        ports_data = [self._plugin.get_port_details(
-                                   tenant_id, network_id, port['port-id'])
-                      for port in port_list]
+        network, ports_data = self._network_data(tenant_id, network_id)
+        self._set_etag(request, self._revisions(network, ports_data),
+                       port_details and 'detail' or 'show')
         builder = networks_view.get_view_builder(request, self.version)
         result = builder.build(network, net_details,
                                ports_data, port_details)['network']
         return dict(network=result)
 
+    def _get_filter_opts(self, request):
+        """ Filters and pagination are not available in this version """
+        return {}
+
     def _items(self, request, tenant_id, net_details=False):
         """ Returns a list of networks. """
-        networks = self._plugin.get_all_networks(tenant_id)
+        filter_opts = self._get_filter_opts(request)
+        limit = filter_opts.get('limit')
+        if filter_opts:
+            networks = self._plugin.get_all_networks(tenant_id,
+                                                     filter_opts=filter_opts)
+            networks = filters.filter_networks(networks, self._plugin,
+                                               tenant_id, filter_opts)
+        else:
+            networks = self._plugin.get_all_networks(tenant_id)
         builder = networks_view.get_view_builder(request, self.version)
         result = [builder.build(network, net_details)['network']
                   for network in networks]
-        return dict(networks=result)
+        response = dict(networks=result)
+        if limit is not None and len(networks) == limit:
+            response['networks_links'] = [
+                filters.build_next_link(request, 'marker',
+                                        networks[-1]['net-id'])]
+        return response
 
     @common.APIFaultWrapper()
     def index(self, request, tenant_id):
@@ -106,6 +150,8 @@ class Controller(common.QuantumController):
         # actual plugin will want to parse.  We could just pass only
         # request_params but that would mean all the plugins would need to
         # change.
+        if self._is_bulk_request(body):
+            return self._create_bulk(request, tenant_id, body)
         body = self._prepare_request_body(body, self._network_ops_param_list)
         network = self._plugin.\
                    create_network(tenant_id,
@@ -115,16 +161,37 @@ class Controller(common.QuantumController):
         result = builder.build(network)['network']
         return dict(network=result)
 
-    @common.APIFaultWrapper([exception.NetworkNotFound])
+    def _create_bulk(self, request, tenant_id, body):
+        """ Creates several networks for a given tenant at once """
+        items = self._prepare_bulk_request_body(body,
+                                                self._network_ops_param_list)
+        names = [item['name'] for item in items]
+        if hasattr(self._plugin, 'create_networks_bulk'):
+            networks = self._plugin.create_networks_bulk(tenant_id, names)
+        else:
+            networks = [self._plugin.create_network(tenant_id,
+                                                    item['name'],
+                                                    network=item)
+                        for item in items]
+        builder = networks_view.get_view_builder(request, self.version)
+        result = [builder.build(network)['network']
+                  for network in networks]
+        return dict(networks=result)
+
+    @common.APIFaultWrapper([exception.NetworkNotFound,
+                             exception.ResourceModified])
     def update(self, request, tenant_id, id, body):
         """ Updates the name for the network with the given id """
         body = self._prepare_request_body(body, self._network_ops_param_list)
+        self._check_network_if_match(request, tenant_id, id)
         self._plugin.update_network(tenant_id, id, **body['network'])
 
     @common.APIFaultWrapper([exception.NetworkNotFound,
-                             exception.NetworkInUse])
+                             exception.NetworkInUse,
+                             exception.ResourceModified])
     def delete(self, request, tenant_id, id):
         """ Destroys the network with the given id """
+        self._check_network_if_match(request, tenant_id, id)
         self._plugin.delete_network(tenant_id, id)
 
 
@@ -148,10 +215,9 @@ class ControllerV10(Controller):
 class ControllerV11(Controller):
     """Network resources controller for Quantum v1.1 API
 
-       Note: at this state this class only adds serialization
-       metadata for the operational status concept.
-       API filters, pagination, and atom links will be handled by
-       this class as well.
+       Note: this class adds serialization metadata for the
+       operational status concept, and handles filters and
+       pagination for network listings.
     """
 
     _serialization_metadata = {
@@ -166,3 +232,6 @@ class ControllerV11(Controller):
     def __init__(self, plugin):
         self.version = "1.1"
         super(ControllerV11, self).__init__(plugin)
+
+    def _get_filter_opts(self, request):
+        return filters.get_filter_opts(request, filters.NETWORK_FILTERS)
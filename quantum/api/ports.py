@@ -16,6 +16,7 @@
 import logging
 
 from quantum.api import api_common as common
+from quantum.api import filters
 from quantum.api.views import ports as ports_view
 from quantum.common import exceptions as exception
 
@@ -46,29 +47,66 @@ class Controller(common.QuantumController):
         self._resource_name = 'port'
         super(Controller, self).__init__(plugin)
 
+    def _get_filter_opts(self, request):
+        """ Filters and pagination are not available in this version """
+        return {}
+
+    def _revisions(self, port):
+        return [(port['port-id'], port.get('port-revision'))]
+
+    def _check_port_if_match(self, request, tenant_id, network_id, port_id):
+        self._check_if_match(request,
+                             lambda: self._revisions(
+                                 self._plugin.get_port_details(
+                                     tenant_id, network_id, port_id)))
+
     def _items(self, request, tenant_id, network_id,
                port_details=False):
         """ Returns a list of ports. """
-        port_list = self._plugin.get_all_ports(tenant_id, network_id)
+        filter_opts = self._get_filter_opts(request)
+        limit = filter_opts.get('limit')
+        detailed = False
+        if filter_opts:
+            port_list = self._plugin.get_all_ports(tenant_id, network_id,
+                                                   filter_opts=filter_opts)
+            port_list = filters.filter_ports(port_list, self._plugin,
+                                             tenant_id, network_id,
+                                             filter_opts)
+        elif port_details and \
+             hasattr(self._plugin, 'get_network_with_ports'):
+            # fetch the details of every port at once
+            network = self._plugin.get_network_with_ports(tenant_id,
+                                                          network_id)
+            port_list = network.get('net-ports', [])
+            detailed = True
+        else:
+            port_list = self._plugin.get_all_ports(tenant_id, network_id)
         builder = ports_view.get_view_builder(request, self.version)
 
-        # Load extra data for ports if required.
-        if port_details:
-            port_list_detail = \
-                [self._plugin.get_port_details(
-                            tenant_id, network_id, port['port-id'])
-                  for port in port_list]
-            port_list = port_list_detail
+        # Load extra data for ports if required, unless the filters
+        # already fetched it to match the ports
+        if port_details and not detailed:
+            port_list = [port if 'port-state' in port else
+                         self._plugin.get_port_details(
+                             tenant_id, network_id, port['port-id'])
+                         for port in port_list]
 
         result = [builder.build(port, port_details)['port']
                   for port in port_list]
-        return dict(ports=result)
+        response = dict(ports=result)
+        if limit is not None and len(port_list) == limit:
+            response['ports_links'] = [
+                filters.build_next_link(request, 'marker',
+                                        port_list[-1]['port-id'])]
+        return response
 
     def _item(self, request, tenant_id, network_id, port_id,
               att_details=False):
         """ Returns a specific port. """
         port = self._plugin.get_port_details(
                         tenant_id, network_id, port_id)
+        self._set_etag(request, self._revisions(port),
+                       att_details and 'detail' or 'show')
         builder = ports_view.get_view_builder(request, self.version)
         result = builder.build(port, port_details=True,
                                att_details=att_details)['port']
@@ -107,6 +145,8 @@ class Controller(common.QuantumController):
             The request body is optional for a port object.
 
         """
+        if self._is_bulk_request(body):
+            return self._create_bulk(request, tenant_id, network_id, body)
         body = self._prepare_request_body(body, self._port_ops_param_list)
         port = self._plugin.create_port(tenant_id,
                                         network_id, body['port']['state'],
@@ -115,19 +155,39 @@ class Controller(common.QuantumController):
         result = builder.build(port)['port']
         return dict(port=result)
 
+    def _create_bulk(self, request, tenant_id, network_id, body):
+        """ Creates several ports for a given network at once """
+        items = self._prepare_bulk_request_body(body,
+                                                self._port_ops_param_list)
+        states = [item['state'] for item in items]
+        if hasattr(self._plugin, 'create_ports_bulk'):
+            ports = self._plugin.create_ports_bulk(tenant_id, network_id,
+                                                   states)
+        else:
+            ports = [self._plugin.create_port(tenant_id, network_id,
+                                              item['state'], port=item)
+                     for item in items]
+        builder = ports_view.get_view_builder(request, self.version)
+        result = [builder.build(port)['port'] for port in ports]
+        return dict(ports=result)
+
     @common.APIFaultWrapper([exception.NetworkNotFound,
                              exception.PortNotFound,
-                             exception.StateInvalid])
+                             exception.StateInvalid,
+                             exception.ResourceModified])
     def update(self, request, tenant_id, network_id, id, body):
         """ Updates the state of a port for a given network """
         body = self._prepare_request_body(body, self._port_ops_param_list)
+        self._check_port_if_match(request, tenant_id, network_id, id)
         self._plugin.update_port(tenant_id, network_id, id, **body['port'])
 
     @common.APIFaultWrapper([exception.NetworkNotFound,
                              exception.PortNotFound,
-                             exception.PortInUse])
+                             exception.PortInUse,
+                             exception.ResourceModified])
     def delete(self, request, tenant_id, network_id, id):
         """ Destroys the port with the given id """
+        self._check_port_if_match(request, tenant_id, network_id, id)
         self._plugin.delete_port(tenant_id, network_id, id)
 
 
@@ -159,3 +219,6 @@ class ControllerV11(Controller):
     def __init__(self, plugin):
         self.version = "1.1"
         super(ControllerV11, self).__init__(plugin)
+
+    def _get_filter_opts(self, request):
+        return filters.get_filter_opts(request, filters.PORT_FILTERS)
@@ -26,6 +26,15 @@ LOG = logging.getLogger('quantum.api.versions')
 
 class Versions(wsgi.Application):
 
+    _serialization_metadata = {
+        "application/xml": {
+            "attributes": {
+                "version": ["status", "id"],
+                "link": ["rel", "href"],
+            }
+        }
+    }
+
     @webob.dec.wsgify(RequestClass=wsgi.Request)
     def __call__(self, req):
         """Respond to a request for all Quantum API versions."""
@@ -43,18 +52,10 @@ class Versions(wsgi.Application):
         builder = versions_view.get_view_builder(req)
         versions = [builder.build(version) for version in version_objs]
         response = dict(versions=versions)
-        metadata = {
-            "application/xml": {
-                "attributes": {
-                    "version": ["status", "id"],
-                    "link": ["rel", "href"],
-                }
-            }
-        }
 
         content_type = req.best_match_content_type()
-        body = wsgi.Serializer(metadata=metadata). \
-                    serialize(response, content_type)
+        body = wsgi.CONTENT_TYPES.get_legacy_serializer(
+            self._serialization_metadata).serialize(response, content_type)
 
         response = webob.Response()
         response.content_type = content_type
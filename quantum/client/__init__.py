@@ -50,11 +50,11 @@ class ApiCall(object):
             (format, tenant) = (instance.format, instance.tenant)
 
             if 'format' in kwargs:
-                instance.format = kwargs['format']
+                instance.format = kwargs.pop('format')
             if 'tenant' in kwargs:
-                instance.tenant = kwargs['tenant']
+                instance.tenant = kwargs.pop('tenant')
 
-            ret = self.function(instance, *args)
+            ret = self.function(instance, *args, **kwargs)
             (instance.format, instance.tenant) = (format, tenant)
             return ret
         return with_params
@@ -160,7 +160,7 @@ class Client(object):
         action = self.action_prefix + action
         action = action.replace('{tenant_id}', self.tenant)
 
-        if isinstance(params, dict):
+        if isinstance(params, dict) and params:
             action += '?' + urllib.urlencode(params)
         if body:
             body = self.serialize(body)
@@ -251,11 +251,14 @@ class Client(object):
         return "application/%s" % (format)
 
     @ApiCall
-    def list_networks(self):
+    def list_networks(self, **filter_opts):
         """
         Fetches a list of all networks for a tenant
+
+        With API v1.1, networks can be filtered by name and op-status,
+        and paged through with marker and limit
         """
-        return self.do_request("GET", self.networks_path)
+        return self.do_request("GET", self.networks_path, params=filter_opts)
 
     @ApiCall
     def show_network_details(self, network):
@@ -289,11 +292,15 @@ class Client(object):
                                         exception_args={"net_id": network})
 
     @ApiCall
-    def list_ports(self, network):
+    def list_ports(self, network, **filter_opts):
         """
         Fetches a list of ports on a given network
+
+        With API v1.1, ports can be filtered by state, op-status and
+        attachment, and paged through with marker and limit
         """
-        return self.do_request("GET", self.ports_path % (network))
+        return self.do_request("GET", self.ports_path % (network),
+                               params=filter_opts)
 
     @ApiCall
     def show_port_details(self, network, port):
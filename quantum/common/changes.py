@@ -0,0 +1,54 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2011 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Actions of the change log, and notification of its new entries"""
+
+import eventlet
+from eventlet import event as green_event
+
+# Actions recorded in the change log
+CHANGE_CREATE = 'create'
+CHANGE_UPDATE = 'update'
+CHANGE_DELETE = 'delete'
+
+
+class ChangeNotifier(object):
+    """
+    Wakes the greenthreads waiting for new entries of a change log.
+
+    Notifications are counted: waiters read the count before reading
+    the log, and do not miss one sent in between.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self._event = green_event.Event()
+
+    def notify(self):
+        self.count += 1
+        event, self._event = self._event, green_event.Event()
+        event.send()
+
+    def wait(self, count, timeout):
+        """
+        Wait up to timeout seconds for a notification following count,
+        return whether one was sent.
+        """
+        if self.count == count:
+            with eventlet.Timeout(timeout, False):
+                self._event.wait()
+        return self.count != count
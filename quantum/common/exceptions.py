@@ -111,6 +111,16 @@ class AlreadyAttached(QuantumException):
                 "already plugged into port %(att_port_id)s")
 
 
+class ChangesExpired(QuantumException):
+    message = _("The changes following sequence number %(since)s are no "
+                "longer available")
+
+
+class ResourceModified(QuantumException):
+    message = _("The %(resource)s %(resource_id)s was modified since it "
+                "was read")
+
+
 # NOTE: on the client side, we often do not know all of the information
 # that is known on the server, thus, we create separate exception for
 # those scenarios
@@ -93,6 +93,86 @@ def dumps(value):
     return json.dumps(to_primitive(value))
 
 
+def _json_default(value):
+    """Convert to primitives the values json can not encode itself"""
+    primitive = to_primitive(value)
+    if primitive is value:
+        raise TypeError("%r is not JSON serializable" % value)
+    return primitive
+
+
+# Encoder of the streamed documents, json.dumps builds one per call
+# when given a default
+_ENCODER = json.JSONEncoder(default=_json_default)
+
+
+def iter_chunks(parts, chunk_size):
+    """Join the strings of parts into strings of about chunk_size"""
+    chunk = []
+    size = 0
+    for part in parts:
+        chunk.append(part)
+        size += len(part)
+        if size >= chunk_size:
+            yield ''.join(chunk)
+            chunk = []
+            size = 0
+    if chunk:
+        yield ''.join(chunk)
+
+
+class JSONPlan(object):
+    """
+    Streaming JSON serialization compiled once from the plurals of
+    serialization metadata: the lists named by them, in the document
+    and in its members, are written a batch of items at a time, and
+    anything else by a single encoder call. The output is the one of
+    dumps.
+    """
+
+    # Items of the lists encoded by a single encoder call
+    batch_size = 100
+
+    def __init__(self, plurals=()):
+        self._prefixes = dict((key, _ENCODER.encode(key) + ': ')
+                              for key in plurals)
+
+    def _prefix(self, key):
+        prefix = self._prefixes.get(key)
+        if prefix is None:
+            prefix = _ENCODER.encode(key) + ': '
+        return prefix
+
+    def _iterencode(self, value, depth):
+        if not (isinstance(value, dict) and
+                all(isinstance(key, basestring) for key in value)):
+            yield _ENCODER.encode(value)
+            return
+        yield '{'
+        for index, (key, item) in enumerate(value.iteritems()):
+            if index:
+                yield ', '
+            yield self._prefix(key)
+            if key in self._prefixes and isinstance(item, (list, tuple)):
+                yield '['
+                for start in xrange(0, len(item), self.batch_size):
+                    if start:
+                        yield ', '
+                    batch = item[start:start + self.batch_size]
+                    yield _ENCODER.encode(batch)[1:-1]
+                yield ']'
+            elif depth:
+                for part in self._iterencode(item, depth - 1):
+                    yield part
+            else:
+                yield _ENCODER.encode(item)
+        yield '}'
+
+    def iter_encode(self, value, chunk_size=65536):
+        """Encode value into strings of about chunk_size"""
+        return iter_chunks(self._iterencode(value, 1), chunk_size)
+
+
 def loads(s):
     return json.loads(s)
 
@@ -0,0 +1,126 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2011 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Incremental XML reader for the deserializers.
+
+Documents are converted to dictionaries while expat parses them, as
+the deserializers used to convert minidom documents: elements are
+named by their qualified names, namespace declarations are reported
+as xmlns attributes, and no document is built.
+"""
+
+from xml.parsers import expat
+
+# Separates the namespace, local name and prefix of names reported by
+# expat, as in xml.dom.expatbuilder
+_SEPARATOR = " "
+
+
+def _qname(name):
+    parts = name.split(_SEPARATOR)
+    if len(parts) == 3:
+        return "%s:%s" % (parts[2], parts[1])
+    return parts[-1]
+
+
+class _Reader(object):
+
+    def __init__(self, listnames, link_name):
+        self.listnames = listnames
+        self.link_name = link_name
+        # [name, attributes, children] of the open elements, children
+        # are text strings or (name, value, attributes) tuples
+        self.stack = []
+        self.declarations = {}
+        self.result = None
+
+    def start_namespace(self, prefix, uri):
+        # declarations are reported before the element declaring them
+        if prefix:
+            self.declarations["xmlns:%s" % prefix] = uri or ""
+        else:
+            self.declarations["xmlns"] = uri or ""
+
+    def start_element(self, name, attributes):
+        attrs = self.declarations
+        self.declarations = {}
+        for key, value in attributes.iteritems():
+            attrs[_qname(key)] = value
+        self.stack.append([_qname(name), attrs, []])
+
+    def character_data(self, data):
+        if not self.stack:
+            return
+        children = self.stack[-1][2]
+        if children and isinstance(children[-1], basestring):
+            children[-1] += data
+        else:
+            children.append(data)
+
+    def end_element(self, name):
+        name, attrs, children = self.stack.pop()
+        if self.stack:
+            self.stack[-1][2].append((name, self._value(name, attrs,
+                                                        children), attrs))
+            return
+        links = []
+        if self.link_name:
+            links = [child[2] for child in children
+                     if not isinstance(child, basestring) and
+                     child[0] == self.link_name]
+            children = [child for child in children
+                        if isinstance(child, basestring) or
+                        child[0] != self.link_name]
+        self.result = (name, self._value(name, attrs, children), links)
+
+    def _value(self, name, attrs, children):
+        if len(children) == 1 and isinstance(children[0], basestring):
+            return children[0]
+        elif name in self.listnames:
+            return [child[1] for child in children
+                    if not isinstance(child, basestring)]
+        result = dict(attrs)
+        for child in children:
+            if not isinstance(child, basestring):
+                result[child[0]] = child[1]
+        return result
+
+
+def parse(datastring, listnames, link_name=None):
+    """
+    Parse datastring, and return the name of its root element, its
+    value and its links.
+
+    An element holding a single text is valued by it, one named in
+    listnames by the list of the values of its children, and any
+    other by a dict of its attributes and of the values of its
+    children. The attributes of the children of the root named
+    link_name are returned as its links instead.
+
+    Raises expat.ExpatError if datastring is not well-formed.
+    """
+    reader = _Reader(listnames, link_name)
+    parser = expat.ParserCreate(namespace_separator=_SEPARATOR)
+    parser.namespace_prefixes = True
+    parser.buffer_text = True
+    parser.StartNamespaceDeclHandler = reader.start_namespace
+    parser.StartElementHandler = reader.start_element
+    parser.EndElementHandler = reader.end_element
+    parser.CharacterDataHandler = reader.character_data
+    parser.Parse(datastring, True)
+    return reader.result
@@ -0,0 +1,221 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2011 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Incremental XML writer for the serializers.
+
+Dictionaries are written as the strings minidom would output for the
+documents the serializers used to build from them and their
+serialization metadata, without building any document: attributes are
+sorted, values are escaped as minidom escapes them, and elements with
+no children are closed with "/>".
+"""
+
+
+def escape(data):
+    """Escape text or an attribute value as minidom does."""
+    return data.replace("&", "&amp;").replace("<", "&lt;").\
+      replace("\"", "&quot;").replace(">", "&gt;")
+
+
+def _tag(nodename, attrs, has_children):
+    parts = ["<" + nodename]
+    for name in sorted(attrs):
+        parts.append(" %s=\"" % name)
+        value = attrs[name]
+        # like minidom, empty values do not make the output unicode
+        if value:
+            parts.append(escape(value))
+        parts.append("\"")
+    parts.append(has_children and ">" or "/>")
+    return "".join(parts)
+
+
+def iter_empty_element(nodename, attrs):
+    """Yield the XML of element nodename, with attrs and no children."""
+    yield _tag(nodename, attrs, False)
+
+
+def _text_element(nodename, attrs, text):
+    parts = [_tag(nodename, attrs, True)]
+    if text:
+        parts.append(escape(text))
+    parts.append("</%s>" % nodename)
+    return "".join(parts)
+
+
+class Plan(object):
+    """
+    Serialization metadata compiled once, for writing any number of
+    documents: the attributes of each element, the singular names of
+    plurals and the xmlns attribute are looked up once, and elements
+    are written through a single list instead of nested generators.
+    """
+
+    def __init__(self, metadata):
+        xmlns = metadata.get('xmlns', None)
+        self._xmlns = xmlns or None
+        self._xmlns_attr = xmlns and " xmlns=\"%s\"" % escape(xmlns) or ""
+        self._attributes = {}
+        for nodename, names in metadata.get('attributes', {}).items():
+            # names given as a single string are matched as they were
+            if not isinstance(names, basestring):
+                names = frozenset(names)
+            self._attributes[nodename] = names
+        self._singulars = dict(metadata.get('plurals', {}))
+        self._list_collections = metadata.get('list_collections', {})
+        self._dict_collections = metadata.get('dict_collections', {})
+
+    def _singular(self, nodename):
+        singular = self._singulars.get(nodename, None)
+        if singular is None:
+            if nodename.endswith('s'):
+                singular = nodename[:-1]
+            else:
+                singular = 'item'
+        return singular
+
+    def _members(self, attrs, nodename, data):
+        """
+        Add the attributes of element nodename for dict data to attrs,
+        and return the (name, value) pairs of its children.
+        """
+        attr_names = self._attributes.get(nodename, ())
+        children = []
+        for key, value in data.items():
+            if key in attr_names:
+                attrs[key] = str(value)
+            else:
+                children.append((key, value))
+        return children
+
+    def _content(self, nodename, data):
+        """
+        Return the attributes of element nodename for data, and the
+        strings of its children if it is a collection, or else the
+        (name, value) pairs of its children, or its text.
+        """
+        attrs = {}
+        if self._xmlns:
+            attrs['xmlns'] = self._xmlns
+        #TODO(bcwaldon): accomplish this without a type-check
+        if isinstance(data, list):
+            if nodename in self._list_collections:
+                metadata = self._list_collections[nodename]
+                return attrs, [_tag(metadata['item_name'],
+                                    {metadata['item_key']: str(item)},
+                                    False)
+                               for item in data], None
+            singular = self._singular(nodename)
+            return attrs, None, [(singular, item) for item in data]
+        #TODO(bcwaldon): accomplish this without a type-check
+        elif isinstance(data, dict):
+            if nodename in self._dict_collections:
+                metadata = self._dict_collections[nodename]
+                return attrs, [_text_element(metadata['item_name'],
+                                             {metadata['item_key']: str(key)},
+                                             str(value))
+                               for key, value in data.items()], None
+            return attrs, None, self._members(attrs, nodename, data)
+        # Type is atom, always written as a text node
+        return attrs, None, str(data)
+
+    def _write(self, write, nodename, data):
+        """Write the XML of element nodename for data."""
+        if isinstance(data, list) and nodename not in self._list_collections:
+            # the only attribute of lists is xmlns
+            if not data:
+                write("<" + nodename + self._xmlns_attr + "/>")
+                return
+            write("<" + nodename + self._xmlns_attr + ">")
+            singular = self._singular(nodename)
+            for item in data:
+                self._write(write, singular, item)
+            write("</%s>" % nodename)
+        elif isinstance(data, dict) and nodename not in self._dict_collections:
+            attrs = {}
+            if self._xmlns:
+                attrs['xmlns'] = self._xmlns
+            children = self._members(attrs, nodename, data)
+            write(_tag(nodename, attrs, bool(children)))
+            if not children:
+                return
+            for key, value in children:
+                self._write(write, key, value)
+            write("</%s>" % nodename)
+        elif isinstance(data, (list, dict)):
+            # list and dict collections
+            attrs, strings, _children = self._content(nodename, data)
+            write(_tag(nodename, attrs, bool(strings)))
+            if strings:
+                write("".join(strings))
+                write("</%s>" % nodename)
+        else:
+            write("<" + nodename + self._xmlns_attr + ">")
+            text = str(data)
+            if text:
+                write(escape(text))
+            write("</%s>" % nodename)
+
+    def _iter_children(self, children):
+        for nodename, data in children:
+            parts = []
+            self._write(parts.append, nodename, data)
+            yield "".join(parts)
+
+    def iter_element(self, nodename, data, attrs=None, default_attrs=None,
+                     tail=None):
+        """
+        Yield the XML of element nodename for data, as a string per
+        child. attrs are added to the attributes of the element,
+        default_attrs only if the element has no value for them, and
+        the strings of tail are written after its children.
+        """
+        element_attrs, strings, children = self._content(nodename, data)
+        element_attrs.update(attrs or {})
+        for name, value in (default_attrs or {}).iteritems():
+            if not element_attrs.get(name):
+                element_attrs[name] = value
+        tail = tail or []
+        if isinstance(children, basestring):
+            strings = [escape(children)]
+            # atoms always have a text node, even an empty one
+            has_children = True
+        else:
+            has_children = bool(strings or children or tail)
+        yield _tag(nodename, element_attrs, has_children)
+        if not has_children:
+            return
+        if strings is not None:
+            for string in strings:
+                if string:
+                    yield string
+        else:
+            for string in self._iter_children(children):
+                yield string
+        for string in tail:
+            yield string
+        yield "</%s>" % nodename
+
+    def to_xml(self, nodename, data, **kwargs):
+        """Return the XML of element nodename for data, see iter_element."""
+        return "".join(self.iter_element(nodename, data, **kwargs))
+
+
+def to_xml(metadata, nodename, data, **kwargs):
+    """Return the XML of element nodename for data, see Plan."""
+    return Plan(metadata).to_xml(nodename, data, **kwargs)
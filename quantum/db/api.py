@@ -17,20 +17,276 @@
 # @author: Brad Hall, Nicira Networks, Inc.
 # @author: Dan Wendlandt, Nicira Networks, Inc.
 
+import contextlib
+import itertools
 import logging
+import time
+import weakref
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, exc
+import eventlet
+from eventlet import corolocal
+from sqlalchemy import and_, case, create_engine, event, exists, func
+from sqlalchemy import literal, pool, select
+from sqlalchemy import exc as sql_exc
+from sqlalchemy.engine import url as sql_url
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import exc, joinedload, sessionmaker
+from sqlalchemy.sql.expression import ClauseElement, Executable
 
 from quantum.api.api_common import OperationalStatus
+from quantum.common.changes import CHANGE_CREATE, CHANGE_DELETE
+from quantum.common.changes import CHANGE_UPDATE, ChangeNotifier
 from quantum.common import exceptions as q_exc
+from quantum.common import utils
+from quantum.db import migration
+from quantum.db.migration import core as migration_core
 from quantum.db import models
 
 
 _ENGINE = None
 _MAKER = None
+# Session makers of the read replicas, used in turn
+_REPLICA_MAKERS = None
+# Whether deletes leave tombstones for compact_deleted
+_SOFT_DELETE = False
+_COMPACTOR = None
+# Transactions of SQLite databases
+_SQLITE_TRANSACTIONS = None
+# Greenthread-local storage for the session bound by unit_of_work()
+_LOCAL = corolocal.local()
 BASE = models.BASE
 LOG = logging.getLogger('quantum.db.api')
+# Ports per UPDATE statement in port_set_op_status_bulk, each port uses
+# three bind parameters and SQLite allows 999 of them
+_STATUS_BATCH_SIZE = 300
+# Rows per DELETE statement in compact_deleted, one bind parameter each
+_DELETE_BATCH_SIZE = 900
+_PRUNER = None
+# Seconds between reads of the change log by change_wait, which also
+# sees the entries written by other processes
+_CHANGE_POLL_INTERVAL = 5
+
+
+class PoolMetrics(object):
+    """Usage counters for the connection pool"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.checkouts = 0
+        self.in_use = 0
+        self.max_in_use = 0
+        self.wait_time = 0.0
+        self.max_wait_time = 0.0
+
+    def checkout(self, dbapi_conn, connection_rec, connection_proxy):
+        self.checkouts += 1
+        self.in_use += 1
+        self.max_in_use = max(self.max_in_use, self.in_use)
+
+    def checkin(self, dbapi_conn, connection_rec):
+        self.in_use -= 1
+
+    def waited(self, seconds):
+        self.wait_time += seconds
+        self.max_wait_time = max(self.max_wait_time, seconds)
+
+
+_POOL_METRICS = PoolMetrics()
+
+
+class NetworkCache(object):
+    """
+    Size-bounded LRU cache mapping network uuids to (tenant_id,
+    op_status) tuples, whose entries expire ttl seconds after
+    being stored.
+    """
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self.clear()
+
+    def clear(self):
+        self.hits = 0
+        self.misses = 0
+        # Entries are [prev, next, net_id, expiry, value] links of a
+        # circular list ordered from the least to the most recently
+        # used, and starting at the root link
+        self._links = {}
+        self._root = []
+        self._root[:] = [self._root, self._root, None, None, None]
+
+    def _unlink(self, link):
+        link[0][1] = link[1]
+        link[1][0] = link[0]
+
+    def _append(self, link):
+        last = self._root[0]
+        link[0] = last
+        link[1] = self._root
+        last[1] = self._root[0] = link
+
+    def get(self, net_id):
+        link = self._links.get(net_id)
+        if link is None or link[3] < time.time():
+            self.misses += 1
+            return None
+        self._unlink(link)
+        self._append(link)
+        self.hits += 1
+        return link[4]
+
+    def set(self, net_id, value):
+        self.invalidate(net_id)
+        link = [None, None, net_id, time.time() + self.ttl, value]
+        self._append(link)
+        self._links[net_id] = link
+        if len(self._links) > self.size:
+            self.invalidate(self._root[1][2])
+
+    def invalidate(self, net_id):
+        link = self._links.pop(net_id, None)
+        if link is not None:
+            self._unlink(link)
+
+
+_NETWORK_CACHE = None
+
+
+class _MeteredQueuePool(pool.QueuePool):
+    """QueuePool recording the time spent waiting for a connection"""
+
+    def _do_get(self):
+        start = time.time()
+        try:
+            return pool.QueuePool._do_get(self)
+        finally:
+            _POOL_METRICS.waited(time.time() - start)
+
+
+def _ping_connection(dbapi_conn, connection_rec, connection_proxy):
+    """Verify that a connection checked out from the pool is alive"""
+    cursor = dbapi_conn.cursor()
+    try:
+        cursor.execute("SELECT 1")
+    except Exception:
+        # The pool discards the connection and retries with a new one
+        raise sql_exc.DisconnectionError()
+    finally:
+        cursor.close()
+
+
+def _is_memory_sqlite(connection):
+    connection_url = sql_url.make_url(connection)
+    return connection_url.drivername.startswith('sqlite') and \
+      connection_url.database in (None, '', ':memory:')
+
+
+class SQLiteTransactions(object):
+    """
+    Begins the transactions of a SQLite engine itself. pysqlite would
+    otherwise begin them only before the first write, and commit them
+    before any SAVEPOINT statement, which breaks nested transactions.
+
+    Tests of in-memory databases, which have a single connection, can
+    run every transaction as a savepoint nested in an outer savepoint
+    between begin_savepoints() and rollback_savepoints(), instead of
+    deleting every row they created. pysqlite's commit() and rollback()
+    are not called meanwhile, so that it leaves transactions to the
+    savepoints. The names of the savepoints are stacked for the whole
+    connection, as every greenthread shares it.
+    """
+
+    def __init__(self, engine):
+        self._engine = engine
+        # Names of the open savepoints, None out of savepoint mode
+        self._names = None
+        self._dbapi_conn = None
+        event.listen(engine, 'connect', self._connect)
+        event.listen(engine, 'begin', self._begin)
+        event.listen(engine, 'commit', self._commit)
+        event.listen(engine, 'rollback', self._rollback)
+
+    def _skip(self, dbapi_conn):
+        pass
+
+    def _connect(self, dbapi_conn, connection_record):
+        dbapi_conn.isolation_level = None
+        self._dbapi_conn = dbapi_conn
+
+    def _execute(self, dbapi_conn, *statements):
+        cursor = dbapi_conn.cursor()
+        try:
+            for statement in statements:
+                cursor.execute(statement)
+        finally:
+            cursor.close()
+
+    def _push(self, name):
+        self._names.append(name)
+        self._execute(self._dbapi_conn, "SAVEPOINT %s" % name)
+
+    def _begin(self, conn):
+        if self._names is None:
+            self._execute(conn.connection, "BEGIN")
+        else:
+            self._push("sa_%d" % len(self._names))
+
+    def _commit(self, conn):
+        # statements run in autocommit mode have no savepoint
+        if self._names is not None and conn.in_transaction():
+            self._execute(self._dbapi_conn,
+                          "RELEASE %s" % self._names.pop())
+
+    def _rollback(self, conn):
+        if self._names is not None and conn.in_transaction():
+            name = self._names.pop()
+            self._execute(self._dbapi_conn, "ROLLBACK TO %s" % name,
+                          "RELEASE %s" % name)
+
+    def begin_savepoints(self):
+        assert self._names is None
+        dialect = self._engine.dialect
+        dialect.do_commit = self._skip
+        dialect.do_rollback = self._skip
+        self._names = []
+        self._push("outer")
+
+    def rollback_savepoints(self):
+        # nested savepoints left open are discarded along with it
+        self._names = None
+        self._execute(self._dbapi_conn, "ROLLBACK TO outer", "RELEASE outer")
+        dialect = self._engine.dialect
+        del dialect.do_commit
+        del dialect.do_rollback
+
+
+def _engine_args(options):
+    """Build the keyword arguments for create_engine from options"""
+    engine_args = {
+        'echo': False,
+        'echo_pool': utils.bool_from_string(options.get('sql_echo_pool')),
+        'pool_recycle': int(options.get('sql_pool_recycle', 3600))}
+    connection_url = sql_url.make_url(options['sql_connection'])
+    if connection_url.drivername.startswith('sqlite'):
+        if _is_memory_sqlite(options['sql_connection']):
+            # Share a single connection among all threads, as each
+            # connection would otherwise get its own empty database
+            engine_args['poolclass'] = pool.StaticPool
+            engine_args['connect_args'] = {'check_same_thread': False}
+            # tests run transactions as savepoints, see
+            # SQLiteTransactions
+            engine_args['pool_reset_on_return'] = None
+        return engine_args
+    engine_args['poolclass'] = _MeteredQueuePool
+    for option, arg in (('sql_pool_size', 'pool_size'),
+                        ('sql_max_overflow', 'max_overflow'),
+                        ('sql_pool_timeout', 'pool_timeout')):
+        if options.get(option) is not None:
+            engine_args[arg] = int(options[option])
+    return engine_args
 
 
 def configure_db(options):
@@ -38,40 +294,319 @@ def configure_db(options):
     Establish the database, create an engine if needed, and
     register the models.
 
-    :param options: Mapping of configuration options
+    :param options: Mapping of configuration options. Besides
+                    sql_connection, the following keys are recognized:
+                     - sql_pool_size: number of connections kept open
+                     - sql_max_overflow: connections allowed beyond
+                       sql_pool_size under load
+                     - sql_pool_timeout: seconds to wait for a free
+                       connection before giving up
+                     - sql_pool_recycle: seconds after which a connection
+                       is replaced (default 3600)
+                     - sql_pool_pre_ping: test connections on checkout
+                     - sql_echo_pool: log connection pool events
+                     - network_cache_size: number of networks whose
+                       tenant and operational status are cached by
+                       network_lookup and port lookups (default
+                       0, no cache)
+                     - network_cache_ttl: seconds a network is cached
+                       for (default 60)
+                     - sql_replica_connections: comma separated
+                       connection URLs of read replicas of the database
+                     - soft_delete: only flag deleted networks and ports,
+                       which are then removed in the background
+                     - soft_delete_compaction_interval: seconds between
+                       removals of deleted rows (default 300)
+                     - soft_delete_compaction_batch: rows removed per
+                       statement (default 500)
+                     - soft_delete_compaction_max_in_use: busy
+                       connections above which removals wait
+                       (default a quarter of sql_pool_size)
+                     - change_log_size: number of entries kept in the
+                       change log (default 100000, 0 keeps them all)
+                     - change_log_prune_interval: seconds between
+                       removals of older entries by the server, see
+                       start_change_log_pruner (default 0, never)
+                     - change_wait_poll_interval: seconds between reads
+                       of the change log by clients waiting for changes
+                       written by other processes (default 5)
+                    Pool size options do not apply to SQLite.
     """
-    global _ENGINE
+    global _ENGINE, _SQLITE_TRANSACTIONS
     if not _ENGINE:
         _ENGINE = create_engine(options['sql_connection'],
-                                echo=False,
-                                echo_pool=True,
-                                pool_recycle=3600)
+                                **_engine_args(options))
+        if _ENGINE.dialect.name == 'sqlite':
+            _SQLITE_TRANSACTIONS = SQLiteTransactions(_ENGINE)
+        event.listen(_ENGINE, 'checkout', _POOL_METRICS.checkout)
+        event.listen(_ENGINE, 'checkin', _POOL_METRICS.checkin)
+        if utils.bool_from_string(options.get('sql_pool_pre_ping')):
+            event.listen(_ENGINE, 'checkout', _ping_connection)
+        configure_network_cache(int(options.get('network_cache_size', 0)),
+                                int(options.get('network_cache_ttl', 60)))
+        replicas = options.get('sql_replica_connections') or ''
+        configure_replicas([url.strip() for url in replicas.split(',')
+                            if url.strip()], options)
         register_models()
+        configure_soft_delete(
+            utils.bool_from_string(options.get('soft_delete')),
+            int(options.get('soft_delete_compaction_interval', 300)),
+            int(options.get('soft_delete_compaction_batch', 500)),
+            _int_option(options, 'soft_delete_compaction_max_in_use'))
+        configure_change_log(
+            int(options.get('change_log_size', 100000)),
+            int(options.get('change_log_prune_interval', 0)),
+            float(options.get('change_wait_poll_interval', 5)))
+
+
+def configure_change_log(size, prune_interval=0, wait_poll_interval=5):
+    """
+    Keep the last size entries of the change log, which a
+    ChangeLogPruner trims every prune_interval seconds unless either
+    is 0, once start_change_log_pruner is called. change_wait reads
+    the log every wait_poll_interval seconds at least.
+    """
+    global _PRUNER, _CHANGE_POLL_INTERVAL
+    _CHANGE_POLL_INTERVAL = wait_poll_interval
+    if _PRUNER is not None:
+        _PRUNER.stop()
+        _PRUNER = None
+    if size and prune_interval:
+        _PRUNER = ChangeLogPruner(prune_interval, size)
+
+
+def start_change_log_pruner():
+    """
+    Start trimming the change log in the background, as configured.
+    Only the server does, and not every process configuring the
+    database.
+    """
+    if _PRUNER is not None:
+        _PRUNER.start()
+
+
+def _int_option(options, name):
+    if options.get(name) is not None:
+        return int(options[name])
+
+
+def configure_soft_delete(enabled, compaction_interval=0, batch_size=500,
+                          max_in_use=None):
+    """
+    Turn soft delete mode on or off. When it is on, and
+    compaction_interval is not 0, a TombstoneCompactor removes the
+    deleted rows every compaction_interval seconds while at most
+    max_in_use connections are busy, by default a quarter of the
+    connection pool.
+    """
+    global _SOFT_DELETE, _COMPACTOR
+    _SOFT_DELETE = enabled
+    if _COMPACTOR is not None:
+        _COMPACTOR.stop()
+        _COMPACTOR = None
+    if enabled and compaction_interval:
+        if max_in_use is None:
+            max_in_use = _pool_share(_ENGINE.pool, 4)
+        _COMPACTOR = TombstoneCompactor(compaction_interval, batch_size,
+                                        max_in_use)
+        _COMPACTOR.start()
+
+
+def _pool_share(db_pool, divisor):
+    """
+    Return the number of connections kept open by db_pool divided by
+    divisor, 0 for the pools of SQLite which have no size.
+    """
+    if isinstance(db_pool, pool.QueuePool):
+        return db_pool.size() // divisor
+    return 0
+
+
+def configure_replicas(connections, options=None):
+    """
+    Send the reads of read-only units of work, and of the read-only
+    functions of this module called outside of a unit of work, to the
+    read replicas with the given connection URLs, in turn. Connection
+    pool options are taken from options, as for configure_db.
+    """
+    global _REPLICA_MAKERS
+    makers = []
+    for connection in connections:
+        replica_options = dict(options or {}, sql_connection=connection)
+        engine = create_engine(connection, **_engine_args(replica_options))
+        if utils.bool_from_string(replica_options.get('sql_pool_pre_ping')):
+            event.listen(engine, 'checkout', _ping_connection)
+        makers.append(sessionmaker(bind=engine, autocommit=True,
+                                   expire_on_commit=False))
+    if makers:
+        _REPLICA_MAKERS = itertools.cycle(makers)
+    else:
+        _REPLICA_MAKERS = None
+
+
+def configure_network_cache(size, ttl=60):
+    """
+    Cache the lookups of up to size networks for ttl seconds. A size
+    of 0 disables the cache.
+    """
+    global _NETWORK_CACHE
+    if size > 0:
+        _NETWORK_CACHE = NetworkCache(size, ttl)
+    else:
+        _NETWORK_CACHE = None
+
+
+# Networks written by the transaction of each session, invalidated
+# again once it ends, as other greenthreads may cache them before
+_WRITTEN_NETWORKS = weakref.WeakKeyDictionary()
+
+
+def _invalidate_network(net_id, session=None):
+    if _NETWORK_CACHE is None:
+        return
+    _NETWORK_CACHE.invalidate(net_id)
+    if session is not None and session.transaction is not None:
+        _WRITTEN_NETWORKS.setdefault(session, set()).add(net_id)
+
+
+def _invalidate_written_networks(session):
+    if session.transaction is not None and session.transaction.nested:
+        # only a savepoint ends, the enclosing transaction goes on
+        return
+    for net_id in _WRITTEN_NETWORKS.pop(session, ()):
+        _invalidate_network(net_id)
+
+
+def get_pool_metrics():
+    """
+    Returns a dictionary with the number of connections currently and at
+    most checked out of the pool, the total number of checkouts, and the
+    total and maximum time in seconds spent waiting for a connection.
+    """
+    metrics = _POOL_METRICS
+    return {'checkouts': metrics.checkouts,
+            'in_use': metrics.in_use,
+            'max_in_use': metrics.max_in_use,
+            'wait_time': metrics.wait_time,
+            'max_wait_time': metrics.max_wait_time}
 
 
 def clear_db():
     global _ENGINE
     assert _ENGINE
+    if _NETWORK_CACHE is not None:
+        _NETWORK_CACHE.clear()
     for table in reversed(BASE.metadata.sorted_tables):
-        _ENGINE.execute(table.delete())
+        # plugin tables are only created by their plugin's migrations
+        if _ENGINE.has_table(table.name):
+            _ENGINE.execute(table.delete())
+
+
+def begin_test_transaction():
+    """
+    Start a transaction holding every change made to the in-memory
+    SQLite database until rollback_test_transaction() is called. The
+    schema is left in place, so that tests don't have to build it.
+    Nothing is done if the plugin under test has not configured the
+    database.
+    """
+    if not _ENGINE:
+        return
+    assert _SQLITE_TRANSACTIONS and \
+      isinstance(_ENGINE.pool, pool.StaticPool), \
+      "only in-memory SQLite databases are supported"
+    _SQLITE_TRANSACTIONS.begin_savepoints()
+
+
+def rollback_test_transaction():
+    """Undo the changes made since begin_test_transaction()"""
+    if not _ENGINE:
+        return
+    _SQLITE_TRANSACTIONS.rollback_savepoints()
+    if _NETWORK_CACHE is not None:
+        _NETWORK_CACHE.clear()
 
 
 def get_session(autocommit=True, expire_on_commit=False):
-    """Helper method to grab session"""
+    """Helper method to grab session
+
+    If a unit of work is in progress in the current greenthread,
+    its session is returned instead of a new one.
+    """
+    session = getattr(_LOCAL, 'session', None)
+    if session is not None:
+        return session
     global _MAKER, _ENGINE
     if not _MAKER:
         assert _ENGINE
         _MAKER = sessionmaker(bind=_ENGINE,
                               autocommit=autocommit,
                               expire_on_commit=expire_on_commit)
+        event.listen(_MAKER, 'after_commit', _notify_changes)
+        event.listen(_MAKER, 'after_rollback', _discard_changes)
+        event.listen(_MAKER, 'after_commit', _invalidate_written_networks)
+        event.listen(_MAKER, 'after_rollback', _invalidate_written_networks)
     return _MAKER()
 
 
+def _get_read_session():
+    """
+    Return the session for read-only queries: the session of the unit
+    of work in progress, if any, or else a session on a read replica
+    when replicas are configured.
+    """
+    if getattr(_LOCAL, 'session', None) is None and _REPLICA_MAKERS:
+        return _REPLICA_MAKERS.next()()
+    return get_session()
+
+
+@contextlib.contextmanager
+def unit_of_work(read_only=False):
+    """
+    Bind a single session to the current greenthread for the duration
+    of the block. Every get_session() call issued within the block
+    returns that session, and its transaction is committed once when
+    the block exits, or rolled back if an exception is raised.
+    Nested units of work join the outermost one.
+
+    The session of a read_only unit of work is bound to a read replica
+    when replicas are configured, so it must not write anything.
+    """
+    session = getattr(_LOCAL, 'session', None)
+    if session is not None or not _ENGINE:
+        # Either nested, or the database has not been configured
+        yield session
+        return
+    if read_only and _REPLICA_MAKERS:
+        session = _REPLICA_MAKERS.next()()
+    else:
+        session = get_session()
+    session.begin()
+    _LOCAL.session = session
+    try:
+        yield session
+        session.commit()
+    except:
+        session.rollback()
+        raise
+    finally:
+        del _LOCAL.session
+
+
 def register_models():
     """Register Models and create properties"""
+    upgrade_schema(migration_core.REPOSITORY, migration_core.MIGRATIONS)
+
+
+def upgrade_schema(repository, migrations):
+    """
+    Run the migrations of repository, a name for a set of tables, the
+    database has not seen yet. Plugins with their own tables call this
+    after configure_db.
+    """
     global _ENGINE
     assert _ENGINE
-    BASE.metadata.create_all(_ENGINE)
+    return migration.upgrade(_ENGINE, repository, migrations)
 
 
 def unregister_models():
@@ -79,172 +614,760 @@ def unregister_models():
     global _ENGINE
     assert _ENGINE
     BASE.metadata.drop_all(_ENGINE)
+    migration.VERSION_TABLE.drop(_ENGINE, checkfirst=True)
+
+
+class _InsertFromSelect(Executable, ClauseElement):
+    """INSERT INTO table (columns) SELECT ..., missing in SQLAlchemy 0.7"""
+
+    _execution_options = \
+        Executable._execution_options.union({'autocommit': True})
+
+    def __init__(self, table, columns, select):
+        self.table = table
+        self.columns = columns
+        self.select = select
+
+
+@compiles(_InsertFromSelect)
+def _compile_insert_from_select(element, compiler, **kw):
+    return "INSERT INTO %s (%s) %s" % (
+        compiler.process(element.table, asfrom=True),
+        ", ".join([compiler.preparer.format_column(column)
+                   for column in element.columns]),
+        compiler.process(element.select))
+
+
+CHANGE_NOTIFIER = ChangeNotifier()
+# Sessions whose transaction wrote to the change log
+_CHANGED_SESSIONS = weakref.WeakKeyDictionary()
+
+
+def _notify_changes(session):
+    if _CHANGED_SESSIONS.pop(session, False):
+        CHANGE_NOTIFIER.notify()
+
+
+def _discard_changes(session):
+    _CHANGED_SESSIONS.pop(session, None)
+
+
+def _changes_recorded(session):
+    """Notify waiters once the entries written by session commit"""
+    if session.transaction is None:
+        # written in autocommit mode
+        CHANGE_NOTIFIER.notify()
+    else:
+        _CHANGED_SESSIONS[session] = True
+
+
+def record_changes(resource, action, items, tenant_id=None, session=None):
+    """
+    Append entries to the change log for items, a list of
+    (resource_id, network_id) pairs. They are written within the
+    transaction of session, which plugins pass along with the rows of
+    their bindings.
+    """
+    if not items:
+        return
+    session = session or get_session()
+    session.execute(models.Change.__table__.insert(),
+                    [{'resource': resource,
+                      'resource_id': resource_id,
+                      'network_id': network_id,
+                      'tenant_id': tenant_id,
+                      'action': action}
+                     for resource_id, network_id in items])
+    _changes_recorded(session)
+
+
+def _record_port_changes(session, action, *criteria):
+    """
+    Append entries to the change log for the ports matching criteria,
+    with a single INSERT ... SELECT statement which takes their tenant
+    from their network.
+    """
+    changes = models.Change.__table__
+    ports = models.Port.__table__
+    networks = models.Network.__table__
+    session.execute(_InsertFromSelect(
+        changes,
+        [changes.c.resource, changes.c.resource_id, changes.c.network_id,
+         changes.c.tenant_id, changes.c.action],
+        select([literal('port'), ports.c.uuid, ports.c.network_id,
+                networks.c.tenant_id, literal(action)],
+               and_(ports.c.network_id == networks.c.uuid, *criteria)).
+        order_by(ports.c.uuid)))
+    _changes_recorded(session)
 
 
 def network_create(tenant_id, name, op_status=OperationalStatus.UNKNOWN):
     session = get_session()
 
-    with session.begin():
+    with session.begin(subtransactions=True):
         net = models.Network(tenant_id, name, op_status)
         session.add(net)
         session.flush()
+        record_changes('network', CHANGE_CREATE, [(net.uuid, net.uuid)],
+                       tenant_id, session)
         return net
 
 
-def network_list(tenant_id):
+def _insert_all(model, objs):
+    """
+    Write objs, a list of new model objects, with a single INSERT
+    statement executed for all of their rows at once.
+    """
+    if not objs:
+        return
+    table = model.__table__
+    rows = [dict((column.name, getattr(obj, column.name))
+                 for column in table.columns)
+            for obj in objs]
     session = get_session()
-    return session.query(models.Network).\
-      filter_by(tenant_id=tenant_id).\
-      all()
+    with session.begin(subtransactions=True):
+        session.execute(table.insert(), rows)
 
 
-def network_get(net_id):
+def network_create_bulk(tenant_id, names,
+                        op_status=OperationalStatus.UNKNOWN):
+    nets = [models.Network(tenant_id, name, op_status) for name in names]
     session = get_session()
+    with session.begin(subtransactions=True):
+        _insert_all(models.Network, nets)
+        record_changes('network', CHANGE_CREATE,
+                       [(net.uuid, net.uuid) for net in nets],
+                       tenant_id, session)
+    return nets
+
+
+def _network_list_query(tenant_id, marker, limit, filters):
+    session = _get_read_session()
+    query = session.query(models.Network).\
+      filter_by(tenant_id=tenant_id, deleted=False).\
+      filter_by(**filters).\
+      order_by(models.Network.uuid)
+    if marker is not None:
+        query = query.filter(models.Network.uuid > marker)
+    if limit is not None:
+        query = query.limit(limit)
+    return query
+
+
+def network_list(tenant_id, marker=None, limit=None, **filters):
+    """
+    Return the networks of tenant_id matching filters, a mapping of
+    column names to values.
+
+    Networks are ordered by uuid, so that marker and limit allow to
+    page through them: only the (at most) limit networks following the
+    marker uuid are returned.
+    """
+    return _network_list_query(tenant_id, marker, limit, filters).all()
+
+
+def network_list_rows(tenant_id, marker=None, limit=None, **filters):
+    """
+    Same as network_list, but return read-only named tuples holding
+    the uuid, name and op_status columns instead of Network objects.
+    """
+    return _network_list_query(tenant_id, marker, limit, filters).\
+      with_entities(models.Network.uuid,
+                    models.Network.name,
+                    models.Network.op_status).\
+      all()
+
+
+def _network_get(session, net_id):
     try:
         return  session.query(models.Network).\
-            filter_by(uuid=net_id).\
+            filter_by(uuid=net_id, deleted=False).\
             one()
     except exc.NoResultFound, e:
         raise q_exc.NetworkNotFound(net_id=net_id)
 
 
-def network_update(net_id, tenant_id, **kwargs):
-    session = get_session()
-    net = network_get(net_id)
-    for key in kwargs.keys():
-        net[key] = kwargs[key]
-    session.merge(net)
-    session.flush()
-    return net
+def network_get(net_id):
+    return _network_get(_get_read_session(), net_id)
 
 
-def network_destroy(net_id):
-    session = get_session()
+def network_get_with_ports(net_id):
+    """
+    Return the network along with its ports, which are loaded by
+    the same query.
+    """
+    session = _get_read_session()
     try:
-        net = session.query(models.Network).\
-          filter_by(uuid=net_id).\
+        return session.query(models.Network).\
+          options(joinedload(models.Network.ports)).\
+          filter_by(uuid=net_id, deleted=False).\
           one()
+    except exc.NoResultFound:
+        raise q_exc.NetworkNotFound(net_id=net_id)
 
-        ports = session.query(models.Port).\
-            filter_by(network_id=net_id).\
-            all()
-        for p in ports:
-            session.delete(p)
 
-        session.delete(net)
-        session.flush()
-        return net
-    except exc.NoResultFound:
+def network_lookup(net_id):
+    """
+    Return the (tenant_id, op_status) tuple of the network, raising
+    NetworkNotFound if it does not exist.
+
+    This is meant for existence and ownership checks: the result comes
+    from the network cache when it is enabled.
+    """
+    summary = _cached_network(net_id)
+    if summary is not None:
+        return summary
+    session = get_session()
+    summary = session.query(models.Network.tenant_id,
+                            models.Network.op_status).\
+      filter_by(uuid=net_id, deleted=False).\
+      first()
+    if summary is None:
         raise q_exc.NetworkNotFound(net_id=net_id)
+    summary = tuple(summary)
+    _cache_network(session, net_id, summary)
+    return summary
+
+
+def _cached_network(net_id):
+    """Return the cached (tenant_id, op_status) of net_id, if any"""
+    if _NETWORK_CACHE is not None:
+        return _NETWORK_CACHE.get(net_id)
+
+
+def _cache_network(session, net_id, summary):
+    """Cache the (tenant_id, op_status) of net_id read with session"""
+    # Do not share what the transaction of session wrote before it ends
+    if _NETWORK_CACHE is not None and \
+       net_id not in _WRITTEN_NETWORKS.get(session, ()):
+        _NETWORK_CACHE.set(net_id, summary)
+
+
+def _flush_revision(session, resource, resource_id):
+    """
+    Flush session, raising ResourceModified if the revision of the
+    resource, checked by its UPDATE or DELETE statement, has changed
+    since it was read.
+    """
+    try:
+        session.flush()
+    except exc.StaleDataError:
+        raise q_exc.ResourceModified(resource=resource,
+                                     resource_id=resource_id)
+
+
+def network_update(net_id, tenant_id, **kwargs):
+    session = get_session()
+    net = _network_get(session, net_id)
+    with session.begin(subtransactions=True):
+        _invalidate_network(net_id, session)
+        for key in kwargs.keys():
+            net[key] = kwargs[key]
+        session.merge(net)
+        _flush_revision(session, 'network', net_id)
+        record_changes('network', CHANGE_UPDATE, [(net_id, net_id)],
+                       net.tenant_id, session)
+    return net
+
+
+def network_destroy(net_id):
+    session = get_session()
+    net = _network_get(session, net_id)
+    with session.begin(subtransactions=True):
+        _invalidate_network(net_id, session)
+        port_destroy_all(net_id)
+        # a set-based delete does not need to load the ports
+        # collection, as session.delete(net) would do
+        query = session.query(models.Network).filter_by(uuid=net_id)
+        if _SOFT_DELETE:
+            query.update({'deleted': True}, synchronize_session='evaluate')
+        else:
+            query.delete(synchronize_session='evaluate')
+        record_changes('network', CHANGE_DELETE, [(net_id, net_id)],
+                       net.tenant_id, session)
+    return net
 
 
 def port_create(net_id, state=None, op_status=OperationalStatus.UNKNOWN):
     # confirm network exists
-    network_get(net_id)
+    tenant_id = network_lookup(net_id)[0]
 
     session = get_session()
-    with session.begin():
+    with session.begin(subtransactions=True):
         port = models.Port(net_id, op_status)
         port['state'] = state or 'DOWN'
         session.add(port)
         session.flush()
+        record_changes('port', CHANGE_CREATE, [(port.uuid, net_id)],
+                       tenant_id, session)
         return port
 
 
-def port_list(net_id):
+def port_create_bulk(net_id, states, op_status=OperationalStatus.UNKNOWN):
+    # validate before writing anything, all ports are created or none
+    for state in states:
+        if state and state not in ('ACTIVE', 'DOWN'):
+            raise q_exc.StateInvalid(port_state=state)
     # confirm network exists
-    network_get(net_id)
+    tenant_id = network_lookup(net_id)[0]
+
+    ports = []
+    for state in states:
+        port = models.Port(net_id, op_status)
+        port['state'] = state or 'DOWN'
+        ports.append(port)
     session = get_session()
-    return session.query(models.Port).\
-      filter_by(network_id=net_id).\
+    with session.begin(subtransactions=True):
+        _insert_all(models.Port, ports)
+        record_changes('port', CHANGE_CREATE,
+                       [(port.uuid, net_id) for port in ports],
+                       tenant_id, session)
+    return ports
+
+
+def _network_port_query(session, net_id, port_id=None, *criteria):
+    """
+    Build a query returning (network, port) rows for net_id.
+
+    The port is outer joined to the network, so that a single round trip
+    tells apart a missing network (no rows) from a missing port (a row
+    whose port is None). If port_id is not specified every port of the
+    network matching the additional criteria is returned.
+    """
+    port_clause = and_(models.Port.network_id == models.Network.uuid,
+                       ~models.Port.deleted)
+    if port_id is not None:
+        port_clause = and_(port_clause, models.Port.uuid == port_id)
+    if criteria:
+        port_clause = and_(port_clause, *criteria)
+    return session.query(models.Network, models.Port).\
+      outerjoin((models.Port, port_clause)).\
+      filter(models.Network.uuid == net_id).\
+      filter(~models.Network.deleted)
+
+
+def _port_get(session, port_id, net_id):
+    if _cached_network(net_id) is not None:
+        # The network is known to exist, only the port is left to query
+        port = session.query(models.Port).\
+          filter_by(uuid=port_id, network_id=net_id, deleted=False).\
+          first()
+    else:
+        net_port = _network_port_query(session, net_id, port_id).first()
+        if net_port is None:
+            raise q_exc.NetworkNotFound(net_id=net_id)
+        net, port = net_port
+        _cache_network(session, net_id, (net.tenant_id, net.op_status))
+    if port is None:
+        raise q_exc.PortNotFound(net_id=net_id, port_id=port_id)
+    return port
+
+
+def _port_list_query(net_id, marker, limit, filters):
+    session = _get_read_session()
+    criteria = [getattr(models.Port, column) == value
+                for column, value in filters.iteritems()]
+    if marker is not None:
+        criteria.append(models.Port.uuid > marker)
+    query = _network_port_query(session, net_id, None, *criteria).\
+      order_by(models.Port.uuid)
+    if limit is not None:
+        query = query.limit(limit)
+    return query
+
+
+def port_list(net_id, marker=None, limit=None, **filters):
+    """
+    Return the ports of net_id matching filters, a mapping of column
+    names to values.
+
+    Ports are ordered by uuid, so that marker and limit allow to page
+    through them as for network_list. limit must be positive, as at
+    least a row is needed to tell whether the network exists.
+    """
+    rows = _port_list_query(net_id, marker, limit, filters).all()
+    if not rows:
+        raise q_exc.NetworkNotFound(net_id=net_id)
+    return [port for _net, port in rows if port is not None]
+
+
+def port_list_rows(net_id, marker=None, limit=None, **filters):
+    """
+    Same as port_list, but return read-only named tuples holding the
+    uuid, network_id, interface_id, state and op_status columns
+    instead of Port objects.
+    """
+    rows = _port_list_query(net_id, marker, limit, filters).\
+      with_entities(models.Port.uuid,
+                    models.Port.network_id,
+                    models.Port.interface_id,
+                    models.Port.state,
+                    models.Port.op_status).\
       all()
+    if not rows:
+        raise q_exc.NetworkNotFound(net_id=net_id)
+    # the network has no matching port if the only row is empty
+    return [row for row in rows if row.uuid is not None]
 
 
 def port_get(port_id, net_id, session=None):
-    # confirm network exists
-    network_get(net_id)
     if not session:
-        session = get_session()
-    try:
-        return session.query(models.Port).\
-          filter_by(uuid=port_id).\
-          filter_by(network_id=net_id).\
-          one()
-    except exc.NoResultFound:
-        raise q_exc.PortNotFound(net_id=net_id, port_id=port_id)
+        session = _get_read_session()
+    return _port_get(session, port_id, net_id)
 
 
 def port_update(port_id, net_id, **kwargs):
-    # confirm network exists
-    network_get(net_id)
-    port = port_get(port_id, net_id)
     session = get_session()
-    for key in kwargs.keys():
-        if key == "state":
-            if kwargs[key] not in ('ACTIVE', 'DOWN'):
-                raise q_exc.StateInvalid(port_state=kwargs[key])
-        port[key] = kwargs[key]
-    session.merge(port)
-    session.flush()
+    port = _port_get(session, port_id, net_id)
+    # validate before changing anything, as the session
+    # might be flushed later on by the enclosing unit of work
+    if 'state' in kwargs and kwargs['state'] not in ('ACTIVE', 'DOWN'):
+        raise q_exc.StateInvalid(port_state=kwargs['state'])
+    with session.begin(subtransactions=True):
+        for key in kwargs.keys():
+            port[key] = kwargs[key]
+        _flush_revision(session, 'port', port_id)
+        _record_port_changes(session, CHANGE_UPDATE,
+                             models.Port.uuid == port_id)
     return port
 
 
 def port_set_attachment(port_id, net_id, new_interface_id):
-    # confirm network exists
-    network_get(net_id)
-
     session = get_session()
-    port = port_get(port_id, net_id)
-
-    if new_interface_id != "":
-        # We are setting, not clearing, the attachment-id
-        if port['interface_id']:
-            raise q_exc.PortInUse(net_id=net_id, port_id=port_id,
-                                att_id=port['interface_id'])
-
+    if new_interface_id == "":
+        # Detached ports have no interface id, which is allowed to be shared
+        return port_unset_attachment(port_id, net_id)
+    # Compare and swap: the port is attached only if it is still
+    # detached when the UPDATE runs, so that concurrent requests do not
+    # need to lock it. The unique index on interface_id rejects an
+    # interface already plugged into another port.
+    attached_port = None
+    with session.begin(subtransactions=True):
         try:
-            port = session.query(models.Port).\
-            filter_by(interface_id=new_interface_id).\
-            one()
-            raise q_exc.AlreadyAttached(net_id=net_id,
+            # Only the savepoint is rolled back on conflict, and not the
+            # earlier writes of the unit of work
+            with session.begin_nested():
+                attached = session.query(models.Port).\
+                  filter_by(uuid=port_id, network_id=net_id,
+                            interface_id=None, deleted=False).\
+                  update({'interface_id': new_interface_id,
+                          'revision': models.Port.revision + 1},
+                         synchronize_session='evaluate')
+        except sql_exc.IntegrityError:
+            attached = None
+            # The other port may have been detached since
+            attached_port = session.query(models.Port).\
+              filter_by(interface_id=new_interface_id).\
+              first() or {'uuid': _("unknown")}
+        if attached:
+            _record_port_changes(session, CHANGE_UPDATE,
+                                 models.Port.uuid == port_id)
+    if attached_port is not None:
+        raise q_exc.AlreadyAttached(net_id=net_id,
                                     port_id=port_id,
                                     att_id=new_interface_id,
-                                    att_port_id=port['uuid'])
-        except exc.NoResultFound:
-            # this is what should happen
-            pass
-    port.interface_id = new_interface_id
-    session.merge(port)
-    session.flush()
-    return port
+                                    att_port_id=attached_port['uuid'])
+    if attached:
+        return session.query(models.Port).get(port_id)
+    # Tell why the port was left untouched: _port_get raises if either
+    # the network or the port does not exist, otherwise it is in use
+    port = _port_get(session, port_id, net_id)
+    raise q_exc.PortInUse(net_id=net_id, port_id=port_id,
+                          att_id=port['interface_id'])
 
 
 def port_unset_attachment(port_id, net_id):
-    # confirm network exists
-    network_get(net_id)
-
     session = get_session()
-    port = port_get(port_id, net_id, session)
-    port.interface_id = None
-    session.add(port)
-    session.flush()
+    port = _port_get(session, port_id, net_id)
+    with session.begin(subtransactions=True):
+        port.interface_id = None
+        session.flush()
+        _record_port_changes(session, CHANGE_UPDATE,
+                             models.Port.uuid == port_id)
+    return port
 
 
 def port_destroy(port_id, net_id):
-    # confirm network exists
-    network_get(net_id)
+    session = get_session()
+    port = _port_get(session, port_id, net_id)
+    if port['interface_id']:
+        raise q_exc.PortInUse(net_id=net_id, port_id=port_id,
+                              att_id=port['interface_id'])
+    with session.begin(subtransactions=True):
+        _record_port_changes(session, CHANGE_DELETE,
+                             models.Port.uuid == port_id)
+        if _SOFT_DELETE:
+            port.deleted = True
+        else:
+            session.delete(port)
+        _flush_revision(session, 'port', port_id)
+    return port
+
+
+def port_destroy_all(net_id):
+    """
+    Delete every port of the network with a single DELETE statement,
+    and return the number of deleted ports.
 
+    Attached ports are deleted as well: callers tearing down a network
+    are expected to have verified it is not in use. In soft delete mode
+    they are detached, so that their interfaces can be plugged again.
+    """
     session = get_session()
+    with session.begin(subtransactions=True):
+        _record_port_changes(session, CHANGE_DELETE,
+                             models.Port.network_id == net_id,
+                             ~models.Port.deleted)
+        query = session.query(models.Port).\
+          filter_by(network_id=net_id, deleted=False)
+        if _SOFT_DELETE:
+            return query.update({'deleted': True, 'interface_id': None},
+                                synchronize_session='evaluate')
+        return query.delete(synchronize_session='evaluate')
+
+
+def port_set_op_status_bulk(statuses, session=None):
+    """
+    Set the operational status of many ports, given as a dictionary
+    mapping port uuids to their new status, with a few
+    UPDATE ... SET op_status = CASE uuid WHEN ... END statements.
+
+    Returns the number of updated ports, unknown and deleted ports are
+    ignored. Processes which do not configure the database, such as
+    the OVS agent, pass the session to write with.
+    """
+    session = session or get_session()
+    port_ids = statuses.keys()
+    updated = 0
+    with session.begin(subtransactions=True):
+        for i in range(0, len(port_ids), _STATUS_BATCH_SIZE):
+            batch = port_ids[i:i + _STATUS_BATCH_SIZE]
+            op_status = case(dict((port_id, statuses[port_id])
+                                  for port_id in batch),
+                             value=models.Port.uuid)
+            updated += session.query(models.Port).\
+              filter(models.Port.uuid.in_(batch)).\
+              filter_by(deleted=False).\
+              update({'op_status': op_status,
+                      'revision': models.Port.revision + 1},
+                     synchronize_session=False)
+            _record_port_changes(session, CHANGE_UPDATE,
+                                 models.Port.uuid.in_(batch),
+                                 ~models.Port.deleted)
+    # CASE can't be evaluated in Python, expire the loaded ports instead
+    for obj in session.identity_map.values():
+        if isinstance(obj, models.Port) and obj.uuid in statuses:
+            session.expire(obj, ['op_status', 'revision'])
+    return updated
+
+
+def _delete_rows(session, model, uuids):
+    removed = 0
+    for i in range(0, len(uuids), _DELETE_BATCH_SIZE):
+        removed += session.query(model).\
+          filter(model.uuid.in_(uuids[i:i + _DELETE_BATCH_SIZE])).\
+          delete(synchronize_session=False)
+    return removed
+
+
+def compact_deleted(batch_size=500):
+    """
+    Remove up to batch_size ports, and up to batch_size networks left
+    without ports, deleted in soft delete mode. Returns the number of
+    removed rows.
+    """
+    session = get_session()
+    with session.begin(subtransactions=True):
+        port_ids = [row.uuid for row in
+                    session.query(models.Port.uuid).
+                    filter_by(deleted=True).
+                    limit(batch_size)]
+        removed = _delete_rows(session, models.Port, port_ids)
+        net_ids = [row.uuid for row in
+                   session.query(models.Network.uuid).
+                   filter_by(deleted=True).
+                   filter(~exists().where(models.Port.network_id ==
+                                          models.Network.uuid)).
+                   limit(batch_size)]
+        removed += _delete_rows(session, models.Network, net_ids)
+    return removed
+
+
+class TombstoneCompactor(object):
+    """
+    Removes the rows deleted in soft delete mode every interval
+    seconds, in batches of batch_size rows per table. A round is
+    skipped if more than max_in_use database connections are busy
+    serving requests.
+    """
+
+    def __init__(self, interval, batch_size=500, max_in_use=0):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_in_use = max_in_use
+        self._thread = None
+
+    def _is_quiet(self):
+        return _POOL_METRICS.in_use <= self.max_in_use
+
+    def compact(self):
+        """Remove batches of deleted rows while the database is quiet"""
+        removed = 0
+        while self._is_quiet():
+            batch = compact_deleted(self.batch_size)
+            removed += batch
+            if batch < self.batch_size:
+                break
+            # let the requests in
+            eventlet.sleep(0)
+        return removed
+
+    def _run(self):
+        while True:
+            eventlet.sleep(self.interval)
+            try:
+                removed = self.compact()
+                if removed:
+                    LOG.info("Removed %d deleted rows", removed)
+            except Exception:
+                LOG.exception("Failed to remove deleted rows")
+
+    def start(self):
+        if self._thread is None:
+            self._thread = eventlet.spawn(self._run)
+
+    def stop(self):
+        if self._thread is not None:
+            self._thread.kill()
+            self._thread = None
+
+
+def change_last_seq():
+    """Return the sequence number of the last change, 0 if none"""
+    session = _get_read_session()
+    return session.query(func.max(models.Change.seq)).scalar() or 0
+
+
+def change_list(since, tenant_id=None, limit=None):
+    """
+    Return the entries of the change log following sequence number
+    since, oldest first, or only those about networks and ports of
+    tenant_id if specified. Raises ChangesExpired if some of them were
+    pruned already, the caller should then read everything again.
+
+    Entries are numbered when they are written, but become visible
+    when their transaction commits: an entry may show up after others
+    with greater numbers, under concurrent writes.
+    """
+    session = _get_read_session()
+    first = session.query(func.min(models.Change.seq)).scalar()
+    if first is not None and since < first - 1:
+        raise q_exc.ChangesExpired(since=since)
+    query = session.query(models.Change).\
+      filter(models.Change.seq > since)
+    if tenant_id is not None:
+        query = query.filter(models.Change.tenant_id == tenant_id)
+    query = query.order_by(models.Change.seq)
+    if limit is not None:
+        query = query.limit(limit)
+    return query.all()
+
+
+def change_page(since, tenant_id=None, limit=None):
+    """
+    Return the entries change_list(since, tenant_id, limit) returns,
+    along with the sequence number to read from next time: the last
+    one of the whole log if the page holds every remaining entry, so
+    that readers of a tenant skip the entries of the others.
+    """
+    last_seq = change_last_seq()
+    changes = change_list(since, tenant_id, limit)
+    if limit is not None and len(changes) == limit:
+        return changes, changes[-1].seq
+    return changes, max([since, last_seq] + [change.seq
+                                              for change in changes])
+
+
+def _change_exists(session, since, tenant_id):
+    query = session.query(models.Change.seq).\
+      filter(models.Change.seq > since)
+    if tenant_id is not None:
+        query = query.filter(models.Change.tenant_id == tenant_id)
+    return query.first() is not None
+
+
+def change_wait(since, tenant_id=None, timeout=0):
+    """
+    Wait up to timeout seconds for entries of the change log following
+    sequence number since, of tenant_id if specified, and return
+    whether there are some.
+
+    Entries written by this process wake the caller as they commit,
+    those written by other processes are seen within
+    change_wait_poll_interval seconds. The transaction of the unit of
+    work in progress, if any, is committed first: no connection is
+    held while waiting, and a new transaction sees the new entries.
+    """
+    deadline = time.time() + timeout
+    session = getattr(_LOCAL, 'session', None)
+    if session is not None and session.transaction is not None:
+        session.commit()
     try:
-        port = session.query(models.Port).\
-          filter_by(uuid=port_id).\
-          filter_by(network_id=net_id).\
-          one()
-        if port['interface_id']:
-            raise q_exc.PortInUse(net_id=net_id, port_id=port_id,
-                                att_id=port['interface_id'])
-        session.delete(port)
-        session.flush()
-        return port
-    except exc.NoResultFound:
-        raise q_exc.PortNotFound(port_id=port_id)
+        while True:
+            count = CHANGE_NOTIFIER.count
+            if _change_exists(_get_read_session(), since, tenant_id):
+                return True
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return False
+            CHANGE_NOTIFIER.wait(count,
+                                 min(remaining, _CHANGE_POLL_INTERVAL))
+    finally:
+        if session is not None:
+            session.begin()
+
+
+def change_prune(size):
+    """
+    Remove the entries of the change log but the last size ones, and
+    return the number of removed entries.
+    """
+    session = get_session()
+    with session.begin(subtransactions=True):
+        last = session.query(func.max(models.Change.seq)).scalar()
+        if last is None:
+            return 0
+        return session.query(models.Change).\
+          filter(models.Change.seq <= last - size).\
+          delete(synchronize_session=False)
+
+
+class ChangeLogPruner(object):
+    """
+    Trims the change log to its last size entries every interval
+    seconds.
+    """
+
+    def __init__(self, interval, size):
+        self.interval = interval
+        self.size = size
+        self._thread = None
+
+    def _run(self):
+        while True:
+            eventlet.sleep(self.interval)
+            try:
+                removed = change_prune(self.size)
+                if removed:
+                    LOG.info("Removed %d entries of the change log", removed)
+            except Exception:
+                LOG.exception("Failed to prune the change log")
+
+    def start(self):
+        if self._thread is None:
+            self._thread = eventlet.spawn(self._run)
+
+    def stop(self):
+        if self._thread is not None:
+            self._thread.kill()
+            self._thread = None
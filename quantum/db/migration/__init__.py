@@ -0,0 +1,162 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+# Copyright 2011 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Versioned schema migrations.
+
+The tables of quantum and of each plugin form a repository, whose
+migrations are a list of functions taking an engine. The database
+records the version of each repository in the migrate_version table,
+the number of migrations it has run, so that an up to date database
+is checked with a single query at startup and only new migrations
+are run after an upgrade.
+
+Tables are created from the current models, which may already hold
+the columns and indexes added by later migrations: the helpers below
+skip the objects that already exist.
+"""
+
+import logging
+
+from sqlalchemy import Column, Integer, MetaData, String, Table
+from sqlalchemy import select, text
+from sqlalchemy.engine import reflection
+from sqlalchemy.schema import CreateIndex
+
+LOG = logging.getLogger('quantum.db.migration')
+
+VERSION_TABLE = Table('migrate_version', MetaData(),
+                      Column('repository', String(64), primary_key=True),
+                      Column('version', Integer, nullable=False))
+
+# Bind parameters per statement in bulk_insert, SQLite allows 999
+MAX_BIND_PARAMS = 900
+
+
+def get_version(engine, repository):
+    """Return the number of migrations of repository already run"""
+    VERSION_TABLE.create(engine, checkfirst=True)
+    version = engine.execute(select([VERSION_TABLE.c.version]).where(
+        VERSION_TABLE.c.repository == repository)).scalar()
+    return version or 0
+
+
+def _set_version(engine, repository, version):
+    table = VERSION_TABLE
+    updated = engine.execute(table.update().
+                             where(table.c.repository == repository).
+                             values(version=version)).rowcount
+    if not updated:
+        engine.execute(table.insert().values(repository=repository,
+                                             version=version))
+
+
+def upgrade(engine, repository, migrations):
+    """
+    Run the migrations of repository the database has not seen yet,
+    and return the resulting version.
+    """
+    version = get_version(engine, repository)
+    if version > len(migrations):
+        LOG.warn("Schema of %s is at version %d, newer than this "
+                 "release (%d)", repository, version, len(migrations))
+    for migration in migrations[version:]:
+        version += 1
+        LOG.info("Upgrading %s schema to version %d: %s",
+                 repository, version, migration.__name__)
+        migration(engine)
+        _set_version(engine, repository, version)
+    return version
+
+
+def downgrade_all(engine, repository):
+    """Forget the version of repository, whose tables were dropped"""
+    if engine.has_table(VERSION_TABLE.name):
+        engine.execute(VERSION_TABLE.delete().where(
+            VERSION_TABLE.c.repository == repository))
+
+
+def create_tables(engine, tables):
+    """Create the missing tables, along with their indexes"""
+    for table in tables:
+        table.create(engine, checkfirst=True)
+
+
+def _is_mysql(engine):
+    return engine.dialect.name == 'mysql'
+
+
+def create_index(engine, index):
+    """
+    Create index unless it exists. MySQL builds it without blocking
+    writes to the table, or fails if the server can't.
+    """
+    inspector = reflection.Inspector.from_engine(engine)
+    if index.name in [existing['name'] for existing in
+                      inspector.get_indexes(index.table.name)]:
+        return
+    LOG.info("Creating index %s on %s", index.name, index.table.name)
+    statement = str(CreateIndex(index).compile(dialect=engine.dialect))
+    if _is_mysql(engine):
+        statement += " ALGORITHM=INPLACE LOCK=NONE"
+    engine.execute(statement)
+
+
+def add_column(engine, column):
+    """
+    Add column to its table unless it exists. The column should be
+    nullable or have a server default for the rows already present.
+    """
+    table = column.table
+    inspector = reflection.Inspector.from_engine(engine)
+    if column.name in [existing['name'] for existing in
+                       inspector.get_columns(table.name)]:
+        return
+    LOG.info("Adding column %s to %s", column.name, table.name)
+    compiler = engine.dialect.ddl_compiler(engine.dialect, None)
+    statement = "ALTER TABLE %s ADD COLUMN %s" % (
+        compiler.preparer.format_table(table),
+        compiler.get_column_specification(column))
+    if _is_mysql(engine):
+        statement += ", ALGORITHM=INPLACE, LOCK=NONE"
+    engine.execute(statement)
+
+
+def bulk_insert(bind, table, rows):
+    """
+    Insert rows, a list of dictionaries with the same keys, with
+    multi-row INSERT statements issued through bind, an engine or
+    a connection.
+    """
+    if not rows:
+        return
+    preparer = bind.dialect.identifier_preparer
+    names = sorted(rows[0].keys())
+    columns = ", ".join([preparer.format_column(table.c[name])
+                         for name in names])
+    batch_size = max(1, MAX_BIND_PARAMS / len(names))
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        values = []
+        params = {}
+        for i, row in enumerate(batch):
+            values.append("(%s)" % ", ".join([":%s_%d" % (name, i)
+                                              for name in names]))
+            for name in names:
+                params["%s_%d" % (name, i)] = row[name]
+        bind.execute(text("INSERT INTO %s (%s) VALUES %s" %
+                          (preparer.format_table(table), columns,
+                           ", ".join(values))), params)
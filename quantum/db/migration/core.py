@@ -0,0 +1,70 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+# Copyright 2011 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Migrations of the networks and ports tables"""
+
+from quantum.db import migration
+from quantum.db import models
+
+REPOSITORY = 'quantum'
+TABLES = [models.Network.__table__, models.Port.__table__]
+
+
+def create_tables(engine):
+    migration.create_tables(engine, TABLES)
+
+
+def _indexes(table, column_name):
+    return [index for index in table.indexes if column_name in index.columns]
+
+
+def add_lookup_indexes(engine):
+    # Tables created by releases without migrations lack these indexes
+    networks = models.Network.__table__
+    ports = models.Port.__table__
+    # Detached ports used to store an empty interface id, which would
+    # violate the unique index
+    engine.execute(ports.update().
+                   where(ports.c.interface_id == '').
+                   values(interface_id=None))
+    for table, column_name in ((networks, 'tenant_id'),
+                               (ports, 'network_id'),
+                               (ports, 'interface_id')):
+        for index in _indexes(table, column_name):
+            migration.create_index(engine, index)
+
+
+def add_deleted_columns(engine):
+    for table in TABLES:
+        migration.add_column(engine, table.c.deleted)
+        for index in _indexes(table, 'deleted'):
+            migration.create_index(engine, index)
+
+
+def add_revision_columns(engine):
+    for table in TABLES:
+        migration.add_column(engine, table.c.revision)
+
+
+def create_change_log(engine):
+    migration.create_tables(engine, [models.Change.__table__])
+
+
+MIGRATIONS = [create_tables,
+              add_lookup_indexes,
+              add_deleted_columns,
+              add_revision_columns,
+              create_change_log]
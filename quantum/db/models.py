@@ -20,7 +20,7 @@
 
 import uuid
 
-from sqlalchemy import Column, String, ForeignKey
+from sqlalchemy import Boolean, Column, Index, Integer, String, ForeignKey
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relation, object_mapper
 
@@ -70,11 +70,21 @@ class Port(BASE, QuantumBase):
 
     uuid = Column(String(255), primary_key=True)
     network_id = Column(String(255), ForeignKey("networks.uuid"),
-                        nullable=False)
-    interface_id = Column(String(255), nullable=True)
+                        nullable=False, index=True)
+    # An interface can be plugged into a single port at a time
+    interface_id = Column(String(255), nullable=True, index=True,
+                          unique=True)
     # Port state - Hardcoding string value at the moment
     state = Column(String(8))
     op_status = Column(String(16))
+    # Tombstone left by deletes in soft delete mode
+    deleted = Column(Boolean, nullable=False, default=False,
+                     server_default='0', index=True)
+    # Incremented by every update, the API derives ETags from it
+    revision = Column(Integer, nullable=False, default=1,
+                      server_default='1')
+
+    __mapper_args__ = {'version_id_col': revision}
 
     def __init__(self, network_id,
                  op_status=common.OperationalStatus.UNKNOWN):
@@ -83,6 +93,8 @@ class Port(BASE, QuantumBase):
         self.interface_id = None
         self.state = "DOWN"
         self.op_status = op_status
+        self.deleted = False
+        self.revision = 1
 
     def __repr__(self):
         return "<Port(%s,%s,%s,%s,%s)>" % (self.uuid, self.network_id,
@@ -95,10 +107,21 @@ class Network(BASE, QuantumBase):
     __tablename__ = 'networks'
 
     uuid = Column(String(255), primary_key=True)
-    tenant_id = Column(String(255), nullable=False)
+    tenant_id = Column(String(255), nullable=False, index=True)
     name = Column(String(255))
-    ports = relation(Port, order_by=Port.uuid, backref="network")
+    ports = relation(Port, order_by=Port.uuid, backref="network",
+                     primaryjoin="and_(Network.uuid == Port.network_id, "
+                                 "Port.deleted == False)")
     op_status = Column(String(16))
+    # Tombstone left by deletes in soft delete mode
+    deleted = Column(Boolean, nullable=False, default=False,
+                     server_default='0', index=True)
+    # Incremented by every update of the network itself, not by
+    # those of its ports
+    revision = Column(Integer, nullable=False, default=1,
+                      server_default='1')
+
+    __mapper_args__ = {'version_id_col': revision}
 
     def __init__(self, tenant_id, name,
                  op_status=common.OperationalStatus.UNKNOWN):
@@ -106,7 +129,33 @@ class Network(BASE, QuantumBase):
         self.tenant_id = tenant_id
         self.name = name
         self.op_status = op_status
+        self.deleted = False
+        self.revision = 1
 
     def __repr__(self):
         return "<Network(%s,%s,%s,%s)>" % \
           (self.uuid, self.name, self.op_status, self.tenant_id)
+
+
+class Change(BASE, QuantumBase):
+    """Represents an entry of the change log"""
+    __tablename__ = 'changes'
+    # sequence numbers of pruned entries must not be reused
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    seq = Column(Integer, primary_key=True)
+    # 'network', 'port' or the binding of a plugin
+    resource = Column(String(32), nullable=False)
+    resource_id = Column(String(255), nullable=False)
+    network_id = Column(String(255))
+    # Bindings have no tenant, they are not shown to tenants
+    tenant_id = Column(String(255))
+    # 'create', 'update' or 'delete'
+    action = Column(String(16), nullable=False)
+
+    def __repr__(self):
+        return "<Change(%s,%s,%s,%s)>" % \
+          (self.seq, self.resource, self.resource_id, self.action)
+
+
+Index('ix_changes_tenant_id_seq', Change.tenant_id, Change.seq)
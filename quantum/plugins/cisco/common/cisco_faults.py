@@ -55,7 +55,7 @@ class Fault(webob.exc.HTTPException):
                 'message': self.wrapped_exc.explanation}}
         # 'code' is an attribute on the fault tag itself
         content_type = req.best_match_content_type()
-        self.wrapped_exc.body = wsgi.Serializer().\
+        self.wrapped_exc.body = wsgi.CONTENT_TYPES.get_legacy_serializer().\
         serialize(fault_data, content_type)
         self.wrapped_exc.content_type = content_type
         return self.wrapped_exc
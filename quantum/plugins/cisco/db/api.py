@@ -21,6 +21,8 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, exc, joinedload
 
 from quantum.common import exceptions as q_exc
+from quantum.db import migration
+from quantum.plugins.cisco.db import migration as cisco_migration
 from quantum.plugins.cisco.db import models
 
 _ENGINE = None
@@ -66,7 +68,8 @@ def register_models():
     """Register Models and create properties"""
     global _ENGINE
     assert _ENGINE
-    BASE.metadata.create_all(_ENGINE)
+    migration.upgrade(_ENGINE, cisco_migration.REPOSITORY,
+                      cisco_migration.MIGRATIONS)
 
 
 def unregister_models():
@@ -74,6 +77,7 @@ def unregister_models():
     global _ENGINE
     assert _ENGINE
     BASE.metadata.drop_all(_ENGINE)
+    migration.downgrade_all(_ENGINE, cisco_migration.REPOSITORY)
 
 
 def network_create(tenant_id, name):
@@ -251,6 +255,15 @@ def port_destroy(net_id, port_id):
         raise q_exc.PortNotFound(port_id=port_id)
 
 
+def port_destroy_all(net_id):
+    """Delete all ports of a network at once, attached or not"""
+    session = get_session()
+    with session.begin():
+        return session.query(models.Port).\
+          filter_by(network_id=net_id).\
+          delete(synchronize_session='evaluate')
+
+
 #methods using just port_id
 def port_get_by_id(port_id):
     session = get_session()
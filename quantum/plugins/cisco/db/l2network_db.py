@@ -18,6 +18,8 @@
 from sqlalchemy.orm import exc
 
 from quantum.common import exceptions as q_exc
+from quantum.db import api as quantum_db
+from quantum.db import migration
 from quantum.plugins.cisco import l2network_plugin_configuration as conf
 from quantum.plugins.cisco.common import cisco_exceptions as c_exc
 from quantum.plugins.cisco.db import l2network_models
@@ -37,23 +39,16 @@ def initialize():
 
 
 def create_vlanids():
-    """Prepopulates the vlan_bindings table"""
+    """Prepopulates the vlan_ids table"""
     LOG.debug("create_vlanids() called")
     session = db.get_session()
-    try:
-        vlanid = session.query(l2network_models.VlanID).\
-          one()
-    except exc.MultipleResultsFound:
-        pass
-    except exc.NoResultFound:
-        start = int(conf.VLAN_START)
-        end = int(conf.VLAN_END)
-        while start <= end:
-            vlanid = l2network_models.VlanID(start)
-            session.add(vlanid)
-            start += 1
-        session.flush()
-    return
+    if session.query(l2network_models.VlanID).first() is None:
+        rows = [{'vlan_id': vlan_id, 'vlan_used': False}
+                for vlan_id in range(int(conf.VLAN_START),
+                                     int(conf.VLAN_END) + 1)]
+        with session.begin():
+            migration.bulk_insert(session.connection(),
+                                  l2network_models.VlanID.__table__, rows)
 
 
 def get_all_vlanids():
@@ -183,9 +178,13 @@ def add_vlan_binding(vlanid, vlanname, netid):
         raise c_exc.NetworkVlanBindingAlreadyExists(vlan_id=vlanid,
                                                     network_id=netid)
     except exc.NoResultFound:
-        binding = l2network_models.VlanBinding(vlanid, vlanname, netid)
-        session.add(binding)
-        session.flush()
+        with session.begin(subtransactions=True):
+            binding = l2network_models.VlanBinding(vlanid, vlanname, netid)
+            session.add(binding)
+            session.flush()
+            quantum_db.record_changes('vlan_binding',
+                                      quantum_db.CHANGE_CREATE,
+                                      [(netid, netid)], session=session)
         return binding
 
 
@@ -197,8 +196,12 @@ def remove_vlan_binding(netid):
         binding = session.query(l2network_models.VlanBinding).\
           filter_by(network_id=netid).\
           one()
-        session.delete(binding)
-        session.flush()
+        with session.begin(subtransactions=True):
+            session.delete(binding)
+            session.flush()
+            quantum_db.record_changes('vlan_binding',
+                                      quantum_db.CHANGE_DELETE,
+                                      [(netid, netid)], session=session)
         return binding
     except exc.NoResultFound:
         pass
@@ -216,8 +219,12 @@ def update_vlan_binding(netid, newvlanid=None, newvlanname=None):
             binding["vlan_id"] = newvlanid
         if newvlanname:
             binding["vlan_name"] = newvlanname
-        session.merge(binding)
-        session.flush()
+        with session.begin(subtransactions=True):
+            session.merge(binding)
+            session.flush()
+            quantum_db.record_changes('vlan_binding',
+                                      quantum_db.CHANGE_UPDATE,
+                                      [(netid, netid)], session=session)
         return binding
     except exc.NoResultFound:
         raise q_exc.NetworkNotFound(net_id=netid)
@@ -0,0 +1,41 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2011, Cisco Systems, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Migrations of the tables of the Cisco plugin"""
+
+from quantum.db import migration
+from quantum.db import models as quantum_models
+# the model modules are imported for their tables
+from quantum.plugins.cisco.db import l2network_models
+from quantum.plugins.cisco.db import models
+from quantum.plugins.cisco.db import nexus_models
+from quantum.plugins.cisco.db import services_models
+from quantum.plugins.cisco.db import ucs_models
+
+REPOSITORY = 'cisco'
+
+
+def create_tables(engine):
+    migration.create_tables(engine, models.BASE.metadata.sorted_tables)
+
+
+def create_change_log(engine):
+    # the bindings are recorded in the change log of quantum.db.api
+    migration.create_tables(engine, [quantum_models.Change.__table__])
+
+
+MIGRATIONS = [create_tables,
+              create_change_log]
@@ -54,7 +54,7 @@ class L2Network(QuantumPluginBase):
     """
     Core API implementation
     """
-    def get_all_networks(self, tenant_id):
+    def get_all_networks(self, tenant_id, **kwargs):
         """
         Returns a dictionary containing all
         <network_uuid, network_name> for
@@ -104,8 +104,13 @@ class L2Network(QuantumPluginBase):
                 for port in ports_on_net:
                     if port[const.INTERFACEID]:
                         raise exc.NetworkInUse(net_id=net_id)
+                # release the ports on the devices, then remove them
+                # from the database all at once
                 for port in ports_on_net:
-                    self.delete_port(tenant_id, net_id, port[const.UUID])
+                    self._invoke_device_plugins("delete_port",
+                                                [tenant_id, net_id,
+                                                 port[const.UUID]])
+                db.port_destroy_all(net_id)
 
             self._invoke_device_plugins(self._func_name(), [tenant_id, net_id])
             net_dict = cutil.make_net_dict(net[const.UUID],
@@ -154,7 +159,7 @@ class L2Network(QuantumPluginBase):
                                        [])
         return net_dict
 
-    def get_all_ports(self, tenant_id, net_id):
+    def get_all_ports(self, tenant_id, net_id, **kwargs):
         """
         Retrieves all port identifiers belonging to the
         specified Virtual Network.
@@ -25,13 +25,21 @@ import time
 import signal
 
 from optparse import OptionParser
+from sqlalchemy import create_engine, func, select
 from sqlalchemy.ext.sqlsoup import SqlSoup
+from sqlalchemy.orm import scoped_session, sessionmaker
 from subprocess import *
 
+from quantum.db import api as quantum_db
+
 
 OP_STATUS_UP = "UP"
 OP_STATUS_DOWN = "DOWN"
 
+# The bindings are read from the change log, and entirely again every
+# FULL_SYNC_ITERATIONS iterations of the daemon loop
+FULL_SYNC_ITERATIONS = 150
+
 
 # A class to represent a VIF (i.e., a port that has 'iface-id' and 'vif-mac'
 # attributes set).
@@ -169,6 +177,15 @@ class OVSBridge:
         return edge_ports
 
 
+class PortBinding:
+    """The columns of a port the agent keeps between iterations"""
+
+    def __init__(self, port):
+        self.uuid = port.uuid
+        self.network_id = port.network_id
+        self.op_status = port.op_status
+
+
 class OVSQuantumAgent:
 
     def __init__(self, integ_br):
@@ -189,31 +206,107 @@ class OVSQuantumAgent:
         # switch all traffic using L2 learning
         self.int_br.add_flow(priority=1, actions="normal")
 
+    def update_op_status(self, db, new_status):
+        # Write the changed statuses in batches, within the transaction
+        # of the agent
+        statuses = dict((port.uuid, op_status)
+                        for port, op_status in new_status.iteritems()
+                        if port.op_status != op_status)
+        if statuses:
+            quantum_db.port_set_op_status_bulk(statuses, db.session())
+
+    def read_changes(self, db, last_seq):
+        """
+        Return the entries of the change log following last_seq, or
+        None if the log no longer holds all of them.
+        """
+        if last_seq is None:
+            return None
+        changes = db.changes
+        first = db.session.execute(
+            select([func.min(changes._table.c.seq)])).scalar()
+        if first is not None and last_seq < first - 1:
+            return None
+        query = changes.filter(changes.seq > last_seq)
+        return query.order_by(changes.seq).all()
+
+    def sync_bindings(self, db, all_bindings, vlan_bindings, last_seq):
+        """
+        Bring all_bindings (interface id -> port) and vlan_bindings
+        (network id -> vlan id) up to date, and return the sequence
+        number of the change log to read from next time.
+
+        Only the ports and vlan bindings listed in the change log after
+        last_seq are read, unless last_seq is None or the log was
+        pruned past it: both tables are read again then.
+        """
+        changes = self.read_changes(db, last_seq)
+        if changes is None:
+            # entries written while the tables are read are applied
+            # again next time, which is harmless
+            last_seq = db.session.execute(
+                select([func.max(db.changes._table.c.seq)])).scalar() or 0
+            all_bindings.clear()
+            for port in db.ports.all():
+                if port.interface_id:
+                    all_bindings[port.interface_id] = PortBinding(port)
+            vlan_bindings.clear()
+            for bind in db.vlan_bindings.all():
+                vlan_bindings[bind.network_id] = bind.vlan_id
+            return last_seq
+
+        port_ids = set()
+        network_ids = set()
+        for change in changes:
+            if change.resource == 'port':
+                port_ids.add(change.resource_id)
+            elif change.resource == 'vlan_binding':
+                network_ids.add(change.network_id)
+            last_seq = change.seq
+        if port_ids:
+            for interface_id, port in all_bindings.items():
+                if port.uuid in port_ids:
+                    del all_bindings[interface_id]
+            for port in db.ports.filter(db.ports.uuid.in_(port_ids)).all():
+                if port.interface_id:
+                    all_bindings[port.interface_id] = PortBinding(port)
+        if network_ids:
+            for network_id in network_ids:
+                vlan_bindings.pop(network_id, None)
+            binds = db.vlan_bindings.filter(
+                db.vlan_bindings.network_id.in_(network_ids)).all()
+            for bind in binds:
+                vlan_bindings[bind.network_id] = bind.vlan_id
+        return last_seq
+
     def daemon_loop(self, db):
         self.local_vlan_map = {}
         old_local_bindings = {}
         old_vif_ports = {}
+        all_bindings = {}
+        vlan_bindings = {}
+        last_seq = None
+        iterations = 0
 
         while True:
 
-            all_bindings = {}
-            try:
-                ports = db.ports.all()
-            except:
-                ports = []
-            for port in ports:
-                all_bindings[port.interface_id] = port
-
-            vlan_bindings = {}
+            if iterations % FULL_SYNC_ITERATIONS == 0:
+                # Entries of the change log are numbered before their
+                # transaction commits, so that concurrent writers may
+                # make one visible after a greater one already read
+                last_seq = None
+            iterations += 1
             try:
-                vlan_binds = db.vlan_bindings.all()
-            except:
-                vlan_binds = []
-            for bind in vlan_binds:
-                vlan_bindings[bind.network_id] = bind.vlan_id
+                last_seq = self.sync_bindings(db, all_bindings,
+                                              vlan_bindings, last_seq)
+            except Exception:
+                LOG.exception("Failed to read the bindings")
+                db.rollback()
+                last_seq = None
 
             new_vif_ports = {}
             new_local_bindings = {}
+            new_status = {}
             vif_ports = self.int_br.get_vif_ports()
             for p in vif_ports:
                 new_vif_ports[p.vif_id] = p
@@ -236,7 +329,7 @@ class OVSQuantumAgent:
                           % (old_b, str(p)))
                         self.port_unbound(p, True)
                         if p.vif_id in all_bindings:
-                            all_bindings[p.vif_id].op_status = OP_STATUS_DOWN
+                            new_status[all_bindings[p.vif_id]] = OP_STATUS_DOWN
                     if new_b is not None:
                         # If we don't have a binding we have to stick it on
                         # the dead vlan
@@ -244,7 +337,7 @@ class OVSQuantumAgent:
                         vlan_id = vlan_bindings.get(net_id, "4095")
                         self.port_bound(p, vlan_id)
                         if p.vif_id in all_bindings:
-                            all_bindings[p.vif_id].op_status = OP_STATUS_UP
+                            new_status[all_bindings[p.vif_id]] = OP_STATUS_UP
                         LOG.info("Adding binding to net-id = %s " \
                              "for %s on vlan %s" % (new_b, str(p), vlan_id))
 
@@ -255,13 +348,15 @@ class OVSQuantumAgent:
                         old_b = old_local_bindings[vif_id]
                         self.port_unbound(old_vif_ports[vif_id], False)
                     if vif_id in all_bindings:
-                        all_bindings[vif_id].op_status = OP_STATUS_DOWN
+                        new_status[all_bindings[vif_id]] = OP_STATUS_DOWN
 
             old_vif_ports = new_vif_ports
             old_local_bindings = new_local_bindings
+            self.update_op_status(db, new_status)
             db.commit()
             time.sleep(2)
 
+
 if __name__ == "__main__":
     usagestr = "%prog [OPTIONS] <config file>"
     parser = OptionParser(usage=usagestr)
@@ -290,7 +385,9 @@ if __name__ == "__main__":
     integ_br = config.get("OVS", "integration-bridge")
 
     options = {"sql_connection": config.get("DATABASE", "sql_connection")}
-    db = SqlSoup(options["sql_connection"])
+    engine = create_engine(options["sql_connection"])
+    # quantum.db.api writes through the session, which must know the engine
+    db = SqlSoup(engine, session=scoped_session(sessionmaker(bind=engine)))
 
     LOG.info("Connecting to database \"%s\" on %s" %
              (db.engine.url.database, db.engine.url.host))
@@ -40,19 +40,39 @@ def get_vlans():
 
 def add_vlan_binding(vlanid, netid):
     session = db.get_session()
-    binding = ovs_models.VlanBinding(vlanid, netid)
-    session.add(binding)
-    session.flush()
+    with session.begin(subtransactions=True):
+        binding = ovs_models.VlanBinding(vlanid, netid)
+        session.add(binding)
+        session.flush()
+        db.record_changes('vlan_binding', db.CHANGE_CREATE,
+                          [(netid, netid)], session=session)
     return binding.vlan_id
 
 
+def add_vlan_bindings(bindings):
+    """Add (vlan_id, network_id) bindings with a single INSERT"""
+    if not bindings:
+        return
+    session = db.get_session()
+    with session.begin(subtransactions=True):
+        session.execute(ovs_models.VlanBinding.__table__.insert(),
+                        [{'vlan_id': vlan_id, 'network_id': net_id}
+                         for vlan_id, net_id in bindings])
+        db.record_changes('vlan_binding', db.CHANGE_CREATE,
+                          [(net_id, net_id) for _vlan_id, net_id in bindings],
+                          session=session)
+
+
 def remove_vlan_binding(netid):
     session = db.get_session()
-    try:
-        binding = session.query(ovs_models.VlanBinding).\
-          filter_by(network_id=netid).\
-          one()
-        session.delete(binding)
-    except exc.NoResultFound:
+    with session.begin(subtransactions=True):
+        try:
+            binding = session.query(ovs_models.VlanBinding).\
+              filter_by(network_id=netid).\
+              one()
+            session.delete(binding)
+            db.record_changes('vlan_binding', db.CHANGE_DELETE,
+                              [(netid, netid)], session=session)
+        except exc.NoResultFound:
             pass
-    session.flush()
+        session.flush()
@@ -23,6 +23,7 @@ from optparse import OptionParser
 import os
 import sys
 
+from quantum.api import filters
 from quantum.api.api_common import OperationalStatus
 from quantum.common import exceptions as q_exc
 from quantum.common.config import find_config_file
@@ -30,6 +31,7 @@ from quantum.quantum_plugin_base import QuantumPluginBase
 
 import quantum.db.api as db
 import ovs_db
+import ovs_migration
 
 CONF_FILE = find_config_file(
   {"config_file": "etc/quantum/plugins/openvswitch/ovs_quantum_plugin.ini"},
@@ -86,8 +88,10 @@ class OVSQuantumPlugin(QuantumPluginBase):
         config.read(configfile)
         LOG.debug("Config: %s" % config)
 
-        options = {"sql_connection": config.get("DATABASE", "sql_connection")}
+        # sql_connection along with the optional connection pool settings
+        options = dict(config.items("DATABASE"))
         db.configure_db(options)
+        db.upgrade_schema(ovs_migration.REPOSITORY, ovs_migration.MIGRATIONS)
 
         self.vmap = VlanMap()
         # Populate the map with anything that is already present in the
@@ -99,9 +103,12 @@ class OVSQuantumPlugin(QuantumPluginBase):
             #                                   % (vlan_id, network_id))
             self.vmap.set(vlan_id, network_id)
 
-    def get_all_networks(self, tenant_id):
+    def get_all_networks(self, tenant_id, **kwargs):
+        filter_opts = kwargs.get('filter_opts', {})
+        db_filters = filters.pop_db_filters(filter_opts,
+                                            filters.NETWORK_FILTERS)
         nets = []
-        for x in db.network_list(tenant_id):
+        for x in db.network_list_rows(tenant_id, **db_filters):
             LOG.debug("Adding network: %s" % x.uuid)
             nets.append(self._make_net_dict(str(x.uuid), x.name,
                                             None, x.op_status))
@@ -124,8 +131,17 @@ class OVSQuantumPlugin(QuantumPluginBase):
         return self._make_net_dict(str(net.uuid), net.name, [],
                                         net.op_status)
 
+    def create_networks_bulk(self, tenant_id, net_names, **kwargs):
+        nets = db.network_create_bulk(tenant_id, net_names,
+                                      op_status=OperationalStatus.UP)
+        LOG.debug("Created %d networks" % len(nets))
+        ovs_db.add_vlan_bindings([(self.vmap.acquire(str(net.uuid)),
+                                   str(net.uuid)) for net in nets])
+        return [self._make_net_dict(str(net.uuid), net.name, [],
+                                    net.op_status) for net in nets]
+
     def delete_network(self, tenant_id, net_id):
-        net = db.network_get(net_id)
+        db.network_lookup(net_id)
 
         # Verify that no attachments are plugged into the network
         for port in db.port_list(net_id):
@@ -140,8 +156,18 @@ class OVSQuantumPlugin(QuantumPluginBase):
     def get_network_details(self, tenant_id, net_id):
         net = db.network_get(net_id)
         ports = self.get_all_ports(tenant_id, net_id)
-        return self._make_net_dict(str(net.uuid), net.name,
+        res = self._make_net_dict(str(net.uuid), net.name,
                                     ports, net.op_status)
+        res['net-revision'] = net.revision
+        return res
+
+    def get_network_with_ports(self, tenant_id, net_id):
+        net = db.network_get_with_ports(net_id)
+        ports = [self._make_port_dict(port) for port in net.ports]
+        res = self._make_net_dict(str(net.uuid), net.name,
+                                  ports, net.op_status)
+        res['net-revision'] = net.revision
+        return res
 
     def update_network(self, tenant_id, net_id, **kwargs):
         net = db.network_update(net_id, tenant_id, **kwargs)
@@ -158,11 +184,18 @@ class OVSQuantumPlugin(QuantumPluginBase):
                 'port-state': port.state,
                 'port-op-status': op_status,
                 'net-id': port.network_id,
-                'attachment': port.interface_id}
-
-    def get_all_ports(self, tenant_id, net_id):
-        ids = []
-        ports = db.port_list(net_id)
+                'attachment': port.interface_id,
+                'port-revision': port.revision}
+
+    def get_all_ports(self, tenant_id, net_id, **kwargs):
+        filter_opts = kwargs.get('filter_opts', {})
+        # the operational status of a port is reported as DOWN while
+        # the port is down, whatever the one stored: leave it to the API
+        db_filters = filters.pop_db_filters(filter_opts,
+            dict((name, column)
+                 for name, column in filters.PORT_FILTERS.iteritems()
+                 if name != 'op-status'))
+        ports = db.port_list_rows(net_id, **db_filters)
         return [{'port-id': str(p.uuid)} for p in ports]
 
     def create_port(self, tenant_id, net_id, port_state=None, **kwargs):
@@ -171,6 +204,13 @@ class OVSQuantumPlugin(QuantumPluginBase):
                                 op_status=OperationalStatus.DOWN)
         return self._make_port_dict(port)
 
+    def create_ports_bulk(self, tenant_id, net_id, port_states, **kwargs):
+        LOG.debug("Creating %d ports with network_id: %s"
+                  % (len(port_states), net_id))
+        ports = db.port_create_bulk(net_id, port_states,
+                                    op_status=OperationalStatus.DOWN)
+        return [self._make_port_dict(port) for port in ports]
+
     def delete_port(self, tenant_id, net_id, port_id):
         port = db.port_destroy(port_id, net_id)
         return self._make_port_dict(port)
@@ -180,8 +220,7 @@ class OVSQuantumPlugin(QuantumPluginBase):
         Updates the state of a port on the specified Virtual Network.
         """
         LOG.debug("update_port() called\n")
-        port = db.port_get(port_id, net_id)
-        db.port_update(port_id, net_id, **kwargs)
+        port = db.port_update(port_id, net_id, **kwargs)
         return self._make_port_dict(port)
 
     def get_port_details(self, tenant_id, net_id, port_id):
@@ -198,3 +237,18 @@ class OVSQuantumPlugin(QuantumPluginBase):
     def get_interface_details(self, tenant_id, net_id, port_id):
         res = db.port_get(port_id, net_id)
         return res.interface_id
+
+    def get_changes(self, tenant_id, since=None, limit=None):
+        if since is None:
+            return {'changes': [], 'last-seq': db.change_last_seq()}
+        changes, last_seq = db.change_page(since, tenant_id, limit)
+        return {'changes': [{'seq': change.seq,
+                             'resource': change.resource,
+                             'id': change.resource_id,
+                             'network-id': change.network_id,
+                             'action': change.action}
+                            for change in changes],
+                'last-seq': last_seq}
+
+    def wait_changes(self, tenant_id, since, timeout):
+        return db.change_wait(since, tenant_id, timeout)
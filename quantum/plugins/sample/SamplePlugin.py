@@ -16,14 +16,22 @@
 # @author: Somik Behera, Nicira Networks, Inc.
 # @author: Salvatore Orlando, Citrix
 
+import collections
 import logging
+import time
+import uuid
 
+from quantum.api import filters
 from quantum.api.api_common import OperationalStatus
+from quantum.common import changes
 from quantum.common import exceptions as exc
 from quantum.db import api as db
 
 LOG = logging.getLogger('quantum.plugins.sample.SamplePlugin')
 
+# Number of entries MemoryPlugin keeps in its change log
+MEMORY_CHANGE_LOG_SIZE = 100000
+
 
 class QuantumEchoPlugin(object):
 
@@ -35,7 +43,7 @@ class QuantumEchoPlugin(object):
     the name of the method that was called.
     """
 
-    def get_all_networks(self, tenant_id):
+    def get_all_networks(self, tenant_id, **kwargs):
         """
         Returns a dictionary containing all
         <network_uuid, network_name> for
@@ -67,7 +75,7 @@ class QuantumEchoPlugin(object):
     def update_network(self, tenant_id, net_id, **kwargs):
         print("update_network() called")
 
-    def get_all_ports(self, tenant_id, net_id):
+    def get_all_ports(self, tenant_id, net_id, **kwargs):
         """
         Retrieves all port identifiers belonging to the
         specified Virtual Network.
@@ -140,14 +148,19 @@ class FakePlugin(object):
             raise exc.NetworkNotFound(net_id=network_id)
         return network
 
+    def _verify_network(self, tenant_id, network_id):
+        # Cheaper than _get_network, as db.network_lookup is cached
+        if db.network_lookup(network_id)[0] != tenant_id:
+            raise exc.NetworkNotFound(net_id=network_id)
+
     def _get_port(self, tenant_id, network_id, port_id):
-        net = self._get_network(tenant_id, network_id)
+        self._verify_network(tenant_id, network_id)
         try:
             port = db.port_get(port_id, network_id)
         except:
             raise exc.PortNotFound(net_id=network_id, port_id=port_id)
         # Port must exist and belong to the appropriate network.
-        if port['network_id'] != net['uuid']:
+        if port['network_id'] != network_id:
             raise exc.PortNotFound(net_id=network_id, port_id=port_id)
         return port
 
@@ -156,24 +169,18 @@ class FakePlugin(object):
             raise exc.StateInvalid(port_state=port_state)
         return True
 
-    def _validate_attachment(self, tenant_id, network_id, port_id,
-                             remote_interface_id):
-        for port in db.port_list(network_id):
-            if port['interface_id'] == remote_interface_id:
-                raise exc.AlreadyAttached(net_id=network_id,
-                                          port_id=port_id,
-                                          att_id=port['interface_id'],
-                                          att_port_id=port['uuid'])
-
-    def get_all_networks(self, tenant_id):
+    def get_all_networks(self, tenant_id, **kwargs):
         """
         Returns a dictionary containing all
         <network_uuid, network_name> for
         the specified tenant.
         """
         LOG.debug("FakePlugin.get_all_networks() called")
+        filter_opts = kwargs.get('filter_opts', {})
+        db_filters = filters.pop_db_filters(filter_opts,
+                                            filters.NETWORK_FILTERS)
         nets = []
-        for net in db.network_list(tenant_id):
+        for net in db.network_list_rows(tenant_id, **db_filters):
             net_item = {'net-id': str(net.uuid),
                         'net-name': net.name,
                         'net-op-status': net.op_status}
@@ -192,6 +199,26 @@ class FakePlugin(object):
         return {'net-id': str(net.uuid),
                 'net-name': net.name,
                 'net-op-status': net.op_status,
+                'net-revision': net.revision,
+                'net-ports': ports}
+
+    def get_network_with_ports(self, tenant_id, net_id):
+        """
+        Retrieves the details of a network along with the
+        details of all of its ports.
+        """
+        LOG.debug("FakePlugin.get_network_with_ports() called")
+        net = db.network_get_with_ports(net_id)
+        ports = [{'port-id': str(port.uuid),
+                  'attachment': port.interface_id,
+                  'port-state': port.state,
+                  'port-op-status': port.op_status,
+                  'port-revision': port.revision}
+                 for port in net.ports]
+        return {'net-id': str(net.uuid),
+                'net-name': net.name,
+                'net-op-status': net.op_status,
+                'net-revision': net.revision,
                 'net-ports': ports}
 
     def create_network(self, tenant_id, net_name, **kwargs):
@@ -200,13 +227,21 @@ class FakePlugin(object):
         a symbolic name.
         """
         LOG.debug("FakePlugin.create_network() called")
-        new_net = db.network_create(tenant_id, net_name)
-        # Put operational status UP
-        db.network_update(new_net.uuid, net_name,
-                          op_status=OperationalStatus.UP)
+        # Put operational status UP, in the single change creating it
+        new_net = db.network_create(tenant_id, net_name,
+                                    op_status=OperationalStatus.UP)
         # Return uuid for newly created network as net-id.
         return {'net-id': new_net.uuid}
 
+    def create_networks_bulk(self, tenant_id, net_names, **kwargs):
+        """
+        Creates a Virtual Network for each of the specified names.
+        """
+        LOG.debug("FakePlugin.create_networks_bulk() called")
+        nets = db.network_create_bulk(tenant_id, net_names,
+                                      op_status=OperationalStatus.UP)
+        return [{'net-id': net.uuid} for net in nets]
+
     def delete_network(self, tenant_id, net_id):
         """
         Deletes the network with the specified network identifier
@@ -232,14 +267,17 @@ class FakePlugin(object):
         net = db.network_update(net_id, tenant_id, **kwargs)
         return net
 
-    def get_all_ports(self, tenant_id, net_id):
+    def get_all_ports(self, tenant_id, net_id, **kwargs):
         """
         Retrieves all port identifiers belonging to the
         specified Virtual Network.
         """
         LOG.debug("FakePlugin.get_all_ports() called")
+        filter_opts = kwargs.get('filter_opts', {})
+        db_filters = filters.pop_db_filters(filter_opts,
+                                            filters.PORT_FILTERS)
         port_ids = []
-        ports = db.port_list(net_id)
+        ports = db.port_list_rows(net_id, **db_filters)
         for x in ports:
             d = {'port-id': str(x.uuid)}
             port_ids.append(d)
@@ -255,7 +293,8 @@ class FakePlugin(object):
         return {'port-id': str(port.uuid),
                 'attachment': port.interface_id,
                 'port-state': port.state,
-                'port-op-status': port.op_status}
+                'port-op-status': port.op_status,
+                'port-revision': port.revision}
 
     def create_port(self, tenant_id, net_id, port_state=None, **kwargs):
         """
@@ -263,7 +302,7 @@ class FakePlugin(object):
         """
         LOG.debug("FakePlugin.create_port() called")
         # verify net_id
-        self._get_network(tenant_id, net_id)
+        self._verify_network(tenant_id, net_id)
         port = db.port_create(net_id, port_state)
         # Put operational status UP
         db.port_update(port.uuid, net_id,
@@ -271,13 +310,25 @@ class FakePlugin(object):
         port_item = {'port-id': str(port.uuid)}
         return port_item
 
+    def create_ports_bulk(self, tenant_id, net_id, port_states, **kwargs):
+        """
+        Creates a port on the specified Virtual Network for each
+        of the specified states.
+        """
+        LOG.debug("FakePlugin.create_ports_bulk() called")
+        # verify net_id
+        self._verify_network(tenant_id, net_id)
+        ports = db.port_create_bulk(net_id, port_states,
+                                    op_status=OperationalStatus.UP)
+        return [{'port-id': str(port.uuid)} for port in ports]
+
     def update_port(self, tenant_id, net_id, port_id, **kwargs):
         """
         Updates the attributes of a port on the specified Virtual Network.
         """
         LOG.debug("FakePlugin.update_port() called")
         #validate port and network ids
-        self._get_network(tenant_id, net_id)
+        self._verify_network(tenant_id, net_id)
         self._get_port(tenant_id, net_id, port_id)
         port = db.port_update(port_id, net_id, **kwargs)
         port_item = {'port-id': port_id,
@@ -292,7 +343,6 @@ class FakePlugin(object):
         is deleted.
         """
         LOG.debug("FakePlugin.delete_port() called")
-        net = self._get_network(tenant_id, net_id)
         port = self._get_port(tenant_id, net_id, port_id)
         if port['interface_id']:
             raise exc.PortInUse(net_id=net_id, port_id=port_id,
@@ -311,13 +361,8 @@ class FakePlugin(object):
         specified Virtual Network.
         """
         LOG.debug("FakePlugin.plug_interface() called")
-        port = self._get_port(tenant_id, net_id, port_id)
-        # Validate attachment
-        self._validate_attachment(tenant_id, net_id, port_id,
-                                  remote_interface_id)
-        if port['interface_id']:
-            raise exc.PortInUse(net_id=net_id, port_id=port_id,
-                                att_id=port['interface_id'])
+        # The DB layer verifies that the port exists, that it is not in
+        # use, and that the interface is not plugged elsewhere
         db.port_set_attachment(port_id, net_id, remote_interface_id)
 
     def unplug_interface(self, tenant_id, net_id, port_id):
@@ -330,3 +375,398 @@ class FakePlugin(object):
         # TODO(salvatore-orlando):
         # Should unplug on port without attachment raise an Error?
         db.port_unset_attachment(port_id, net_id)
+
+    def get_changes(self, tenant_id, since=None, limit=None):
+        """
+        Retrieves the changes made to the networks and ports of the
+        specified tenant after sequence number since, along with the
+        sequence number to ask for next. Without since, only that
+        sequence number is returned.
+        """
+        LOG.debug("FakePlugin.get_changes() called")
+        if since is None:
+            return {'changes': [], 'last-seq': db.change_last_seq()}
+        changes, last_seq = db.change_page(since, tenant_id, limit)
+        return {'changes': [{'seq': change.seq,
+                             'resource': change.resource,
+                             'id': change.resource_id,
+                             'network-id': change.network_id,
+                             'action': change.action}
+                            for change in changes],
+                'last-seq': last_seq}
+
+    def wait_changes(self, tenant_id, since, timeout):
+        """
+        Waits up to timeout seconds for changes made to the networks
+        and ports of the specified tenant after sequence number since,
+        and returns whether there are some.
+        """
+        LOG.debug("FakePlugin.wait_changes() called")
+        return db.change_wait(since, tenant_id, timeout)
+
+
+class _MemoryNetwork(object):
+
+    __slots__ = ('uuid', 'tenant_id', 'name', 'op_status', 'revision',
+                 'ports')
+
+    def __init__(self, tenant_id, name):
+        self.uuid = str(uuid.uuid4())
+        self.tenant_id = tenant_id
+        self.name = name
+        self.op_status = OperationalStatus.UP
+        self.revision = 1
+        # port uuid -> _MemoryPort
+        self.ports = {}
+
+
+class _MemoryPort(object):
+
+    __slots__ = ('uuid', 'network_id', 'state', 'op_status', 'interface_id',
+                 'revision')
+
+    def __init__(self, network_id, state):
+        self.uuid = str(uuid.uuid4())
+        self.network_id = network_id
+        self.state = state or 'DOWN'
+        self.op_status = OperationalStatus.UP
+        self.interface_id = None
+        self.revision = 1
+
+
+class MemoryPlugin(object):
+    """
+    MemoryPlugin keeps networks and ports in dictionaries, without
+    any database. It serves to measure the throughput of the API
+    stack alone, and as a fast backend for functional tests.
+
+    Networks are indexed by uuid and by tenant, ports by network and
+    attached interface, so that every operation but listings runs in
+    constant time. Operations never yield to other greenthreads, so
+    they need no locking.
+    """
+
+    def __init__(self):
+        # net uuid -> _MemoryNetwork
+        self._networks = {}
+        # tenant id -> set of net uuids
+        self._tenant_networks = {}
+        # interface id -> _MemoryPort
+        self._attachments = {}
+        # (seq, tenant id, change) of the last changes, oldest first
+        self._changes = collections.deque(maxlen=MEMORY_CHANGE_LOG_SIZE)
+        self._last_seq = 0
+        self._change_notifier = changes.ChangeNotifier()
+
+    def _get_network(self, tenant_id, network_id):
+        net = self._networks.get(network_id)
+        if net is None or net.tenant_id != tenant_id:
+            raise exc.NetworkNotFound(net_id=network_id)
+        return net
+
+    def _get_port(self, tenant_id, network_id, port_id):
+        port = self._get_network(tenant_id, network_id).ports.get(port_id)
+        if port is None:
+            raise exc.PortNotFound(net_id=network_id, port_id=port_id)
+        return port
+
+    def _validate_port_state(self, port_state):
+        if port_state not in ('ACTIVE', 'DOWN'):
+            raise exc.StateInvalid(port_state=port_state)
+
+    def _network_item(self, net):
+        return {'net-id': net.uuid,
+                'net-name': net.name,
+                'net-op-status': net.op_status,
+                'net-revision': net.revision}
+
+    def _port_item(self, port):
+        return {'port-id': port.uuid,
+                'attachment': port.interface_id,
+                'port-state': port.state,
+                'port-op-status': port.op_status,
+                'port-revision': port.revision}
+
+    def _record_change(self, tenant_id, resource, resource_id,
+                       network_id, action):
+        self._last_seq += 1
+        self._changes.append((self._last_seq, tenant_id,
+                              {'seq': self._last_seq,
+                               'resource': resource,
+                               'id': resource_id,
+                               'network-id': network_id,
+                               'action': action}))
+        self._change_notifier.notify()
+
+    def _record_port_change(self, tenant_id, port, action):
+        self._record_change(tenant_id, 'port', port.uuid, port.network_id,
+                            action)
+
+    def _sorted_ports(self, net):
+        return [net.ports[port_id] for port_id in sorted(net.ports)]
+
+    def _add_network(self, tenant_id, net_name):
+        net = _MemoryNetwork(tenant_id, net_name)
+        self._networks[net.uuid] = net
+        self._tenant_networks.setdefault(tenant_id, set()).add(net.uuid)
+        self._record_change(tenant_id, 'network', net.uuid, net.uuid,
+                            changes.CHANGE_CREATE)
+        return net
+
+    def get_all_networks(self, tenant_id, **kwargs):
+        """
+        Returns a dictionary containing all
+        <network_uuid, network_name> for
+        the specified tenant.
+        """
+        LOG.debug("MemoryPlugin.get_all_networks() called")
+        # filter_opts are left to the API: the items hold every key it
+        # filters on, so it does not need to fetch their details
+        return [self._network_item(self._networks[net_id])
+                for net_id in sorted(self._tenant_networks.get(tenant_id,
+                                                               ()))]
+
+    def get_network_details(self, tenant_id, net_id):
+        """
+        retrieved a list of all the remote vifs that
+        are attached to the network
+        """
+        LOG.debug("MemoryPlugin.get_network_details() called")
+        net = self._get_network(tenant_id, net_id)
+        result = self._network_item(net)
+        result['net-ports'] = [{'port-id': port_id}
+                               for port_id in sorted(net.ports)]
+        return result
+
+    def get_network_with_ports(self, tenant_id, net_id):
+        """
+        Retrieves the details of a network along with the
+        details of all of its ports.
+        """
+        LOG.debug("MemoryPlugin.get_network_with_ports() called")
+        net = self._get_network(tenant_id, net_id)
+        result = self._network_item(net)
+        result['net-ports'] = [self._port_item(port)
+                               for port in self._sorted_ports(net)]
+        return result
+
+    def create_network(self, tenant_id, net_name, **kwargs):
+        """
+        Creates a new Virtual Network, and assigns it
+        a symbolic name.
+        """
+        LOG.debug("MemoryPlugin.create_network() called")
+        net = self._add_network(tenant_id, net_name)
+        return {'net-id': net.uuid}
+
+    def create_networks_bulk(self, tenant_id, net_names, **kwargs):
+        """
+        Creates a Virtual Network for each of the specified names.
+        """
+        LOG.debug("MemoryPlugin.create_networks_bulk() called")
+        return [{'net-id': self._add_network(tenant_id, net_name).uuid}
+                for net_name in net_names]
+
+    def delete_network(self, tenant_id, net_id):
+        """
+        Deletes the network with the specified network identifier
+        belonging to the specified tenant.
+        """
+        LOG.debug("MemoryPlugin.delete_network() called")
+        net = self._get_network(tenant_id, net_id)
+        for port in net.ports.itervalues():
+            if port.interface_id:
+                raise exc.NetworkInUse(net_id=net_id)
+        for port in self._sorted_ports(net):
+            self._record_port_change(tenant_id, port, changes.CHANGE_DELETE)
+        self._record_change(tenant_id, 'network', net_id, net_id,
+                            changes.CHANGE_DELETE)
+        del self._networks[net_id]
+        tenant_networks = self._tenant_networks[tenant_id]
+        tenant_networks.discard(net_id)
+        if not tenant_networks:
+            del self._tenant_networks[tenant_id]
+        return {'net-id': net_id}
+
+    def update_network(self, tenant_id, net_id, **kwargs):
+        """
+        Updates the attributes of a particular Virtual Network.
+        """
+        LOG.debug("MemoryPlugin.update_network() called")
+        net = self._get_network(tenant_id, net_id)
+        if 'name' in kwargs:
+            net.name = kwargs['name']
+        if 'op_status' in kwargs:
+            net.op_status = kwargs['op_status']
+        net.revision += 1
+        self._record_change(tenant_id, 'network', net_id, net_id,
+                            changes.CHANGE_UPDATE)
+        return self._network_item(net)
+
+    def get_all_ports(self, tenant_id, net_id, **kwargs):
+        """
+        Retrieves all port identifiers belonging to the
+        specified Virtual Network.
+        """
+        LOG.debug("MemoryPlugin.get_all_ports() called")
+        net = self._get_network(tenant_id, net_id)
+        # as for networks, filter_opts are left to the API
+        return [self._port_item(port) for port in self._sorted_ports(net)]
+
+    def get_port_details(self, tenant_id, net_id, port_id):
+        """
+        This method allows the user to retrieve a remote interface
+        that is attached to this particular port.
+        """
+        LOG.debug("MemoryPlugin.get_port_details() called")
+        return self._port_item(self._get_port(tenant_id, net_id, port_id))
+
+    def create_port(self, tenant_id, net_id, port_state=None, **kwargs):
+        """
+        Creates a port on the specified Virtual Network.
+        """
+        LOG.debug("MemoryPlugin.create_port() called")
+        return self.create_ports_bulk(tenant_id, net_id, [port_state])[0]
+
+    def create_ports_bulk(self, tenant_id, net_id, port_states, **kwargs):
+        """
+        Creates a port on the specified Virtual Network for each
+        of the specified states.
+        """
+        LOG.debug("MemoryPlugin.create_ports_bulk() called")
+        net = self._get_network(tenant_id, net_id)
+        # validate before creating anything, all ports are created or none
+        for port_state in port_states:
+            if port_state:
+                self._validate_port_state(port_state)
+        result = []
+        for port_state in port_states:
+            port = _MemoryPort(net_id, port_state)
+            net.ports[port.uuid] = port
+            self._record_port_change(tenant_id, port, changes.CHANGE_CREATE)
+            result.append({'port-id': port.uuid})
+        return result
+
+    def update_port(self, tenant_id, net_id, port_id, **kwargs):
+        """
+        Updates the attributes of a port on the specified Virtual Network.
+        """
+        LOG.debug("MemoryPlugin.update_port() called")
+        port = self._get_port(tenant_id, net_id, port_id)
+        if 'state' in kwargs:
+            self._validate_port_state(kwargs['state'])
+            port.state = kwargs['state']
+        if 'op_status' in kwargs:
+            port.op_status = kwargs['op_status']
+        port.revision += 1
+        self._record_port_change(tenant_id, port, changes.CHANGE_UPDATE)
+        return {'port-id': port_id,
+                'port-state': port.state}
+
+    def delete_port(self, tenant_id, net_id, port_id):
+        """
+        Deletes a port on a specified Virtual Network,
+        if the port contains a remote interface attachment,
+        the remote interface is first un-plugged and then the port
+        is deleted.
+        """
+        LOG.debug("MemoryPlugin.delete_port() called")
+        port = self._get_port(tenant_id, net_id, port_id)
+        if port.interface_id:
+            raise exc.PortInUse(net_id=net_id, port_id=port_id,
+                                att_id=port.interface_id)
+        self._record_port_change(tenant_id, port, changes.CHANGE_DELETE)
+        del self._networks[net_id].ports[port_id]
+        return {'port-id': port_id}
+
+    def plug_interface(self, tenant_id, net_id, port_id, remote_interface_id):
+        """
+        Attaches a remote interface to the specified port on the
+        specified Virtual Network.
+        """
+        LOG.debug("MemoryPlugin.plug_interface() called")
+        port = self._get_port(tenant_id, net_id, port_id)
+        if remote_interface_id == "":
+            # Plugging an empty interface detaches the port, as in the DB
+            self.unplug_interface(tenant_id, net_id, port_id)
+            return
+        if port.interface_id:
+            raise exc.PortInUse(net_id=net_id, port_id=port_id,
+                                att_id=port.interface_id)
+        attached_port = self._attachments.get(remote_interface_id)
+        if attached_port is not None:
+            raise exc.AlreadyAttached(net_id=net_id,
+                                      port_id=port_id,
+                                      att_id=remote_interface_id,
+                                      att_port_id=attached_port.uuid)
+        port.interface_id = remote_interface_id
+        port.revision += 1
+        self._attachments[remote_interface_id] = port
+        self._record_port_change(tenant_id, port, changes.CHANGE_UPDATE)
+
+    def unplug_interface(self, tenant_id, net_id, port_id):
+        """
+        Detaches a remote interface from the specified port on the
+        specified Virtual Network.
+        """
+        LOG.debug("MemoryPlugin.unplug_interface() called")
+        port = self._get_port(tenant_id, net_id, port_id)
+        if port.interface_id:
+            del self._attachments[port.interface_id]
+            port.interface_id = None
+            port.revision += 1
+            self._record_port_change(tenant_id, port, changes.CHANGE_UPDATE)
+
+    def get_changes(self, tenant_id, since=None, limit=None):
+        """
+        Retrieves the changes made to the networks and ports of the
+        specified tenant after sequence number since, along with the
+        sequence number to ask for next. Without since, only that
+        sequence number is returned.
+        """
+        LOG.debug("MemoryPlugin.get_changes() called")
+        if since is None:
+            return {'changes': [], 'last-seq': self._last_seq}
+        if self._changes and since < self._changes[0][0] - 1:
+            raise exc.ChangesExpired(since=since)
+        tenant_changes = []
+        last_seq = max(since, self._last_seq)
+        # the log is scanned from its end, back to since
+        for seq, change_tenant_id, change in reversed(self._changes):
+            if seq <= since:
+                break
+            if change_tenant_id == tenant_id:
+                tenant_changes.append(change)
+        tenant_changes.reverse()
+        if limit is not None and len(tenant_changes) > limit:
+            tenant_changes = tenant_changes[:limit]
+            last_seq = tenant_changes[-1]['seq']
+        return {'changes': tenant_changes, 'last-seq': last_seq}
+
+    def _has_changes(self, tenant_id, since):
+        if self._changes and since < self._changes[0][0] - 1:
+            # get_changes raises ChangesExpired
+            return True
+        for seq, change_tenant_id, _change in reversed(self._changes):
+            if seq <= since:
+                break
+            if change_tenant_id == tenant_id:
+                return True
+        return False
+
+    def wait_changes(self, tenant_id, since, timeout):
+        """
+        Waits up to timeout seconds for changes made to the networks
+        and ports of the specified tenant after sequence number since,
+        and returns whether there are some.
+        """
+        LOG.debug("MemoryPlugin.wait_changes() called")
+        deadline = time.time() + timeout
+        while True:
+            count = self._change_notifier.count
+            if self._has_changes(tenant_id, since):
+                return True
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return False
+            self._change_notifier.wait(count, remaining)
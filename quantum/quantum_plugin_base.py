@@ -31,11 +31,16 @@ class QuantumPluginBase(object):
     __metaclass__ = ABCMeta
 
     @abstractmethod
-    def get_all_networks(self, tenant_id):
+    def get_all_networks(self, tenant_id, **kwargs):
         """
         Returns a dictionary containing all
         <network_uuid, network_name> for
         the specified tenant.
+
+        kwargs may contain filter_opts, a dictionary of the filters
+        ('name', 'op-status') and pagination options ('marker', 'limit')
+        requested by the client. The plugin may apply some of them and
+        remove them from filter_opts; the API applies the remaining ones.
         :returns: a list of mapping sequences with the following signature:
                      [ {'net-id': uuid that uniquely identifies
                                       the particular quantum network,
@@ -119,11 +124,14 @@ class QuantumPluginBase(object):
         pass
 
     @abstractmethod
-    def get_all_ports(self, tenant_id, net_id):
+    def get_all_ports(self, tenant_id, net_id, **kwargs):
         """
         Retrieves all port identifiers belonging to the
         specified Virtual Network.
 
+        kwargs may contain filter_opts, as for get_all_networks; port
+        filters are 'state', 'op-status' and 'attachment'.
+
         :returns: a list of mapping sequences with the following signature:
                      [ {'port-id': uuid representing a particular port
                                     on the specified quantum network
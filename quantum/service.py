@@ -19,6 +19,7 @@ import logging
 from quantum.common import config
 from quantum import wsgi
 from quantum.common import exceptions as exception
+from quantum.db import api as db
 
 
 LOG = logging.getLogger('quantum.service')
@@ -49,6 +50,11 @@ class WsgiService(object):
 class QuantumApiService(WsgiService):
     """Class for quantum-api service."""
 
+    def start(self):
+        super(QuantumApiService, self).start()
+        # The plugin has configured the database while loading the app
+        db.start_change_log_pruner()
+
     @classmethod
     def create(cls, conf=None, options=None, args=None):
         app_name = "quantum"
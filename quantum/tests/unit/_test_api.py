@@ -18,13 +18,21 @@
 #    @author: Salvatore Orlando, Citrix Systems
 
 import logging
+import time
 import unittest
 
+import eventlet
+
 import quantum.tests.unit.testlib_api as testlib
 
+from quantum import manager
+from quantum.api import changes
+from quantum.api import middleware
 from quantum.db import api as db
+from quantum.common import exceptions as exception
 from quantum.common import utils
 from quantum.common.test_lib import test_config
+from quantum.tests.unit.test_database import StatementCounter
 from quantum.wsgi import XMLDeserializer, JSONDeserializer
 
 LOG = logging.getLogger('quantum.tests.test_api')
@@ -38,6 +46,17 @@ class AbstractAPITest(unittest.TestCase):
     Defined according to operations defined for Quantum API v1.0
 
     """
+    counter = None
+
+    def _count_selects(self, request):
+        """Returns the response to request and the SELECTs it issued"""
+        if AbstractAPITest.counter is None:
+            AbstractAPITest.counter = StatementCounter(db._ENGINE)
+        self.counter.start()
+        try:
+            return request.get_response(self.api), self.counter.count('SELECT')
+        finally:
+            self.counter.stop()
 
     def _deserialize_net_response(self, content_type, response):
         network_data = self._net_deserializers[content_type].\
@@ -112,6 +131,43 @@ class AbstractAPITest(unittest.TestCase):
         LOG.debug("_test_create_network_badrequest - fmt:%s - END",
                   fmt)
 
+    def _test_create_networks_bulk(self, fmt):
+        LOG.debug("_test_create_networks_bulk - fmt:%s - START", fmt)
+        content_type = "application/%s" % fmt
+        body = {'networks': [{'name': 'net_1'}, {'name': 'net_2'}]}
+        network_req = testlib.new_network_request(self.tenant_id,
+                                                  format=fmt,
+                                                  custom_req_body=body)
+        network_res = network_req.get_response(self.api)
+        self.assertEqual(network_res.status_int, 202)
+        network_data = self._net_deserializers[content_type].\
+                            deserialize(network_res.body)['body']
+        self.assertEqual(len(network_data['networks']), 2)
+        for network in network_data['networks']:
+            show_network_req = testlib.show_network_request(self.tenant_id,
+                                                            network['id'],
+                                                            fmt)
+            show_network_res = show_network_req.get_response(self.api)
+            self.assertEqual(show_network_res.status_int, 200)
+        LOG.debug("_test_create_networks_bulk - fmt:%s - END", fmt)
+
+    def _test_create_networks_bulk_badrequest(self, fmt):
+        LOG.debug("_test_create_networks_bulk_badrequest - fmt:%s - START",
+                  fmt)
+        bad_body = {'networks': [{'name': 'net_1'},
+                                 {'bad-attribute': 'very-bad'}]}
+        self._create_network(fmt, custom_req_body=bad_body,
+                             expected_res_status=400)
+        list_network_req = testlib.network_list_request(self.tenant_id,
+                                                        fmt)
+        list_network_res = list_network_req.get_response(self.api)
+        network_data = self._net_deserializers["application/%s" % fmt].\
+                            deserialize(list_network_res.body)['body']
+        # no network should have been created
+        self.assertFalse(network_data['networks'])
+        LOG.debug("_test_create_networks_bulk_badrequest - fmt:%s - END",
+                  fmt)
+
     def _test_list_networks(self, fmt):
         LOG.debug("_test_list_networks - fmt:%s - START", fmt)
         content_type = "application/%s" % fmt
@@ -146,6 +202,57 @@ class AbstractAPITest(unittest.TestCase):
             self.assertTrue(network['id'] and network['name'])
         LOG.debug("_test_list_networks_detail - fmt:%s - END", fmt)
 
+    def _list_networks(self, fmt, query_string, expected_res_status=200):
+        list_network_req = testlib.network_list_detail_request(
+                                self.tenant_id, fmt, query_string)
+        list_network_res = list_network_req.get_response(self.api)
+        self.assertEqual(list_network_res.status_int, expected_res_status)
+        if expected_res_status == 200:
+            return self._net_deserializers["application/%s" % fmt].\
+                        deserialize(list_network_res.body)['body']
+
+    def _test_list_networks_filtered(self, fmt):
+        LOG.debug("_test_list_networks_filtered - fmt:%s - START", fmt)
+        self._create_network(fmt, "net_1")
+        net_2_id = self._create_network(fmt, "net_2")
+        network_data = self._list_networks(fmt, "name=net_2")
+        self.assertEqual([(net['id'], net['name'])
+                          for net in network_data['networks']],
+                         [(net_2_id, 'net_2')])
+        network_data = self._list_networks(fmt, "op-status=%s"
+                                           % self.net_op_status)
+        self.assertEqual(len(network_data['networks']), 2)
+        network_data = self._list_networks(fmt, "name=net_3")
+        self.assertFalse(network_data['networks'])
+        LOG.debug("_test_list_networks_filtered - fmt:%s - END", fmt)
+
+    def _test_list_networks_paginated(self, fmt):
+        LOG.debug("_test_list_networks_paginated - fmt:%s - START", fmt)
+        net_1_id = self._create_network(fmt, "net_1")
+        network_ids = sorted([net_1_id] +
+                             [self._create_network(fmt, "net_%d" % i)
+                              for i in (2, 3)])
+        network_data = self._list_networks(fmt, "limit=2")
+        self.assertEqual([net['id'] for net in network_data['networks']],
+                         network_ids[:2])
+        link = network_data['networks_links'][0]
+        self.assertEqual(link['rel'], 'next')
+        # follow the link to the next page, which is the last one
+        network_data = self._list_networks(fmt, link['href'].split('?')[1])
+        self.assertEqual([net['id'] for net in network_data['networks']],
+                         network_ids[2:])
+        self.assertFalse('networks_links' in network_data)
+        network_data = self._list_networks(fmt, "name=net_1&limit=1")
+        self.assertEqual([net['id'] for net in network_data['networks']],
+                         [net_1_id])
+        LOG.debug("_test_list_networks_paginated - fmt:%s - END", fmt)
+
+    def _test_list_networks_bad_limit(self, fmt):
+        LOG.debug("_test_list_networks_bad_limit - fmt:%s - START", fmt)
+        self._list_networks(fmt, "limit=0", expected_res_status=400)
+        self._list_networks(fmt, "limit=many", expected_res_status=400)
+        LOG.debug("_test_list_networks_bad_limit - fmt:%s - END", fmt)
+
     def _test_show_network(self, fmt):
         LOG.debug("_test_show_network - fmt:%s - START", fmt)
         content_type = "application/%s" % fmt
@@ -178,6 +285,122 @@ class AbstractAPITest(unittest.TestCase):
                                     network_data=network_data['network'])
         LOG.debug("_test_show_network_detail - fmt:%s - END", fmt)
 
+    def _test_show_network_detail_queries(self, fmt):
+        LOG.debug("_test_show_network_detail_queries - fmt:%s - START", fmt)
+        network_id = self._create_network(fmt)
+        for port_state in ('ACTIVE', 'DOWN', 'ACTIVE'):
+            self._create_port(network_id, port_state, fmt)
+        show_network_req = testlib.show_network_detail_request(
+                                    self.tenant_id, network_id, fmt)
+        show_network_res, selects = self._count_selects(show_network_req)
+        self.assertEqual(show_network_res.status_int, 200)
+        network_data = self._net_deserializers["application/%s" % fmt].\
+                            deserialize(show_network_res.body)['body']
+        self.assertEqual(len(network_data['network']['ports']), 3)
+        self.assertEqual(selects, 1)
+        LOG.debug("_test_show_network_detail_queries - fmt:%s - END", fmt)
+
+    def _test_show_network_not_modified(self, fmt):
+        LOG.debug("_test_show_network_not_modified - fmt:%s - START", fmt)
+        network_id = self._create_network(fmt)
+        show_network_req = testlib.show_network_request(self.tenant_id,
+                                                        network_id,
+                                                        fmt)
+        show_network_res = show_network_req.get_response(self.api)
+        self.assertEqual(show_network_res.status_int, 200)
+        etag = show_network_res.headers['ETag']
+        show_network_req = testlib.show_network_request(self.tenant_id,
+                                                        network_id,
+                                                        fmt)
+        show_network_req.headers['If-None-Match'] = etag
+        show_network_res = show_network_req.get_response(self.api)
+        self.assertEqual(show_network_res.status_int, 304)
+        self.assertEqual(show_network_res.body, '')
+        self.assertEqual(show_network_res.headers['ETag'], etag)
+        # the ETag of the network covers its ports
+        self._create_port(network_id, "ACTIVE", fmt)
+        show_network_req = testlib.show_network_request(self.tenant_id,
+                                                        network_id,
+                                                        fmt)
+        show_network_req.headers['If-None-Match'] = etag
+        show_network_res = show_network_req.get_response(self.api)
+        self.assertEqual(show_network_res.status_int, 200)
+        self.assertNotEqual(show_network_res.headers['ETag'], etag)
+        LOG.debug("_test_show_network_not_modified - fmt:%s - END", fmt)
+
+    def _test_delete_network_stale(self, fmt):
+        LOG.debug("_test_delete_network_stale - fmt:%s - START", fmt)
+        network_id = self._create_network(fmt)
+        show_network_req = testlib.show_network_request(self.tenant_id,
+                                                        network_id,
+                                                        fmt)
+        etag = show_network_req.get_response(self.api).headers['ETag']
+        update_network_req = testlib.update_network_request(self.tenant_id,
+                                                            network_id,
+                                                            'new_name',
+                                                            fmt)
+        update_network_req.headers['If-Match'] = etag
+        update_network_res = update_network_req.get_response(self.api)
+        self.assertEqual(update_network_res.status_int, 204)
+        delete_network_req = testlib.network_delete_request(self.tenant_id,
+                                                            network_id,
+                                                            fmt)
+        delete_network_req.headers['If-Match'] = etag
+        delete_network_res = delete_network_req.get_response(self.api)
+        self.assertEqual(delete_network_res.status_int, 412)
+        show_network_res = show_network_req.get_response(self.api)
+        delete_network_req.headers['If-Match'] = \
+            show_network_res.headers['ETag']
+        delete_network_res = delete_network_req.get_response(self.api)
+        self.assertEqual(delete_network_res.status_int, 204)
+        LOG.debug("_test_delete_network_stale - fmt:%s - END", fmt)
+
+    def _test_network_etag_representation(self, fmt):
+        LOG.debug("_test_network_etag_representation - fmt:%s - START", fmt)
+        other_fmt = fmt == 'json' and 'xml' or 'json'
+        network_id = self._create_network(fmt)
+        etags = [request.get_response(self.api).headers['ETag']
+                 for request in (
+                     testlib.show_network_request(self.tenant_id,
+                                                  network_id, fmt),
+                     testlib.show_network_request(self.tenant_id,
+                                                  network_id, other_fmt),
+                     testlib.show_network_detail_request(self.tenant_id,
+                                                         network_id, fmt))]
+        # each representation of the network has its own ETag
+        self.assertEqual(len(set(etags)), 3)
+        # but any of them tags the current state of the network
+        update_network_req = testlib.update_network_request(self.tenant_id,
+                                                            network_id,
+                                                            'new_name',
+                                                            fmt)
+        update_network_req.headers['If-Match'] = etags[1]
+        update_network_res = update_network_req.get_response(self.api)
+        self.assertEqual(update_network_res.status_int, 204)
+        LOG.debug("_test_network_etag_representation - fmt:%s - END", fmt)
+
+    def _test_update_network_concurrently_modified(self, fmt):
+        LOG.debug("_test_update_network_concurrently_modified - fmt:%s - "
+                  "START", fmt)
+        network_id = self._create_network(fmt)
+        plugin = manager.QuantumManager.get_plugin()
+
+        def update_network(tenant_id, net_id, **kwargs):
+            # the revision checked when flushing the update has changed
+            raise exception.ResourceModified(resource='network',
+                                             resource_id=net_id)
+
+        plugin.update_network = update_network
+        try:
+            update_network_req = testlib.update_network_request(
+                self.tenant_id, network_id, 'new_name', fmt)
+            update_network_res = update_network_req.get_response(self.api)
+            self.assertEqual(update_network_res.status_int, 412)
+        finally:
+            del plugin.update_network
+        LOG.debug("_test_update_network_concurrently_modified - fmt:%s - "
+                  "END", fmt)
+
     def _test_show_network_not_found(self, fmt):
         LOG.debug("_test_show_network_not_found - fmt:%s - START", fmt)
         show_network_req = testlib.show_network_request(self.tenant_id,
@@ -327,6 +550,23 @@ class AbstractAPITest(unittest.TestCase):
         self.assertEqual(list_port_res.status_int, 420)
         LOG.debug("_test_list_ports_networknotfound - fmt:%s - END", fmt)
 
+    def _test_list_ports_detail_queries(self, fmt):
+        LOG.debug("_test_list_ports_detail_queries - fmt:%s - START", fmt)
+        network_id = self._create_network(fmt)
+        for port_state in ('ACTIVE', 'DOWN', 'ACTIVE'):
+            self._create_port(network_id, port_state, fmt)
+        list_port_req = testlib.port_list_detail_request(self.tenant_id,
+                                                         network_id, fmt)
+        list_port_res, selects = self._count_selects(list_port_req)
+        self.assertEqual(list_port_res.status_int, 200)
+        port_data = self._port_deserializers["application/%s" % fmt].\
+                         deserialize(list_port_res.body)['body']
+        self.assertEqual(sorted([port['state']
+                                 for port in port_data['ports']]),
+                         ['ACTIVE', 'ACTIVE', 'DOWN'])
+        self.assertEqual(selects, 1)
+        LOG.debug("_test_list_ports_detail_queries - fmt:%s - END", fmt)
+
     def _test_list_ports_detail(self, fmt):
         LOG.debug("_test_list_ports_detail - fmt:%s - START", fmt)
         content_type = "application/%s" % fmt
@@ -348,6 +588,49 @@ class AbstractAPITest(unittest.TestCase):
             self.assertTrue(port['id'] and port['state'])
         LOG.debug("_test_list_ports_detail - fmt:%s - END", fmt)
 
+    def _test_show_port_not_modified(self, fmt):
+        LOG.debug("_test_show_port_not_modified - fmt:%s - START", fmt)
+        network_id = self._create_network(fmt)
+        port_id = self._create_port(network_id, "ACTIVE", fmt)
+        show_port_req = testlib.show_port_request(self.tenant_id,
+                                                  network_id, port_id,
+                                                  fmt)
+        show_port_res = show_port_req.get_response(self.api)
+        self.assertEqual(show_port_res.status_int, 200)
+        etag = show_port_res.headers['ETag']
+        show_port_req.headers['If-None-Match'] = etag
+        show_port_res = show_port_req.get_response(self.api)
+        self.assertEqual(show_port_res.status_int, 304)
+        self.assertEqual(show_port_res.body, '')
+        update_port_req = testlib.update_port_request(self.tenant_id,
+                                                      network_id, port_id,
+                                                      "DOWN", fmt)
+        update_port_res = update_port_req.get_response(self.api)
+        self.assertEqual(update_port_res.status_int, 204)
+        show_port_res = show_port_req.get_response(self.api)
+        self.assertEqual(show_port_res.status_int, 200)
+        self.assertNotEqual(show_port_res.headers['ETag'], etag)
+        LOG.debug("_test_show_port_not_modified - fmt:%s - END", fmt)
+
+    def _test_update_port_stale(self, fmt):
+        LOG.debug("_test_update_port_stale - fmt:%s - START", fmt)
+        network_id = self._create_network(fmt)
+        port_id = self._create_port(network_id, "ACTIVE", fmt)
+        show_port_req = testlib.show_port_request(self.tenant_id,
+                                                  network_id, port_id,
+                                                  fmt)
+        etag = show_port_req.get_response(self.api).headers['ETag']
+        for expected_res_status in (204, 412):
+            update_port_req = testlib.update_port_request(self.tenant_id,
+                                                          network_id,
+                                                          port_id,
+                                                          "DOWN", fmt)
+            update_port_req.headers['If-Match'] = etag
+            update_port_res = update_port_req.get_response(self.api)
+            self.assertEqual(update_port_res.status_int,
+                             expected_res_status)
+        LOG.debug("_test_update_port_stale - fmt:%s - END", fmt)
+
     def _test_show_port(self, fmt):
         LOG.debug("_test_show_port - fmt:%s - START", fmt)
         content_type = "application/%s" % fmt
@@ -443,6 +726,93 @@ class AbstractAPITest(unittest.TestCase):
         self.assertEqual(port_id, port_data['port']['id'])
         LOG.debug("_test_create_port_noreqbody - fmt:%s - END", fmt)
 
+    def _list_ports(self, fmt, network_id, query_string):
+        list_port_req = testlib.port_list_detail_request(
+                             self.tenant_id, network_id, fmt, query_string)
+        list_port_res = list_port_req.get_response(self.api)
+        self.assertEqual(list_port_res.status_int, 200)
+        return self._port_deserializers["application/%s" % fmt].\
+                    deserialize(list_port_res.body)['body']
+
+    def _test_list_ports_filtered(self, fmt):
+        LOG.debug("_test_list_ports_filtered - fmt:%s - START", fmt)
+        network_id = self._create_network(fmt)
+        port_ids = [self._create_port(network_id, port_state, fmt)
+                    for port_state in ('ACTIVE', 'ACTIVE', 'DOWN')]
+        put_attachment_req = testlib.put_attachment_request(self.tenant_id,
+                                                            network_id,
+                                                            port_ids[0],
+                                                            "iface_1",
+                                                            fmt)
+        put_attachment_res = put_attachment_req.get_response(self.api)
+        self.assertEqual(put_attachment_res.status_int, 204)
+
+        def list_port_ids(query_string):
+            port_data = self._list_ports(fmt, network_id, query_string)
+            return sorted([port['id'] for port in port_data['ports']])
+
+        self.assertEqual(list_port_ids("state=ACTIVE"),
+                         sorted(port_ids[:2]))
+        self.assertEqual(list_port_ids("attachment=iface_1"),
+                         [port_ids[0]])
+        self.assertEqual(list_port_ids("state=DOWN&attachment=iface_1"), [])
+        self.assertEqual(list_port_ids("op-status=%s" % self.port_op_status),
+                         sorted(port_ids))
+        LOG.debug("_test_list_ports_filtered - fmt:%s - END", fmt)
+
+    def _test_list_ports_detail_filtered(self, fmt):
+        LOG.debug("_test_list_ports_detail_filtered - fmt:%s - START", fmt)
+        network_id = self._create_network(fmt)
+        port_ids = [self._create_port(network_id, port_state, fmt)
+                    for port_state in ('ACTIVE', 'DOWN')]
+        plugin = manager.QuantumManager.get_plugin()
+        get_port_details = plugin.get_port_details
+        get_all_ports = plugin.get_all_ports
+        port_details_calls = []
+
+        def count_port_details(tenant_id, net_id, port_id):
+            port_details_calls.append(port_id)
+            return get_port_details(tenant_id, net_id, port_id)
+
+        plugin.get_port_details = count_port_details
+        # leave the filters to the API
+        plugin.get_all_ports = lambda tenant_id, net_id, **kwargs: \
+          get_all_ports(tenant_id, net_id)
+        try:
+            port_data = self._list_ports(fmt, network_id, "state=DOWN")
+        finally:
+            del plugin.get_port_details
+            del plugin.get_all_ports
+        self.assertEqual([(port['id'], port['state'])
+                          for port in port_data['ports']],
+                         [(port_ids[1], 'DOWN')])
+        # the details the filters fetched are not fetched again
+        self.assertEqual(len(port_details_calls),
+                         len(set(port_details_calls)))
+        LOG.debug("_test_list_ports_detail_filtered - fmt:%s - END", fmt)
+
+    def _test_list_ports_paginated(self, fmt):
+        LOG.debug("_test_list_ports_paginated - fmt:%s - START", fmt)
+        network_id = self._create_network(fmt)
+        port_ids = sorted([self._create_port(network_id, "ACTIVE", fmt)
+                           for i in range(3)])
+        port_data = self._list_ports(fmt, network_id, "limit=2")
+        self.assertEqual([port['id'] for port in port_data['ports']],
+                         port_ids[:2])
+        link = port_data['ports_links'][0]
+        port_data = self._list_ports(fmt, network_id,
+                                     link['href'].split('?')[1])
+        self.assertEqual([port['id'] for port in port_data['ports']],
+                         port_ids[2:])
+        # filters applied by the API rather than by the plugin
+        # must be paginated as well
+        port_data = self._list_ports(fmt, network_id,
+                                     "op-status=%s&limit=1&marker=%s"
+                                     % (self.port_op_status, port_ids[0]))
+        self.assertEqual([port['id'] for port in port_data['ports']],
+                         [port_ids[1]])
+        LOG.debug("_test_list_ports_paginated - fmt:%s - END", fmt)
+
     def _test_create_port(self, fmt):
         LOG.debug("_test_create_port - fmt:%s - START", fmt)
         content_type = "application/%s" % fmt
@@ -476,6 +846,55 @@ class AbstractAPITest(unittest.TestCase):
                           custom_req_body=bad_body, expected_res_status=400)
         LOG.debug("_test_create_port_badrequest - fmt:%s - END", fmt)
 
+    def _test_create_ports_bulk(self, fmt):
+        LOG.debug("_test_create_ports_bulk - fmt:%s - START", fmt)
+        content_type = "application/%s" % fmt
+        network_id = self._create_network(fmt)
+        body = {'ports': [{'state': 'ACTIVE'}, {'state': 'DOWN'}, {}]}
+        port_req = testlib.new_port_request(self.tenant_id, network_id,
+                                            None, fmt, custom_req_body=body)
+        port_res = port_req.get_response(self.api)
+        self.assertEqual(port_res.status_int, 202)
+        port_data = self._port_deserializers[content_type].\
+                         deserialize(port_res.body)['body']
+        port_states = []
+        for port in port_data['ports']:
+            show_port_req = testlib.show_port_request(self.tenant_id,
+                                                      network_id,
+                                                      port['id'], fmt)
+            show_port_res = show_port_req.get_response(self.api)
+            self.assertEqual(show_port_res.status_int, 200)
+            port_states.append(self._deserialize_port_response(
+                content_type, show_port_res)['port']['state'])
+        self.assertEqual(port_states, ['ACTIVE', 'DOWN', 'DOWN'])
+        LOG.debug("_test_create_ports_bulk - fmt:%s - END", fmt)
+
+    def _test_create_ports_bulk_stateinvalid(self, fmt):
+        LOG.debug("_test_create_ports_bulk_stateinvalid - fmt:%s - START",
+                  fmt)
+        network_id = self._create_network(fmt)
+        body = {'ports': [{'state': 'ACTIVE'}, {'state': 'BAD_STATE'}]}
+        self._create_port(network_id, None, fmt, custom_req_body=body,
+                          expected_res_status=431)
+        port_list_req = testlib.port_list_request(self.tenant_id,
+                                                  network_id, fmt)
+        port_list_res = port_list_req.get_response(self.api)
+        port_data = self._port_deserializers["application/%s" % fmt].\
+                         deserialize(port_list_res.body)['body']
+        # no port should have been created
+        self.assertFalse(port_data['ports'])
+        LOG.debug("_test_create_ports_bulk_stateinvalid - fmt:%s - END",
+                  fmt)
+
+    def _test_create_ports_bulk_networknotfound(self, fmt):
+        LOG.debug("_test_create_ports_bulk_networknotfound - fmt:%s - START",
+                  fmt)
+        body = {'ports': [{'state': 'ACTIVE'}]}
+        self._create_port("A_BAD_ID", None, fmt, custom_req_body=body,
+                          expected_res_status=420)
+        LOG.debug("_test_create_ports_bulk_networknotfound - fmt:%s - END",
+                  fmt)
+
     def _test_delete_port(self, fmt):
         LOG.debug("_test_delete_port - fmt:%s - START", fmt)
         content_type = "application/%s" % fmt
@@ -810,6 +1229,134 @@ class AbstractAPITest(unittest.TestCase):
         LOG.debug("_test_delete_attachment_portnotfound - " \
                   "fmt:%s - END", fmt)
 
+    def _list_changes(self, fmt, query_string=None,
+                      expected_res_status=200):
+        list_changes_req = testlib.changes_list_request(self.tenant_id, fmt,
+                                                        query_string)
+        list_changes_res = list_changes_req.get_response(self.api)
+        self.assertEqual(list_changes_res.status_int, expected_res_status)
+        if expected_res_status == 200:
+            deserializers = {
+                'json': JSONDeserializer(),
+                'xml': XMLDeserializer(
+                    changes.Controller._serialization_metadata)}
+            changes_data = deserializers[fmt].\
+                deserialize(list_changes_res.body)['body']
+            # each page links to the next one
+            link = changes_data['changes_links'][0]
+            self.assertEqual(link['rel'], 'next')
+            return ([(int(change['seq']), change['resource'], change['id'],
+                      change['network-id'], change['action'])
+                     for change in changes_data['changes']],
+                    link['href'].split('?')[1])
+
+    def _test_list_changes(self, fmt):
+        LOG.debug("_test_list_changes - fmt:%s - START", fmt)
+        changes_data, next_query = self._list_changes(fmt)
+        self.assertEqual(changes_data, [])
+        network_id = self._create_network(fmt)
+        port_id = self._create_port(network_id, "ACTIVE", fmt)
+        put_attachment_req = testlib.put_attachment_request(self.tenant_id,
+                                                            network_id,
+                                                            port_id,
+                                                            "interface",
+                                                            fmt)
+        put_attachment_res = put_attachment_req.get_response(self.api)
+        self.assertEqual(put_attachment_res.status_int, 204)
+        # the networks of other tenants are not listed
+        other_network_req = testlib.new_network_request("other_tenant",
+                                                        "other", fmt)
+        self.assertEqual(other_network_req.get_response(self.api).status_int,
+                         202)
+        changes_data, next_query = self._list_changes(fmt, next_query)
+        self.assertEqual(sorted(set([(resource, resource_id, network)
+                                     for _seq, resource, resource_id,
+                                         network, _action
+                                     in changes_data])),
+                         sorted([('network', network_id, network_id),
+                                 ('port', port_id, network_id)]))
+        self.assertEqual(changes_data[0][1:], ('network', network_id,
+                                               network_id, 'create'))
+        self.assertEqual(changes_data[-1][1:], ('port', port_id,
+                                                network_id, 'update'))
+        seqs = [change[0] for change in changes_data]
+        self.assertEqual(seqs, sorted(seqs))
+        # nothing changed since
+        self.assertEqual(self._list_changes(fmt, next_query),
+                         ([], next_query))
+        LOG.debug("_test_list_changes - fmt:%s - END", fmt)
+
+    def _test_list_changes_paginated(self, fmt):
+        LOG.debug("_test_list_changes_paginated - fmt:%s - START", fmt)
+        _changes_data, next_query = self._list_changes(fmt)
+        network_id = self._create_network(fmt)
+        port_id = self._create_port(network_id, "ACTIVE", fmt)
+        changes_data, next_query = self._list_changes(fmt, next_query +
+                                                      "&limit=1")
+        self.assertEqual([change[1:] for change in changes_data],
+                         [('network', network_id, network_id, 'create')])
+        self.assertTrue("since=%d" % changes_data[0][0] in next_query)
+        # follow the links, each page starting after the previous one
+        all_changes = changes_data
+        while changes_data:
+            changes_data, next_query = self._list_changes(fmt, next_query)
+            self.assertTrue(len(changes_data) <= 1)
+            all_changes.extend(changes_data)
+        seqs = [change[0] for change in all_changes]
+        self.assertEqual(seqs, sorted(set(seqs)))
+        self.assertTrue(('port', port_id, network_id, 'create') in
+                        [change[1:] for change in all_changes])
+        LOG.debug("_test_list_changes_paginated - fmt:%s - END", fmt)
+
+    def _test_list_changes_badrequest(self, fmt):
+        LOG.debug("_test_list_changes_badrequest - fmt:%s - START", fmt)
+        self._list_changes(fmt, "since=-1", expected_res_status=400)
+        self._list_changes(fmt, "since=last", expected_res_status=400)
+        self._list_changes(fmt, "since=0&limit=0", expected_res_status=400)
+        LOG.debug("_test_list_changes_badrequest - fmt:%s - END", fmt)
+
+    def _test_list_changes_wait(self, fmt):
+        LOG.debug("_test_list_changes_wait - fmt:%s - START", fmt)
+        _changes_data, next_query = self._list_changes(fmt)
+        # the request returns as soon as the network is created
+        creator = eventlet.spawn_after(0.1, self._create_network, fmt)
+        start = time.time()
+        changes_data, _next_query = self._list_changes(fmt, next_query +
+                                                       "&wait=30")
+        self.assertTrue(time.time() - start < 10)
+        network_id = creator.wait()
+        self.assertEqual([change[1:] for change in changes_data],
+                         [('network', network_id, network_id, 'create')])
+        LOG.debug("_test_list_changes_wait - fmt:%s - END", fmt)
+
+    def _test_list_changes_wait_timeout(self, fmt):
+        LOG.debug("_test_list_changes_wait_timeout - fmt:%s - START", fmt)
+        _changes_data, next_query = self._list_changes(fmt)
+        # changes of other tenants do not end the wait
+        other_network_req = testlib.new_network_request("other_tenant",
+                                                        "other", fmt)
+        eventlet.spawn_after(0.1, other_network_req.get_response, self.api)
+        start = time.time()
+        changes_data, _next_query = self._list_changes(fmt, next_query +
+                                                       "&wait=1")
+        self.assertTrue(time.time() - start >= 1)
+        self.assertEqual(changes_data, [])
+        self._list_changes(fmt, next_query + "&wait=-1",
+                           expected_res_status=400)
+        LOG.debug("_test_list_changes_wait_timeout - fmt:%s - END", fmt)
+
+    def _prune_changes(self):
+        """Drops all of the change log but its last entry"""
+        db.change_prune(1)
+
+    def _test_list_changes_expired(self, fmt):
+        LOG.debug("_test_list_changes_expired - fmt:%s - START", fmt)
+        self._create_network(fmt, "net_1")
+        self._create_network(fmt, "net_2")
+        self._prune_changes()
+        self._list_changes(fmt, "since=0", expected_res_status=410)
+        LOG.debug("_test_list_changes_expired - fmt:%s - END", fmt)
+
     def _test_unparsable_data(self, fmt):
         LOG.debug("_test_unparsable_data - " \
                   " fmt:%s - START", fmt)
@@ -830,7 +1377,9 @@ class AbstractAPITest(unittest.TestCase):
         options = {}
         options['plugin_provider'] = test_config['plugin_name']
         api_router_cls = utils.import_class(api_router_klass)
-        self.api = api_router_cls(options)
+        # serve requests within a unit of work, as the paste pipeline does
+        self.api = middleware.UnitOfWorkMiddleware(api_router_cls(options))
+        db.begin_test_transaction()
         self.tenant_id = "test_tenant"
         self.network_name = "test_network"
 
@@ -857,7 +1406,7 @@ class AbstractAPITest(unittest.TestCase):
     def tearDown(self):
         """Clear the test environment"""
         # Remove database contents
-        db.clear_db()
+        db.rollback_test_transaction()
 
     def test_list_networks_json(self):
         self._test_list_networks('json')
@@ -883,6 +1432,18 @@ class AbstractAPITest(unittest.TestCase):
     def test_create_network_badrequest_xml(self):
         self._test_create_network_badrequest('xml')
 
+    def test_create_networks_bulk_json(self):
+        self._test_create_networks_bulk('json')
+
+    def test_create_networks_bulk_xml(self):
+        self._test_create_networks_bulk('xml')
+
+    def test_create_networks_bulk_badrequest_json(self):
+        self._test_create_networks_bulk_badrequest('json')
+
+    def test_create_networks_bulk_badrequest_xml(self):
+        self._test_create_networks_bulk_badrequest('xml')
+
     def test_show_network_not_found_json(self):
         self._test_show_network_not_found('json')
 
@@ -901,6 +1462,36 @@ class AbstractAPITest(unittest.TestCase):
     def test_show_network_detail_xml(self):
         self._test_show_network_detail('xml')
 
+    def test_show_network_detail_queries_json(self):
+        self._test_show_network_detail_queries('json')
+
+    def test_show_network_detail_queries_xml(self):
+        self._test_show_network_detail_queries('xml')
+
+    def test_show_network_not_modified_json(self):
+        self._test_show_network_not_modified('json')
+
+    def test_show_network_not_modified_xml(self):
+        self._test_show_network_not_modified('xml')
+
+    def test_delete_network_stale_json(self):
+        self._test_delete_network_stale('json')
+
+    def test_delete_network_stale_xml(self):
+        self._test_delete_network_stale('xml')
+
+    def test_network_etag_representation_json(self):
+        self._test_network_etag_representation('json')
+
+    def test_network_etag_representation_xml(self):
+        self._test_network_etag_representation('xml')
+
+    def test_update_network_concurrently_modified_json(self):
+        self._test_update_network_concurrently_modified('json')
+
+    def test_update_network_concurrently_modified_xml(self):
+        self._test_update_network_concurrently_modified('xml')
+
     def test_delete_network_json(self):
         self._test_delete_network('json')
 
@@ -955,6 +1546,24 @@ class AbstractAPITest(unittest.TestCase):
     def test_list_ports_detail_xml(self):
         self._test_list_ports_detail('xml')
 
+    def test_list_ports_detail_queries_json(self):
+        self._test_list_ports_detail_queries('json')
+
+    def test_list_ports_detail_queries_xml(self):
+        self._test_list_ports_detail_queries('xml')
+
+    def test_show_port_not_modified_json(self):
+        self._test_show_port_not_modified('json')
+
+    def test_show_port_not_modified_xml(self):
+        self._test_show_port_not_modified('xml')
+
+    def test_update_port_stale_json(self):
+        self._test_update_port_stale('json')
+
+    def test_update_port_stale_xml(self):
+        self._test_update_port_stale('xml')
+
     def test_show_port_json(self):
         self._test_show_port('json')
 
@@ -1003,6 +1612,24 @@ class AbstractAPITest(unittest.TestCase):
     def test_create_port_badrequest_xml(self):
         self._test_create_port_badrequest('xml')
 
+    def test_create_ports_bulk_json(self):
+        self._test_create_ports_bulk('json')
+
+    def test_create_ports_bulk_xml(self):
+        self._test_create_ports_bulk('xml')
+
+    def test_create_ports_bulk_stateinvalid_json(self):
+        self._test_create_ports_bulk_stateinvalid('json')
+
+    def test_create_ports_bulk_stateinvalid_xml(self):
+        self._test_create_ports_bulk_stateinvalid('xml')
+
+    def test_create_ports_bulk_networknotfound_json(self):
+        self._test_create_ports_bulk_networknotfound('json')
+
+    def test_create_ports_bulk_networknotfound_xml(self):
+        self._test_create_ports_bulk_networknotfound('xml')
+
     def test_delete_port_xml(self):
         self._test_delete_port('xml')
 
@@ -93,3 +93,75 @@ class APITestV11(test_api.AbstractAPITest):
              {test_api.NETS: nets.ControllerV11._serialization_metadata,
               test_api.PORTS: ports.ControllerV11._serialization_metadata,
               test_api.ATTS: atts.ControllerV11._serialization_metadata})
+
+    def test_list_networks_filtered_json(self):
+        self._test_list_networks_filtered('json')
+
+    def test_list_networks_filtered_xml(self):
+        self._test_list_networks_filtered('xml')
+
+    def test_list_networks_paginated_json(self):
+        self._test_list_networks_paginated('json')
+
+    def test_list_networks_paginated_xml(self):
+        self._test_list_networks_paginated('xml')
+
+    def test_list_networks_bad_limit_json(self):
+        self._test_list_networks_bad_limit('json')
+
+    def test_list_networks_bad_limit_xml(self):
+        self._test_list_networks_bad_limit('xml')
+
+    def test_list_changes_json(self):
+        self._test_list_changes('json')
+
+    def test_list_changes_xml(self):
+        self._test_list_changes('xml')
+
+    def test_list_changes_paginated_json(self):
+        self._test_list_changes_paginated('json')
+
+    def test_list_changes_paginated_xml(self):
+        self._test_list_changes_paginated('xml')
+
+    def test_list_changes_badrequest_json(self):
+        self._test_list_changes_badrequest('json')
+
+    def test_list_changes_badrequest_xml(self):
+        self._test_list_changes_badrequest('xml')
+
+    def test_list_changes_expired_json(self):
+        self._test_list_changes_expired('json')
+
+    def test_list_changes_expired_xml(self):
+        self._test_list_changes_expired('xml')
+
+    def test_list_changes_wait_json(self):
+        self._test_list_changes_wait('json')
+
+    def test_list_changes_wait_xml(self):
+        self._test_list_changes_wait('xml')
+
+    def test_list_changes_wait_timeout_json(self):
+        self._test_list_changes_wait_timeout('json')
+
+    def test_list_changes_wait_timeout_xml(self):
+        self._test_list_changes_wait_timeout('xml')
+
+    def test_list_ports_filtered_json(self):
+        self._test_list_ports_filtered('json')
+
+    def test_list_ports_filtered_xml(self):
+        self._test_list_ports_filtered('xml')
+
+    def test_list_ports_detail_filtered_json(self):
+        self._test_list_ports_detail_filtered('json')
+
+    def test_list_ports_detail_filtered_xml(self):
+        self._test_list_ports_detail_filtered('xml')
+
+    def test_list_ports_paginated_json(self):
+        self._test_list_ports_paginated('json')
+
+    def test_list_ports_paginated_xml(self):
+        self._test_list_ports_paginated('xml')
@@ -45,6 +45,7 @@ class CLITest(unittest.TestCase):
           'quantum.plugins.sample.SamplePlugin.FakePlugin'
         #TODO: make the version of the API router configurable
         self.api = server.APIRouterV11(options)
+        db.begin_test_transaction()
 
         self.tenant_id = "test_tenant"
         self.network_name_1 = "test_network_1"
@@ -58,7 +59,7 @@ class CLITest(unittest.TestCase):
 
     def tearDown(self):
         """Clear the test environment"""
-        db.clear_db()
+        db.rollback_test_transaction()
         sys.stdout = sys.__stdout__
 
     def _verify_list_networks(self):
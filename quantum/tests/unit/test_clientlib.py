@@ -69,16 +69,18 @@ class ServerStub():
             return res
 
         # Extract important information from the action string to assure sanity
-        match = re.search('tenants/(.+?)/(.+)\.(json|xml)$', self.action)
+        match = re.search('tenants/(.+?)/(.+)\.(json|xml)(\?.*)?$',
+                          self.action)
 
         tenant = match.group(1)
         path = match.group(2)
         format = match.group(3)
+        query = match.group(4)
 
         data = {'data': {'method': self.method, 'action': self.action,
                          'body': self.body, 'tenant': tenant, 'path': path,
                          'format': format, 'key_file': self.key_file,
-                         'cert_file': self.cert_file}}
+                         'cert_file': self.cert_file, 'query': query}}
 
         # Serialize it to the proper format so the API client can handle it
         if data['data']['format'] == 'json':
@@ -339,6 +341,19 @@ class APITest(unittest.TestCase):
     def test_list_networks_alt_tenant(self):
         self._test_list_networks(tenant=TENANT_2)
 
+    def test_list_networks_filtered(self):
+        data = self._assert_sanity(self.client.list_networks,
+                                   200,
+                                   "GET",
+                                   "networks",
+                                   data=[],
+                                   params={'tenant': TENANT_1,
+                                           'format': 'json',
+                                           'name': 'net1',
+                                           'limit': 2})
+        self.assertEqual(sorted(data['query'][1:].split('&')),
+                         ['limit=2', 'name=net1'])
+
     def test_list_networks_error_470(self):
         self._test_list_networks(status=470)
 
@@ -438,6 +453,17 @@ class APITest(unittest.TestCase):
     def test_list_ports_alt_tenant(self):
         self._test_list_ports(tenant=TENANT_2)
 
+    def test_list_ports_filtered(self):
+        data = self._assert_sanity(self.client.list_ports,
+                                   200,
+                                   "GET",
+                                   "networks/001/ports",
+                                   data=["001"],
+                                   params={'tenant': TENANT_1,
+                                           'format': 'json',
+                                           'state': 'ACTIVE'})
+        self.assertEqual(data['query'], '?state=ACTIVE')
+
     def test_list_ports_error_470(self):
         self._test_list_ports(status=470)
 
@@ -20,10 +20,22 @@ test_database.py is an independent test suite
 that tests the database api method calls
 """
 import logging
+import time
 import unittest
 
+import eventlet
+from sqlalchemy import event, pool
+from sqlalchemy import exc as sql_exc
+import webob
+import webob.dec
+import webob.exc
 
+from quantum.api import middleware
+from quantum.common import exceptions as q_exc
 from quantum.db import api as db
+from quantum.db import migration
+from quantum.db.migration import core
+from quantum.db import models
 from quantum.tests.unit import database_stubs as db_stubs
 
 
@@ -35,13 +47,14 @@ class QuantumDBTest(unittest.TestCase):
     def setUp(self):
         """Setup for tests"""
         db.configure_db({'sql_connection': 'sqlite:///:memory:'})
+        db.begin_test_transaction()
         self.dbtest = db_stubs.QuantumDB()
         self.tenant_id = "t1"
         LOG.debug("Setup")
 
     def tearDown(self):
         """Tear Down"""
-        db.clear_db()
+        db.rollback_test_transaction()
 
     def testa_create_network(self):
         """test to create network"""
@@ -116,3 +129,865 @@ class QuantumDBTest(unittest.TestCase):
         self.dbtest.unplug_interface(net1["id"], port1["id"])
         port = self.dbtest.get_port(net1["id"], port1["id"])
         self.assertTrue(port[0]["attachment"] is None)
+
+
+class StatementCounter(object):
+    """Records the SQL statements issued on an engine"""
+    def __init__(self, engine):
+        self.statements = []
+        self.active = False
+        event.listen(engine, 'before_cursor_execute', self._record)
+
+    def _record(self, conn, cursor, statement, parameters,
+                context, executemany):
+        if self.active:
+            self.statements.append(statement)
+
+    def start(self):
+        self.statements = []
+        self.active = True
+
+    def stop(self):
+        self.active = False
+
+    def count(self, verb):
+        return len([s for s in self.statements
+                    if s.lstrip().upper().startswith(verb)])
+
+
+class QuantumDBRoundTripTest(unittest.TestCase):
+    """Verifies the number of queries issued by port operations"""
+    counter = None
+
+    def setUp(self):
+        db.configure_db({'sql_connection': 'sqlite:///:memory:'})
+        db.begin_test_transaction()
+        if QuantumDBRoundTripTest.counter is None:
+            QuantumDBRoundTripTest.counter = StatementCounter(db._ENGINE)
+        self.net_id = db.network_create("t1", "net1")['uuid']
+        self.port_id = db.port_create(self.net_id)['uuid']
+
+    def tearDown(self):
+        self.counter.stop()
+        db.rollback_test_transaction()
+
+    def _assert_selects(self, func, *args, **kwargs):
+        self.counter.start()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.counter.stop()
+            self.assertTrue(self.counter.count('SELECT') <= 1,
+                            self.counter.statements)
+
+    def test_port_get(self):
+        port = self._assert_selects(db.port_get, self.port_id, self.net_id)
+        self.assertEqual(port['uuid'], self.port_id)
+
+    def test_port_list(self):
+        db.port_create(self.net_id)
+        ports = self._assert_selects(db.port_list, self.net_id)
+        self.assertEqual(len(ports), 2)
+
+    def test_port_list_no_ports(self):
+        net_id = db.network_create("t1", "net2")['uuid']
+        self.assertEqual(self._assert_selects(db.port_list, net_id), [])
+
+    def test_port_update(self):
+        self._assert_selects(db.port_update, self.port_id, self.net_id,
+                             state='ACTIVE')
+        self.assertEqual(db.port_get(self.port_id, self.net_id)['state'],
+                         'ACTIVE')
+
+    def test_port_set_attachment(self):
+        self._assert_selects(db.port_set_attachment,
+                             self.port_id, self.net_id, "vif1.1")
+        port = db.port_get(self.port_id, self.net_id)
+        self.assertEqual(port['interface_id'], "vif1.1")
+
+    def test_port_set_attachment_already_attached(self):
+        db.port_set_attachment(self.port_id, self.net_id, "vif1.1")
+        port_id = db.port_create(self.net_id)['uuid']
+        self.assertRaises(q_exc.AlreadyAttached, self._assert_selects,
+                          db.port_set_attachment,
+                          port_id, self.net_id, "vif1.1")
+
+    def test_port_update_concurrently_modified(self):
+        port_id = db.port_create(self.net_id)['uuid']
+        ports = models.Port.__table__
+        try:
+            with db.unit_of_work() as session:
+                # another server writes the port once it is loaded,
+                # which the identity map holds while referenced
+                port = db.port_get(port_id, self.net_id)
+                session.execute(ports.update().
+                                where(ports.c.uuid == port_id).
+                                values(revision=ports.c.revision + 1))
+                self.assertTrue(port in session)
+                self.assertRaises(q_exc.ResourceModified, db.port_update,
+                                  port_id, self.net_id, state='ACTIVE')
+                raise ValueError()
+        except ValueError:
+            pass
+
+    def test_port_set_attachment_conflict_keeps_unit_of_work(self):
+        db.port_set_attachment(self.port_id, self.net_id, "vif1.1")
+        port_id = db.port_create(self.net_id)['uuid']
+        with db.unit_of_work():
+            db.network_update(self.net_id, "t1", name="net2")
+            self.assertRaises(q_exc.AlreadyAttached, db.port_set_attachment,
+                              port_id, self.net_id, "vif1.1")
+        # only the failed attachment was rolled back
+        self.assertEqual(db.network_get(self.net_id)['name'], "net2")
+        self.assertEqual(db.port_get(port_id, self.net_id)['interface_id'],
+                         None)
+
+    def test_port_set_attachment_in_use(self):
+        db.port_set_attachment(self.port_id, self.net_id, "vif1.1")
+        self.assertRaises(q_exc.PortInUse, self._assert_selects,
+                          db.port_set_attachment,
+                          self.port_id, self.net_id, "vif1.2")
+
+    def test_port_set_attachment_race(self):
+        racing = [True]
+
+        def attach_first(conn, cursor, statement, parameters,
+                         context, executemany):
+            # another request attaches the port right before the UPDATE
+            if racing[0] and statement.startswith("UPDATE ports"):
+                racing[0] = False
+                cursor.execute("UPDATE ports SET interface_id = ? "
+                               "WHERE uuid = ?", ("vif1.2", self.port_id))
+
+        event.listen(db._ENGINE, 'before_cursor_execute', attach_first)
+        try:
+            self.assertRaises(q_exc.PortInUse, db.port_set_attachment,
+                              self.port_id, self.net_id, "vif1.1")
+        finally:
+            racing[0] = False
+        port = db.port_get(self.port_id, self.net_id)
+        self.assertEqual(port['interface_id'], "vif1.2")
+
+    def test_port_unset_attachment(self):
+        db.port_set_attachment(self.port_id, self.net_id, "vif1.1")
+        self._assert_selects(db.port_unset_attachment,
+                             self.port_id, self.net_id)
+        port = db.port_get(self.port_id, self.net_id)
+        self.assertEqual(port['interface_id'], None)
+
+    def test_port_revision(self):
+        revisions = [db.port_get(self.port_id, self.net_id)['revision']]
+        db.port_update(self.port_id, self.net_id, state='ACTIVE')
+        db.port_set_attachment(self.port_id, self.net_id, "vif1.1")
+        db.port_unset_attachment(self.port_id, self.net_id)
+        db.port_set_op_status_bulk({self.port_id: 'UP'})
+        revisions.append(db.port_get(self.port_id, self.net_id)['revision'])
+        self.assertEqual(revisions, [1, 5])
+
+    def test_port_destroy(self):
+        self._assert_selects(db.port_destroy, self.port_id, self.net_id)
+        self.assertEqual(db.port_list(self.net_id), [])
+
+    def test_network_not_found(self):
+        for func in (db.port_get, db.port_update, db.port_unset_attachment,
+                     db.port_destroy):
+            self.assertRaises(q_exc.NetworkNotFound, self._assert_selects,
+                              func, self.port_id, "bad_net")
+        self.assertRaises(q_exc.NetworkNotFound, self._assert_selects,
+                          db.port_set_attachment, self.port_id, "bad_net",
+                          "vif1.1")
+        self.assertRaises(q_exc.NetworkNotFound, self._assert_selects,
+                          db.port_list, "bad_net")
+
+    def test_port_not_found(self):
+        for func in (db.port_get, db.port_update, db.port_unset_attachment,
+                     db.port_destroy):
+            self.assertRaises(q_exc.PortNotFound, self._assert_selects,
+                              func, "bad_port", self.net_id)
+        self.assertRaises(q_exc.PortNotFound, self._assert_selects,
+                          db.port_set_attachment, "bad_port", self.net_id,
+                          "vif1.1")
+
+    def test_network_create_bulk(self):
+        self.counter.start()
+        nets = db.network_create_bulk("t1", ["net%d" % i
+                                             for i in range(100)])
+        self.counter.stop()
+        # one for the networks, one for the change log
+        self.assertEqual(self.counter.count('INSERT'), 2)
+        self.assertEqual(len(db.network_list("t1")), 101)
+        self.assertEqual(db.network_get(nets[42]['uuid'])['name'], "net42")
+
+    def test_port_create_bulk(self):
+        states = ['ACTIVE', 'DOWN', None] * 333
+        ports = self._assert_selects(db.port_create_bulk, self.net_id,
+                                     states)
+        self.assertEqual(self.counter.count('INSERT'), 2)
+        self.assertEqual(len(db.port_list(self.net_id)), 1000)
+        self.assertEqual(db.port_get(ports[0]['uuid'],
+                                     self.net_id)['state'], 'ACTIVE')
+        self.assertEqual(db.port_get(ports[2]['uuid'],
+                                     self.net_id)['state'], 'DOWN')
+
+    def test_port_create_bulk_state_invalid(self):
+        self.assertRaises(q_exc.StateInvalid, db.port_create_bulk,
+                          self.net_id, ['ACTIVE', 'BAD_STATE'])
+        self.assertEqual(len(db.port_list(self.net_id)), 1)
+
+    def test_port_create_bulk_network_not_found(self):
+        self.assertRaises(q_exc.NetworkNotFound, db.port_create_bulk,
+                          "bad_net", ['ACTIVE'])
+
+    def test_network_get_with_ports(self):
+        db.port_create_bulk(self.net_id, [None] * 3)
+        self.counter.start()
+        net = db.network_get_with_ports(self.net_id)
+        self.assertEqual(len(net['ports']), 4)
+        self.counter.stop()
+        self.assertEqual(len(self.counter.statements), 1)
+        self.assertRaises(q_exc.NetworkNotFound, db.network_get_with_ports,
+                          "bad_net")
+
+    def test_network_destroy(self):
+        db.port_create_bulk(self.net_id, [None] * 100)
+        self.counter.start()
+        db.network_destroy(self.net_id)
+        self.counter.stop()
+        self.assertEqual(self.counter.count('SELECT'), 1)
+        self.assertEqual(self.counter.count('DELETE'), 2)
+        self.assertRaises(q_exc.NetworkNotFound, db.network_get,
+                          self.net_id)
+        self.assertRaises(q_exc.NetworkNotFound, db.port_list, self.net_id)
+
+    def test_port_destroy_all(self):
+        net_id = db.network_create("t1", "net2")['uuid']
+        other_port_id = db.port_create(net_id)['uuid']
+        db.port_create_bulk(self.net_id, [None] * 10)
+        self.counter.start()
+        self.assertEqual(db.port_destroy_all(self.net_id), 11)
+        self.counter.stop()
+        self.assertEqual(self.counter.count('DELETE'), 1)
+        self.assertEqual(self.counter.count('INSERT'), 1)
+        self.assertEqual(db.port_list(self.net_id), [])
+        self.assertEqual(db.port_list(net_id)[0]['uuid'], other_port_id)
+
+
+class QuantumDBSoftDeleteTest(unittest.TestCase):
+    """Tests for soft deletes and the removal of deleted rows"""
+    def setUp(self):
+        db.configure_db({'sql_connection': 'sqlite:///:memory:'})
+        db.begin_test_transaction()
+        db.configure_soft_delete(True)
+        if QuantumDBRoundTripTest.counter is None:
+            QuantumDBRoundTripTest.counter = StatementCounter(db._ENGINE)
+        self.counter = QuantumDBRoundTripTest.counter
+        self.net_id = db.network_create("t1", "net1")['uuid']
+        self.port_ids = [port['uuid'] for port in
+                         db.port_create_bulk(self.net_id, [None] * 3)]
+        db.port_set_attachment(self.port_ids[0], self.net_id, "vif1.1")
+
+    def tearDown(self):
+        self.counter.stop()
+        db.configure_soft_delete(False)
+        db.rollback_test_transaction()
+
+    def _count_rows(self, model):
+        return db.get_session().query(model).count()
+
+    def test_network_destroy(self):
+        self.counter.start()
+        db.network_destroy(self.net_id)
+        self.counter.stop()
+        self.assertEqual(self.counter.count('SELECT'), 1)
+        self.assertEqual(self.counter.count('UPDATE'), 2)
+        self.assertEqual(self.counter.count('DELETE'), 0)
+        self.assertRaises(q_exc.NetworkNotFound, db.network_get,
+                          self.net_id)
+        self.assertRaises(q_exc.NetworkNotFound, db.port_list, self.net_id)
+        self.assertRaises(q_exc.NetworkNotFound, db.port_create, self.net_id)
+        self.assertEqual(db.network_list("t1"), [])
+        self.assertEqual(self._count_rows(models.Port), 3)
+        # the interface was released along with its port
+        net_id = db.network_create("t1", "net2")['uuid']
+        port_id = db.port_create(net_id)['uuid']
+        db.port_set_attachment(port_id, net_id, "vif1.1")
+
+    def test_port_destroy(self):
+        db.port_destroy(self.port_ids[1], self.net_id)
+        self.assertRaises(q_exc.PortNotFound, db.port_get,
+                          self.port_ids[1], self.net_id)
+        self.assertRaises(q_exc.PortNotFound, db.port_set_attachment,
+                          self.port_ids[1], self.net_id, "vif1.2")
+        self.assertEqual(len(db.port_list(self.net_id)), 2)
+        self.assertEqual(len(db.network_get_with_ports(self.net_id).ports),
+                         2)
+        self.assertEqual(self._count_rows(models.Port), 3)
+
+    def test_compact_deleted(self):
+        other_net_id = db.network_create("t1", "net2")['uuid']
+        other_port_id = db.port_create(other_net_id)['uuid']
+        db.port_destroy(other_port_id, other_net_id)
+        db.network_destroy(self.net_id)
+        self.assertEqual(db.compact_deleted(batch_size=2), 2)
+        self.assertEqual(db.compact_deleted(batch_size=2), 3)
+        self.assertEqual(db.compact_deleted(batch_size=2), 0)
+        self.assertEqual(self._count_rows(models.Port), 0)
+        self.assertEqual(self._count_rows(models.Network), 1)
+        self.assertEqual(db.port_list(other_net_id), [])
+
+    def test_compactor_waits_for_quiet_database(self):
+        db.network_destroy(self.net_id)
+        compactor = db.TombstoneCompactor(60, batch_size=2)
+        db._POOL_METRICS.in_use += 1
+        try:
+            self.assertEqual(compactor.compact(), 0)
+        finally:
+            db._POOL_METRICS.in_use -= 1
+        self.assertEqual(compactor.compact(), 4)
+
+    def test_compactor_max_in_use(self):
+        db.configure_soft_delete(True, 300, max_in_use=3)
+        self.assertEqual(db._COMPACTOR.max_in_use, 3)
+        db.configure_soft_delete(True, 300)
+        # the in-memory database has a single connection
+        self.assertEqual(db._COMPACTOR.max_in_use, 0)
+        queue_pool = pool.QueuePool(lambda: None, pool_size=20)
+        self.assertEqual(db._pool_share(queue_pool, 4), 5)
+
+
+class QuantumDBListTest(unittest.TestCase):
+    """Tests for filtered and paginated listings"""
+    def setUp(self):
+        db.configure_db({'sql_connection': 'sqlite:///:memory:'})
+        db.begin_test_transaction()
+        self.net_id = db.network_create("t1", "net1")['uuid']
+
+    def tearDown(self):
+        db.rollback_test_transaction()
+
+    def _pages(self, list_func, *args, **filters):
+        pages = []
+        marker = None
+        while True:
+            page = [item['uuid'] for item in
+                    list_func(*args, marker=marker, limit=2, **filters)]
+            if not page:
+                return pages
+            pages.append(page)
+            marker = page[-1]
+
+    def test_network_list_paginated(self):
+        for i in range(4):
+            db.network_create("t1", "net%d" % i)
+        net_ids = sorted([net['uuid'] for net in db.network_list("t1")])
+        pages = self._pages(db.network_list, "t1")
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+        self.assertEqual(sum(pages, []), net_ids)
+
+    def test_network_list_filtered(self):
+        net_id = db.network_create("t1", "net2", op_status='UP')['uuid']
+        db.network_create("t2", "net2", op_status='UP')
+        self.assertEqual([net['uuid'] for net in
+                          db.network_list("t1", name="net2")], [net_id])
+        self.assertEqual([net['uuid'] for net in
+                          db.network_list("t1", op_status='UP')], [net_id])
+        self.assertEqual(db.network_list("t1", name="net3"), [])
+
+    def test_port_list_paginated(self):
+        db.port_create_bulk(self.net_id, [None] * 5)
+        port_ids = sorted([port['uuid']
+                           for port in db.port_list(self.net_id)])
+        pages = self._pages(db.port_list, self.net_id)
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+        self.assertEqual(sum(pages, []), port_ids)
+
+    def test_port_list_filtered(self):
+        active, down = db.port_create_bulk(self.net_id, ['ACTIVE', 'DOWN'])
+        db.port_set_attachment(active['uuid'], self.net_id, "vif1.1")
+        self.assertEqual([port['uuid'] for port in
+                          db.port_list(self.net_id, state='DOWN')],
+                         [down['uuid']])
+        self.assertEqual([port['uuid'] for port in
+                          db.port_list(self.net_id, interface_id="vif1.1")],
+                         [active['uuid']])
+        self.assertEqual(db.port_list(self.net_id, state='DOWN',
+                                      interface_id="vif1.1"), [])
+        self.assertEqual(db.port_list(self.net_id, marker=max(
+                             active['uuid'], down['uuid'])), [])
+
+    def test_network_list_rows(self):
+        db.network_create("t1", "net2", op_status='UP')
+        rows = db.network_list_rows("t1", name="net1")
+        self.assertEqual([(row.uuid, row.name, row.op_status)
+                          for row in rows], [(self.net_id, "net1", "UNKNOWN")])
+        self.assertFalse(isinstance(rows[0], models.Network))
+        self.assertEqual(len(db.network_list_rows("t1", limit=1)), 1)
+
+    def test_port_list_rows(self):
+        self.assertEqual(db.port_list_rows(self.net_id), [])
+        active, down = db.port_create_bulk(self.net_id, ['ACTIVE', 'DOWN'])
+        db.port_set_attachment(active['uuid'], self.net_id, "vif1.1")
+        rows = db.port_list_rows(self.net_id, state='ACTIVE')
+        self.assertEqual([(row.uuid, row.network_id, row.interface_id,
+                           row.state) for row in rows],
+                         [(active['uuid'], self.net_id, "vif1.1", 'ACTIVE')])
+        self.assertFalse(isinstance(rows[0], models.Port))
+        self.assertEqual(len(db.port_list_rows(self.net_id)), 2)
+        self.assertRaises(q_exc.NetworkNotFound, db.port_list_rows,
+                          "bad_net")
+
+    def test_port_list_filtered_network_not_found(self):
+        self.assertRaises(q_exc.NetworkNotFound, db.port_list, "bad_net",
+                          state='DOWN', limit=1)
+
+
+class QuantumDBChangeLogTest(unittest.TestCase):
+    """Tests for the change log"""
+    def setUp(self):
+        db.configure_db({'sql_connection': 'sqlite:///:memory:'})
+        db.begin_test_transaction()
+        self.first_seq = db.change_last_seq()
+        self.net_id = db.network_create("t1", "net1")['uuid']
+
+    def tearDown(self):
+        db.rollback_test_transaction()
+
+    def _changes(self, since, tenant_id=None, limit=None):
+        return [(change.resource, change.resource_id, change.action)
+                for change in db.change_list(since, tenant_id, limit)]
+
+    def test_change_list(self):
+        port_id = db.port_create(self.net_id)['uuid']
+        db.port_set_attachment(port_id, self.net_id, "vif1.1")
+        db.port_destroy_all(self.net_id)
+        db.network_create("t2", "net2")
+        db.record_changes('vlan_binding', db.CHANGE_CREATE,
+                          [(self.net_id, self.net_id)])
+        self.assertEqual(self._changes(self.first_seq, "t1"),
+                         [('network', self.net_id, 'create'),
+                          ('port', port_id, 'create'),
+                          ('port', port_id, 'update'),
+                          ('port', port_id, 'delete')])
+        self.assertEqual(self._changes(self.first_seq, "t1", limit=1),
+                         [('network', self.net_id, 'create')])
+        self.assertEqual(len(self._changes(self.first_seq)), 6)
+        self.assertEqual(self._changes(db.change_last_seq()), [])
+
+    def test_change_page(self):
+        db.network_create("t2", "net2")
+        last_seq = db.change_last_seq()
+        changes, next_seq = db.change_page(self.first_seq, "t1")
+        self.assertEqual(len(changes), 1)
+        # the changes of other tenants are skipped
+        self.assertEqual(next_seq, last_seq)
+        changes, next_seq = db.change_page(self.first_seq, limit=1)
+        self.assertEqual(next_seq, changes[0].seq)
+
+    def test_change_wait(self):
+        last_seq = db.change_last_seq()
+        self.assertTrue(db.change_wait(self.first_seq, "t1"))
+        self.assertFalse(db.change_wait(last_seq, "t1"))
+        # committed changes wake the waiter before the next poll
+        db.configure_change_log(0, wait_poll_interval=60)
+        self.addCleanup(db.configure_change_log, 0)
+        creator = eventlet.spawn_after(0.1, db.network_create, "t1", "net2")
+        start = time.time()
+        self.assertTrue(db.change_wait(last_seq, "t1", 30))
+        self.assertTrue(time.time() - start < 10)
+        creator.wait()
+
+    def test_change_wait_other_tenant(self):
+        last_seq = db.change_last_seq()
+        eventlet.spawn_after(0.1, db.network_create, "t2", "net2")
+        self.assertFalse(db.change_wait(last_seq, "t1", 0.5))
+        self.assertTrue(db.change_wait(last_seq, None, 0))
+
+    def test_notifier(self):
+        notifier = db.ChangeNotifier()
+        count = notifier.count
+        self.assertFalse(notifier.wait(count, 0.01))
+        notifier.notify()
+        # notifications sent before waiting are not missed
+        self.assertTrue(notifier.wait(count, 30))
+        eventlet.spawn_after(0.01, notifier.notify)
+        self.assertTrue(notifier.wait(notifier.count, 30))
+
+    def test_change_prune(self):
+        db.network_update(self.net_id, "net2")
+        db.network_destroy(self.net_id)
+        self.assertEqual(db.change_prune(1), 2)
+        self.assertEqual(db.change_prune(1), 0)
+        self.assertRaises(q_exc.ChangesExpired, db.change_list,
+                          self.first_seq)
+        last_seq = db.change_last_seq()
+        self.assertEqual(self._changes(last_seq - 1),
+                         [('network', self.net_id, 'delete')])
+
+    def test_pruner_started_by_server_only(self):
+        self.assertEqual(db._PRUNER, None)
+        db.configure_change_log(1, 300)
+        try:
+            self.assertEqual(db._PRUNER._thread, None)
+            db.start_change_log_pruner()
+            self.assertNotEqual(db._PRUNER._thread, None)
+        finally:
+            db.configure_change_log(100000, 0)
+        self.assertEqual(db._PRUNER, None)
+
+
+class NetworkCacheTest(unittest.TestCase):
+    """Tests for the network lookup cache"""
+    def setUp(self):
+        db.configure_db({'sql_connection': 'sqlite:///:memory:'})
+        db.begin_test_transaction()
+        db.configure_network_cache(2)
+        if QuantumDBRoundTripTest.counter is None:
+            QuantumDBRoundTripTest.counter = StatementCounter(db._ENGINE)
+        self.counter = QuantumDBRoundTripTest.counter
+        self.net_id = db.network_create("t1", "net1")['uuid']
+
+    def tearDown(self):
+        self.counter.stop()
+        db.rollback_test_transaction()
+        db.configure_network_cache(0)
+
+    def test_lru_eviction(self):
+        cache = db.NetworkCache(2, 60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        self.assertEqual(cache.get("a"), 1)
+        cache.set("c", 3)
+        self.assertEqual(cache.get("b"), None)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.get("c"), 3)
+        self.assertEqual((cache.hits, cache.misses), (3, 1))
+
+    def test_ttl_expiry(self):
+        cache = db.NetworkCache(2, -1)
+        cache.set("a", 1)
+        self.assertEqual(cache.get("a"), None)
+
+    def test_invalidate(self):
+        cache = db.NetworkCache(2, 60)
+        cache.set("a", 1)
+        cache.invalidate("a")
+        cache.invalidate("b")
+        self.assertEqual(cache.get("a"), None)
+
+    def test_lookup_hit_skips_database(self):
+        self.assertEqual(db.network_lookup(self.net_id), ("t1", "UNKNOWN"))
+        self.counter.start()
+        self.assertEqual(db.network_lookup(self.net_id), ("t1", "UNKNOWN"))
+        db.port_create(self.net_id)
+        self.counter.stop()
+        self.assertEqual(self.counter.count('SELECT'), 0)
+
+    def test_port_get_uses_cache(self):
+        port_id = db.port_create(self.net_id)['uuid']
+        db._NETWORK_CACHE.clear()
+        self.assertEqual(db.port_get(port_id, self.net_id).uuid, port_id)
+        self.assertEqual(db._NETWORK_CACHE.get(self.net_id),
+                         ("t1", "UNKNOWN"))
+        self.counter.start()
+        db.port_unset_attachment(port_id, self.net_id)
+        self.counter.stop()
+        selects = [s for s in self.counter.statements
+                   if s.lstrip().upper().startswith('SELECT')]
+        self.assertEqual(len(selects), 1)
+        self.assertFalse('networks' in selects[0])
+
+    def test_lookup_invalidated(self):
+        db.network_lookup(self.net_id)
+        db.network_update(self.net_id, "t1", op_status="UP")
+        self.assertEqual(db.network_lookup(self.net_id), ("t1", "UP"))
+        db.network_destroy(self.net_id)
+        self.assertRaises(q_exc.NetworkNotFound, db.network_lookup,
+                          self.net_id)
+        self.assertRaises(q_exc.NetworkNotFound, db.port_create,
+                          self.net_id)
+
+    def test_lookup_invalidated_after_commit(self):
+        with db.unit_of_work():
+            db.network_update(self.net_id, "t1", op_status="UP")
+            # not cached before the update commits
+            self.assertEqual(db.network_lookup(self.net_id), ("t1", "UP"))
+            self.assertEqual(db._NETWORK_CACHE.get(self.net_id), None)
+            # as another greenthread reading the database would do
+            db._NETWORK_CACHE.set(self.net_id, ("t1", "UNKNOWN"))
+        self.assertEqual(db.network_lookup(self.net_id), ("t1", "UP"))
+
+    def test_lookup_invalidated_after_rollback(self):
+        try:
+            with db.unit_of_work():
+                db.network_update(self.net_id, "t1", op_status="UP")
+                db._NETWORK_CACHE.set(self.net_id, ("t1", "UP"))
+                raise ValueError()
+        except ValueError:
+            pass
+        self.assertEqual(db.network_lookup(self.net_id), ("t1", "UNKNOWN"))
+
+
+class PortStatusTest(unittest.TestCase):
+    """Tests for batched port operational status writes"""
+    def setUp(self):
+        db.configure_db({'sql_connection': 'sqlite:///:memory:'})
+        db.begin_test_transaction()
+        if QuantumDBRoundTripTest.counter is None:
+            QuantumDBRoundTripTest.counter = StatementCounter(db._ENGINE)
+        self.counter = QuantumDBRoundTripTest.counter
+        self.net_id = db.network_create("t1", "net1")['uuid']
+        self.port_ids = [port['uuid'] for port in
+                         db.port_create_bulk(self.net_id, [None] * 4)]
+
+    def tearDown(self):
+        self.counter.stop()
+        db.rollback_test_transaction()
+
+    def _op_status(self):
+        return dict((port['uuid'], port['op_status'])
+                    for port in db.port_list(self.net_id))
+
+    def test_set_op_status_bulk(self):
+        statuses = {self.port_ids[0]: 'UP', self.port_ids[1]: 'DOWN',
+                    self.port_ids[2]: 'UP', "bad_port": 'UP'}
+        self.counter.start()
+        self.assertEqual(db.port_set_op_status_bulk(statuses), 3)
+        self.counter.stop()
+        self.assertEqual(self.counter.count('UPDATE'), 1)
+        self.assertEqual(self.counter.count('INSERT'), 1)
+        del statuses["bad_port"]
+        statuses[self.port_ids[3]] = 'UNKNOWN'
+        self.assertEqual(self._op_status(), statuses)
+
+    def test_set_op_status_bulk_skips_deleted_ports(self):
+        db.configure_soft_delete(True)
+        try:
+            db.port_destroy(self.port_ids[0], self.net_id)
+        finally:
+            db.configure_soft_delete(False)
+        last_seq = db.change_last_seq()
+        self.assertEqual(db.port_set_op_status_bulk(
+            {self.port_ids[0]: 'UP', self.port_ids[1]: 'UP'}), 1)
+        self.assertEqual([change['resource_id']
+                          for change in db.change_list(last_seq)],
+                         [self.port_ids[1]])
+
+    def test_set_op_status_bulk_batches(self):
+        port_ids = [port['uuid'] for port in
+                    db.port_create_bulk(self.net_id, [None] * 700)]
+        self.counter.start()
+        db.port_set_op_status_bulk(dict((port_id, 'UP')
+                                        for port_id in port_ids))
+        self.counter.stop()
+        self.assertEqual(self.counter.count('UPDATE'), 3)
+        self.assertEqual(self._op_status().values().count('UP'), 700)
+
+    def test_set_op_status_bulk_expires_loaded_ports(self):
+        with db.unit_of_work():
+            port = db.port_get(self.port_ids[0], self.net_id)
+            db.port_set_op_status_bulk({self.port_ids[0]: 'UP'})
+            self.assertEqual(port['op_status'], 'UP')
+
+
+class QuantumDBUnitOfWorkTest(unittest.TestCase):
+    """Tests for request-scoped sessions"""
+    def setUp(self):
+        db.configure_db({'sql_connection': 'sqlite:///:memory:'})
+        db.begin_test_transaction()
+
+    def tearDown(self):
+        db.rollback_test_transaction()
+
+    def test_session_is_shared(self):
+        with db.unit_of_work() as session:
+            self.assertTrue(db.get_session() is session)
+            with db.unit_of_work() as nested_session:
+                self.assertTrue(nested_session is session)
+            net = db.network_create("t1", "net1")
+            port = db.port_create(net['uuid'])
+            self.assertTrue(port in session)
+        self.assertFalse(db.get_session() is session)
+        self.assertEqual(len(db.port_list(net['uuid'])), 1)
+
+    def test_rollback_on_error(self):
+        try:
+            with db.unit_of_work():
+                db.network_create("t1", "net1")
+                raise ValueError()
+        except ValueError:
+            pass
+        self.assertEqual(db.network_list("t1"), [])
+
+    def test_middleware(self):
+        sessions = []
+
+        @webob.dec.wsgify
+        def app(req):
+            net = db.network_create("t1", "net1")
+            db.port_create(net['uuid'])
+            sessions.append(db.get_session())
+            sessions.append(db.get_session())
+            return webob.Response()
+
+        webob.Request.blank('/').get_response(
+            middleware.UnitOfWorkMiddleware(app))
+        self.assertTrue(sessions[0] is sessions[1])
+        self.assertEqual(len(db.network_list("t1")), 1)
+
+    def test_middleware_rollback_on_error_response(self):
+        @webob.dec.wsgify
+        def app(req):
+            db.network_create("t1", "net1")
+            # as wsgi.Resource answers the faults of the plugin
+            return webob.exc.HTTPInternalServerError()
+
+        response = webob.Request.blank('/').get_response(
+            middleware.UnitOfWorkMiddleware(app))
+        self.assertEqual(response.status_int, 500)
+        self.assertEqual(db.network_list("t1"), [])
+
+
+class QuantumDBReplicaTest(unittest.TestCase):
+    """Tests for reads routed to read replicas"""
+    def setUp(self):
+        db.configure_db({'sql_connection': 'sqlite:///:memory:'})
+        db.begin_test_transaction()
+        db.configure_replicas(['sqlite:///:memory:'])
+        # the replica never catches up with the primary
+        migration.upgrade(db._get_read_session().bind, core.REPOSITORY,
+                          core.MIGRATIONS)
+        self.net_id = db.network_create("t1", "net1")['uuid']
+
+    def tearDown(self):
+        db.configure_replicas([])
+        db.rollback_test_transaction()
+
+    def test_reads_from_replica(self):
+        self.assertEqual(db.network_list("t1"), [])
+        self.assertRaises(q_exc.NetworkNotFound, db.network_get, self.net_id)
+        self.assertRaises(q_exc.NetworkNotFound, db.port_list, self.net_id)
+        # writes are verified against the primary
+        db.network_update(self.net_id, "t1", name="net2")
+        db.port_create(self.net_id)
+
+    def test_unit_of_work(self):
+        with db.unit_of_work():
+            self.assertEqual(len(db.network_list("t1")), 1)
+        with db.unit_of_work(read_only=True):
+            self.assertEqual(db.network_list("t1"), [])
+
+    def test_middleware(self):
+        @webob.dec.wsgify
+        def app(req):
+            return str(len(db.network_list("t1")))
+
+        def get_response(method, headers=None):
+            request = webob.Request.blank('/', method=method,
+                                          headers=headers or {})
+            return request.get_response(
+                middleware.UnitOfWorkMiddleware(app)).body
+
+        self.assertEqual(get_response('GET'), "0")
+        self.assertEqual(get_response(
+            'GET', {middleware.READ_PRIMARY_HEADER: 'true'}), "1")
+        self.assertEqual(get_response('POST'), "1")
+
+
+class QuantumDBEngineTest(unittest.TestCase):
+    """Tests for engine and connection pool configuration"""
+
+    def test_sqlite_memory_engine_args(self):
+        args = db._engine_args({'sql_connection': 'sqlite://',
+                                'sql_pool_size': '5'})
+        self.assertEqual(args['poolclass'], pool.StaticPool)
+        self.assertFalse('pool_size' in args)
+
+    def test_pool_engine_args(self):
+        args = db._engine_args({'sql_connection': 'mysql://u:p@host/db',
+                                'sql_pool_size': '20',
+                                'sql_max_overflow': '40',
+                                'sql_pool_timeout': '5',
+                                'sql_pool_recycle': '600'})
+        self.assertEqual(args['pool_size'], 20)
+        self.assertEqual(args['max_overflow'], 40)
+        self.assertEqual(args['pool_timeout'], 5)
+        self.assertEqual(args['pool_recycle'], 600)
+        self.assertFalse(args['echo_pool'])
+
+    def test_pool_metrics(self):
+        db.configure_db({'sql_connection': 'sqlite:///:memory:'})
+        db._POOL_METRICS.reset()
+        db.network_list("t1")
+        metrics = db.get_pool_metrics()
+        self.assertTrue(metrics['checkouts'] >= 1)
+        self.assertEqual(metrics['in_use'], 0)
+        self.assertTrue(metrics['max_in_use'] >= 1)
+
+    def test_rollback_test_transaction(self):
+        db.configure_db({'sql_connection': 'sqlite:///:memory:'})
+        db.begin_test_transaction()
+        try:
+            db.network_create("t1", "net1")
+            try:
+                with db.unit_of_work():
+                    db.network_create("t1", "net2")
+                    raise ValueError()
+            except ValueError:
+                pass
+            self.assertEqual([net['name'] for net in db.network_list("t1")],
+                             ["net1"])
+        finally:
+            db.rollback_test_transaction()
+        self.assertEqual(db.network_list("t1"), [])
+
+    def test_savepoints_only_in_test_transaction(self):
+        db.configure_db({'sql_connection': 'sqlite:///:memory:'})
+        dialect = db._ENGINE.dialect
+        self.assertFalse('do_commit' in dialect.__dict__)
+        db.begin_test_transaction()
+        try:
+            self.assertTrue('do_commit' in dialect.__dict__)
+        finally:
+            db.rollback_test_transaction()
+        self.assertFalse('do_commit' in dialect.__dict__)
+        # out of tests, transactions are committed or rolled back
+        try:
+            db.network_create("t1", "net1")
+            try:
+                with db.unit_of_work():
+                    db.network_create("t1", "net2")
+                    raise ValueError()
+            except ValueError:
+                pass
+            self.assertEqual([net['name'] for net in db.network_list("t1")],
+                             ["net1"])
+        finally:
+            db.clear_db()
+
+
+class QuantumDBSchemaTest(unittest.TestCase):
+    """Tests for indexes and constraints"""
+    def setUp(self):
+        db.configure_db({'sql_connection': 'sqlite:///:memory:'})
+        db.begin_test_transaction()
+        self.net_id = db.network_create("t1", "net1")['uuid']
+
+    def tearDown(self):
+        db.rollback_test_transaction()
+
+    def test_interface_id_unique(self):
+        port1 = db.port_create(self.net_id)
+        port2 = db.port_create(self.net_id)
+        db.port_set_attachment(port1['uuid'], self.net_id, "vif1.1")
+        session = db.get_session()
+        port = session.query(models.Port).filter_by(uuid=port2['uuid']).one()
+        port.interface_id = "vif1.1"
+        self.assertRaises(sql_exc.IntegrityError, session.flush)
+
+    def test_detached_ports_have_no_interface_id(self):
+        for _i in range(2):
+            port_id = db.port_create(self.net_id)['uuid']
+            db.port_set_attachment(port_id, self.net_id, "vif1.1")
+            db.port_set_attachment(port_id, self.net_id, "")
+            self.assertEqual(db.port_get(port_id, self.net_id)['interface_id'],
+                             None)
@@ -0,0 +1,134 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2011 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+import unittest
+
+import nose
+
+import quantum.tests.unit.test_api as test_api
+
+from quantum import manager
+from quantum.api.api_common import OperationalStatus
+from quantum.common import exceptions as exc
+from quantum.common.test_lib import test_config
+from quantum.plugins.sample.SamplePlugin import MemoryPlugin
+
+MEMORY_PLUGIN = 'quantum.plugins.sample.SamplePlugin.MemoryPlugin'
+
+
+class MemoryPluginAPITest(test_api.APITestV11):
+    """Runs the API tests against MemoryPlugin"""
+
+    def setUp(self):
+        self._plugin_name = test_config['plugin_name']
+        test_config['plugin_name'] = MEMORY_PLUGIN
+        # every test gets a new, empty plugin
+        manager.QuantumManager._instance = None
+        super(MemoryPluginAPITest, self).setUp()
+        self.net_op_status = OperationalStatus.UP
+        self.port_op_status = OperationalStatus.UP
+
+    def tearDown(self):
+        super(MemoryPluginAPITest, self).tearDown()
+        test_config['plugin_name'] = self._plugin_name
+        manager.QuantumManager._instance = None
+
+    def _skip_query_count(self):
+        raise nose.SkipTest("MemoryPlugin issues no queries to count")
+
+    def test_show_network_detail_queries_json(self):
+        self._skip_query_count()
+
+    def test_show_network_detail_queries_xml(self):
+        self._skip_query_count()
+
+    def test_list_ports_detail_queries_json(self):
+        self._skip_query_count()
+
+    def test_list_ports_detail_queries_xml(self):
+        self._skip_query_count()
+
+    def _prune_changes(self):
+        plugin = manager.QuantumManager.get_plugin()
+        plugin._changes = collections.deque([plugin._changes[-1]])
+
+
+class MemoryPluginTest(unittest.TestCase):
+
+    def setUp(self):
+        self.plugin = MemoryPlugin()
+        self.tenant_id = "t1"
+        self.net_id = self.plugin.create_network(self.tenant_id,
+                                                 "net1")['net-id']
+
+    def _create_port(self):
+        return self.plugin.create_port(self.tenant_id, self.net_id,
+                                       'ACTIVE')['port-id']
+
+    def test_networks_are_per_tenant(self):
+        self.plugin.create_network("t2", "net2")
+        self.assertEqual([self.net_id],
+                         [net['net-id'] for net in
+                          self.plugin.get_all_networks(self.tenant_id)])
+        self.assertRaises(exc.NetworkNotFound,
+                          self.plugin.get_network_details,
+                          "t2", self.net_id)
+
+    def test_plug_interface_already_attached(self):
+        port1 = self._create_port()
+        port2 = self._create_port()
+        self.plugin.plug_interface(self.tenant_id, self.net_id,
+                                   port1, "iface")
+        try:
+            self.plugin.plug_interface(self.tenant_id, self.net_id,
+                                       port2, "iface")
+            self.fail("AlreadyAttached not raised")
+        except exc.AlreadyAttached, e:
+            self.assertTrue(port1 in str(e))
+        self.assertRaises(exc.PortInUse,
+                          self.plugin.plug_interface,
+                          self.tenant_id, self.net_id, port1, "other")
+        # the interface can be plugged again once it is unplugged
+        self.plugin.unplug_interface(self.tenant_id, self.net_id, port1)
+        self.plugin.plug_interface(self.tenant_id, self.net_id,
+                                   port2, "iface")
+        self.assertEqual("iface",
+                         self.plugin.get_port_details(
+                             self.tenant_id, self.net_id,
+                             port2)['attachment'])
+
+    def test_delete_network(self):
+        port_id = self._create_port()
+        self.plugin.plug_interface(self.tenant_id, self.net_id,
+                                   port_id, "iface")
+        self.assertRaises(exc.NetworkInUse,
+                          self.plugin.delete_network,
+                          self.tenant_id, self.net_id)
+        self.plugin.unplug_interface(self.tenant_id, self.net_id, port_id)
+        self.plugin.delete_network(self.tenant_id, self.net_id)
+        self.assertEqual([], self.plugin.get_all_networks(self.tenant_id))
+        self.assertRaises(exc.NetworkNotFound,
+                          self.plugin.get_port_details,
+                          self.tenant_id, self.net_id, port_id)
+
+    def test_create_ports_bulk_invalid_state(self):
+        self.assertRaises(exc.StateInvalid,
+                          self.plugin.create_ports_bulk,
+                          self.tenant_id, self.net_id, ['ACTIVE', 'BAD'])
+        self.assertEqual([], self.plugin.get_all_ports(self.tenant_id,
+                                                       self.net_id))
@@ -0,0 +1,125 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2011 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import unittest
+
+from sqlalchemy import Column, create_engine, Integer, MetaData, String, Table
+from sqlalchemy.engine import reflection
+
+from quantum.db import migration
+from quantum.db.migration import core
+from quantum.tests.unit.test_database import StatementCounter
+
+
+class MigrationTest(unittest.TestCase):
+    """Tests for the schema migrations"""
+    def setUp(self):
+        self.engine = create_engine('sqlite://')
+        self.counter = StatementCounter(self.engine)
+
+    def tearDown(self):
+        self.counter.stop()
+
+    def _index_names(self, table_name):
+        inspector = reflection.Inspector.from_engine(self.engine)
+        return dict((index['name'], index)
+                    for index in inspector.get_indexes(table_name))
+
+    def test_upgrade_new_database(self):
+        self.assertEqual(migration.upgrade(self.engine, core.REPOSITORY,
+                                           core.MIGRATIONS),
+                         len(core.MIGRATIONS))
+        self.assertTrue('ix_ports_network_id' in self._index_names('ports'))
+        self.assertEqual(migration.get_version(self.engine, core.REPOSITORY),
+                         len(core.MIGRATIONS))
+        self.assertEqual(migration.get_version(self.engine, "other"), 0)
+
+    def test_upgrade_up_to_date(self):
+        migration.upgrade(self.engine, core.REPOSITORY, core.MIGRATIONS)
+        self.counter.start()
+        migration.upgrade(self.engine, core.REPOSITORY, core.MIGRATIONS)
+        self.counter.stop()
+        # the version table lookup, and no reflection of the schema
+        self.assertEqual(len(self.counter.statements), 2)
+        self.assertEqual(self.counter.count('SELECT'), 1)
+
+    def test_upgrade_runs_new_migrations(self):
+        ran = []
+
+        def first(engine):
+            ran.append('first')
+
+        def second(engine):
+            ran.append('second')
+
+        migration.upgrade(self.engine, "test", [first])
+        self.assertEqual(migration.upgrade(self.engine, "test",
+                                           [first, second]), 2)
+        self.assertEqual(ran, ['first', 'second'])
+        migration.downgrade_all(self.engine, "test")
+        self.assertEqual(migration.get_version(self.engine, "test"), 0)
+
+    def test_upgrade_schema_without_indexes(self):
+        self.engine.execute("CREATE TABLE networks (uuid VARCHAR(255) "
+                            "PRIMARY KEY, tenant_id VARCHAR(255), "
+                            "name VARCHAR(255), op_status VARCHAR(16))")
+        self.engine.execute("CREATE TABLE ports (uuid VARCHAR(255) "
+                            "PRIMARY KEY, network_id VARCHAR(255), "
+                            "interface_id VARCHAR(255), state VARCHAR(8), "
+                            "op_status VARCHAR(16))")
+        self.engine.execute("INSERT INTO ports VALUES ('p1', 'n1', '', "
+                            "'DOWN', 'DOWN')")
+        self.engine.execute("INSERT INTO ports VALUES ('p2', 'n1', '', "
+                            "'DOWN', 'DOWN')")
+        migration.upgrade(self.engine, core.REPOSITORY, core.MIGRATIONS)
+        port_indexes = self._index_names('ports')
+        self.assertTrue('ix_ports_network_id' in port_indexes)
+        self.assertTrue(port_indexes['ix_ports_interface_id']['unique'])
+        self.assertTrue('ix_networks_tenant_id' in
+                        self._index_names('networks'))
+        self.assertEqual(self.engine.execute(
+            "SELECT uuid, deleted FROM ports").fetchall(),
+            [('p1', False), ('p2', False)])
+
+    def test_add_column(self):
+        table = Table('things', MetaData(),
+                      Column('id', Integer, primary_key=True))
+        table.create(self.engine)
+        self.engine.execute(table.insert().values(id=1))
+        column = Column('name', String(16), server_default='none')
+        table.append_column(column)
+        migration.add_column(self.engine, column)
+        migration.add_column(self.engine, column)
+        self.assertEqual(self.engine.execute(table.select()).fetchall(),
+                         [(1, 'none')])
+
+    def test_bulk_insert(self):
+        table = Table('things', MetaData(),
+                      Column('id', Integer, primary_key=True),
+                      Column('name', String(16)))
+        table.create(self.engine)
+        rows = [{'id': i, 'name': 'thing%d' % i} for i in range(1000)]
+        self.counter.start()
+        migration.bulk_insert(self.engine, table, rows)
+        self.counter.stop()
+        # 450 rows of 2 columns per statement
+        self.assertEqual(len(self.counter.statements), 3)
+        self.assertEqual(self.engine.execute(
+            table.select().where(table.c.id == 999)).fetchall(),
+            [(999, 'thing999')])
+        self.assertEqual(self.engine.execute(
+            table.count()).scalar(), 1000)
@@ -0,0 +1,289 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2011 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import datetime
+import unittest
+
+from quantum import wsgi
+from quantum.common import exceptions as exception
+from quantum.common import serializer
+from quantum.common import utils
+from quantum.common import xmlwriter
+
+
+def _networks(count):
+    return {'networks': [{'id': "net-%d" % i,
+                          'name': u"network \xe9 %d" % i,
+                          'ports': [{'id': "port-%d" % i,
+                                     'state': 'ACTIVE'}]}
+                         for i in range(count)],
+            'networks_links': [{'rel': 'next', 'href': "/networks"}]}
+
+
+def _response_serializer():
+    return wsgi.ResponseSerializer(
+        headers_serializer=wsgi.ResponseHeaderSerializer())
+
+
+class JSONStreamingTest(unittest.TestCase):
+
+    def test_json_plan(self):
+        data = _networks(1000)
+        plan = utils.JSONPlan(['networks'])
+        plan.batch_size = 10
+        chunks = list(plan.iter_encode(data, 4096))
+        self.assertTrue(len(chunks) > 1)
+        self.assertTrue(max([len(chunk) for chunk in chunks]) < 8192)
+        self.assertEqual(''.join(chunks), utils.dumps(data))
+
+    def test_json_plan_converts_values(self):
+        plan = utils.JSONPlan(['networks'])
+        data = {'networks': [{'created': datetime.datetime(2011, 11, 1),
+                              'ports': (1, 2)}]}
+        self.assertEqual(utils.loads(''.join(plan.iter_encode(data))),
+                         utils.loads(utils.dumps(data)))
+        data[3] = None
+        self.assertEqual(utils.loads(''.join(plan.iter_encode(data))),
+                         utils.loads(utils.dumps(data)))
+        self.assertRaises(TypeError, list,
+                          plan.iter_encode({'networks': [object()]}))
+
+    def test_large_body_is_streamed(self):
+        # the default serializers are shared, and not modified
+        json_serializer = wsgi.JSONDictSerializer()
+        json_serializer.chunk_size = 4096
+        serializer = wsgi.ResponseSerializer(
+            {'application/json': json_serializer},
+            wsgi.ResponseHeaderSerializer())
+        data = _networks(1000)
+        response = serializer.serialize(data, 'application/json')
+        self.assertEqual(response.content_length, None)
+        self.assertTrue(len(list(response.app_iter)) > 1)
+        response = serializer.serialize(data, 'application/json')
+        self.assertEqual(response.body, utils.dumps(data))
+
+    def test_small_body_has_length(self):
+        serializer = _response_serializer()
+        data = _networks(2)
+        response = serializer.serialize(data, 'application/json')
+        self.assertEqual(response.body, utils.dumps(data))
+        self.assertEqual(response.content_length, len(response.body))
+
+
+class XMLSerializationTest(unittest.TestCase):
+    """The output of the serializers is the one minidom wrote"""
+
+    metadata = {'attributes': {'network': ['id', 'name'],
+                               'port': ['id', 'state']},
+                'plurals': {'networks': 'network', 'ports': 'port'}}
+
+    def test_dict_serializer(self):
+        data = {'networks': [{'id': 'n1', 'name': 'a&b "c"',
+                              'ports': [{'id': 'p1', 'state': 'UP',
+                                         'desc': ''}]},
+                             {'id': 'n2', 'name': 'x', 'ports': []}],
+                'networks_links': [{'rel': 'next',
+                                    'href': '/networks?marker=n2&limit=2'}]}
+        xml_serializer = wsgi.XMLDictSerializer(self.metadata, 'urn:q')
+        self.assertEqual(xml_serializer.serialize(data),
+                         '<networks xmlns="urn:q" '
+                         'xmlns:atom="http://www.w3.org/2005/Atom">'
+                         '<network id="n1" name="a&amp;b &quot;c&quot;">'
+                         '<ports><port id="p1" state="UP"><desc></desc>'
+                         '</port></ports></network>'
+                         '<network id="n2" name="x"><ports/></network>'
+                         '<atom:link href="/networks?marker=n2&amp;limit=2" '
+                         'rel="next"/></networks>')
+        xml_serializer.chunk_size = 16
+        chunks = list(xml_serializer.serialize_iter(data))
+        self.assertTrue(len(chunks) > 1)
+        self.assertEqual(''.join(chunks), xml_serializer.serialize(data))
+
+    def test_collections(self):
+        metadata = {'list_collections': {'tags': {'item_name': 'tag',
+                                                  'item_key': 'value'}},
+                    'dict_collections': {'meta': {'item_name': 'entry',
+                                                  'item_key': 'key'}}}
+        data = {'extensions': {'tags': [1, 2], 'meta': {'k': 'v<'},
+                               'enabled': True}}
+        self.assertEqual(wsgi.XMLDictSerializer(metadata).serialize(data),
+                         '<extensions><meta><entry key="k">v&lt;</entry>'
+                         '</meta><enabled>True</enabled><tags>'
+                         '<tag value="1"/><tag value="2"/></tags>'
+                         '</extensions>')
+
+    def test_legacy_serializers(self):
+        metadata = {'application/xml': self.metadata}
+        for serializer_class in (wsgi.Serializer, serializer.Serializer):
+            xml = serializer_class(metadata, 'urn:d').serialize(
+                {'network': {'id': 'n1', 'name': 'net', 'ports': []}},
+                'application/xml')
+            self.assertEqual(xml, '<network id="n1" name="net" '
+                                  'xmlns="urn:d"><ports/></network>')
+            # the default namespace does not replace the one of metadata
+            metadata['application/xml'] = dict(self.metadata, xmlns='urn:m')
+            xml = serializer_class(metadata, 'urn:d').serialize(
+                {'network': {'id': 'n1', 'name': 'net'}}, 'application/xml')
+            self.assertEqual(xml, '<network id="n1" name="net" '
+                                  'xmlns="urn:m"/>')
+            metadata['application/xml'] = self.metadata
+
+
+class CompiledSerializationTest(unittest.TestCase):
+    """Serializers compiled from metadata write what dumps and minidom did"""
+
+    metadata = {'attributes': {'network': ['id', 'name'],
+                               'port': ['id', 'state']},
+                'plurals': {'networks': 'network', 'ports': 'port'}}
+
+    def test_json_plan(self):
+        json_serializer = wsgi.JSONDictSerializer(self.metadata)
+        json_serializer.chunk_size = 4096
+        json_serializer._plan.batch_size = 7
+        for data in (_networks(1000), _networks(0),
+                     {'network': {'id': 'n1', 'ports': [{'id': 'p1'}] * 20}},
+                     {'network': {'id': 'n1', 'ports': ({'id': 'p1'},)}},
+                     {3: ['a']}, []):
+            chunks = list(json_serializer.serialize_iter(data))
+            self.assertEqual(''.join(chunks), utils.dumps(data))
+        self.assertTrue(len(list(json_serializer.serialize_iter(
+            _networks(1000)))) > 1)
+
+    def test_xml_plan(self):
+        plan = xmlwriter.Plan(dict(self.metadata, xmlns='urn:q'))
+        data = {'id': 'n1', 'name': 'a<b',
+                'ports': [{'id': 'p1', 'state': 'UP'}], 'tags': []}
+        xml = ('<network id="n1" name="a&lt;b" xmlns="urn:q"><ports '
+               'xmlns="urn:q"><port id="p1" state="UP" xmlns="urn:q"/>'
+               '</ports><tags xmlns="urn:q"/></network>')
+        # the plan is reusable
+        for _i in range(2):
+            self.assertEqual(plan.to_xml('network', data), xml)
+        self.assertEqual(xmlwriter.to_xml(dict(self.metadata, xmlns='urn:q'),
+                                          'network', data), xml)
+
+    def test_xml_plan_attribute_string(self):
+        # names of attributes given as a string are matched as before
+        plan = xmlwriter.Plan({'attributes': {'fault': 'code'}})
+        self.assertEqual(plan.to_xml('fault', {'code': 404, 'detail': 'x'}),
+                         '<fault code="404"><detail>x</detail></fault>')
+
+
+class ContentTypeRegistryTest(unittest.TestCase):
+
+    metadata = {'plurals': {'networks': 'network'}}
+
+    def test_shared_serializers(self):
+        serializers = wsgi.CONTENT_TYPES.get_serializers(self.metadata,
+                                                         'urn:q')
+        self.assertEqual(sorted(serializers),
+                         ['application/json', 'application/xml'])
+        self.assertTrue(serializers is wsgi.CONTENT_TYPES.get_serializers(
+            self.metadata, 'urn:q'))
+        self.assertEqual(serializers['application/xml'].xmlns, 'urn:q')
+        self.assertTrue(serializers['application/json'].metadata is
+                        self.metadata)
+        other = wsgi.CONTENT_TYPES.get_serializers(self.metadata, 'urn:o')
+        self.assertFalse(other['application/xml'] is
+                         serializers['application/xml'])
+        deserializers = wsgi.CONTENT_TYPES.get_deserializers(self.metadata)
+        self.assertTrue(deserializers is
+                        wsgi.CONTENT_TYPES.get_deserializers(self.metadata))
+        self.assertEqual(deserializers['application/xml'].deserialize(
+            '<networks><network id="n1"/></networks>')['body'],
+            {'networks': [{'id': 'n1'}]})
+
+    def test_default_serializers(self):
+        serializers = wsgi.CONTENT_TYPES.get_serializers()
+        xml_serializer = wsgi.XMLDictSerializer()
+        response_serializer = wsgi.ResponseSerializer(
+            {'application/xml': xml_serializer})
+        self.assertTrue(response_serializer.get_body_serializer(
+            'application/json') is serializers['application/json'])
+        self.assertTrue(response_serializer.get_body_serializer(
+            'application/xml') is xml_serializer)
+        self.assertFalse(serializers['application/xml'] is xml_serializer)
+        request_deserializer = wsgi.RequestDeserializer()
+        self.assertTrue(request_deserializer.get_body_deserializer(
+            'application/xml') is
+            wsgi.CONTENT_TYPES.get_deserializers()['application/xml'])
+
+    def test_legacy_serializer(self):
+        metadata = {'application/xml': self.metadata}
+        serializer = wsgi.CONTENT_TYPES.get_legacy_serializer(metadata,
+                                                              'urn:q')
+        self.assertTrue(serializer is
+                        wsgi.CONTENT_TYPES.get_legacy_serializer(metadata,
+                                                                 'urn:q'))
+        self.assertEqual(serializer.serialize({'networks': []},
+                                              'application/xml'),
+                         '<networks xmlns="urn:q"/>')
+
+    def test_register(self):
+        registry = wsgi.ContentTypeRegistry()
+        registry.register('json', 'application/json',
+                          wsgi.JSONDictSerializer, wsgi.JSONDeserializer)
+        self.assertEqual(registry.content_types, ['application/json'])
+        self.assertEqual(registry.formats, {'json': 'application/json'})
+        self.assertEqual(registry.get_serializers(self.metadata)[
+            'application/json'].serialize({'a': 1}), '{"a": 1}')
+        registry.register('text', 'text/plain', wsgi.DictSerializer,
+                          wsgi.TextDeserializer)
+        self.assertEqual(sorted(registry.get_serializers(self.metadata)),
+                         ['application/json', 'text/plain'])
+
+
+class XMLDeserializationTest(unittest.TestCase):
+
+    metadata = {'plurals': {'networks': 'network', 'ports': 'port'}}
+
+    def test_deserialize(self):
+        deserializer = wsgi.XMLDeserializer(self.metadata)
+        body = deserializer.deserialize(
+            '<networks xmlns="urn:q" '
+            'xmlns:atom="http://www.w3.org/2005/Atom">\n'
+            '  <network id="n1" name="a&amp;b">'
+            '<ports><port id="p1"><state>UP</state></port></ports>'
+            '</network>\n'
+            '  <network id="n2"><name><![CDATA[x<y]]></name></network>\n'
+            '  <atom:link rel="next" href="/networks?marker=n2"/>\n'
+            '</networks>')['body']
+        self.assertEqual(body, {
+            'networks': [{'id': 'n1', 'name': 'a&b',
+                          'ports': [{'id': 'p1', 'state': 'UP'}]},
+                         {'id': 'n2', 'name': 'x<y'}],
+            'networks_links': [{'rel': 'next',
+                                'href': '/networks?marker=n2'}]})
+        # namespace declarations are reported as attributes
+        self.assertEqual(deserializer.deserialize(
+            '<network xmlns="urn:q" name="net"/>')['body'],
+            {'network': {'xmlns': 'urn:q', 'name': 'net'}})
+
+    def test_deserialize_malformed(self):
+        deserializer = wsgi.XMLDeserializer(self.metadata)
+        for datastring in ('', '<network>', '<q:network/>'):
+            self.assertRaises(exception.MalformedRequestBody,
+                              deserializer.deserialize, datastring)
+
+    def test_legacy_serializers(self):
+        metadata = {'application/xml': self.metadata}
+        datastring = ('<networks><network id="n1"/><network id="n2"/>'
+                      '</networks>')
+        for serializer_class in (wsgi.Serializer, serializer.Serializer):
+            self.assertEqual(serializer_class(metadata).deserialize(
+                datastring, 'application/xml'),
+                {'networks': [{'id': 'n1'}, {'id': 'n2'}]})
@@ -12,21 +12,35 @@ def create_request(path, body, content_type, method='GET'):
     return req
 
 
-def _network_list_request(tenant_id, format='xml', detail=False):
+def _network_list_request(tenant_id, format='xml', detail=False,
+                          query_string=None):
     method = 'GET'
     detail_str = detail and '/detail' or ''
     path = "/tenants/%(tenant_id)s/networks" \
            "%(detail_str)s.%(format)s" % locals()
+    if query_string:
+        path += "?%s" % query_string
     content_type = "application/%s" % format
     return create_request(path, None, content_type, method)
 
 
-def network_list_request(tenant_id, format='xml'):
-    return _network_list_request(tenant_id, format)
+def changes_list_request(tenant_id, format='xml', query_string=None):
+    method = 'GET'
+    path = "/tenants/%(tenant_id)s/changes.%(format)s" % locals()
+    if query_string:
+        path += "?%s" % query_string
+    content_type = "application/%s" % format
+    return create_request(path, None, content_type, method)
 
 
-def network_list_detail_request(tenant_id, format='xml'):
-    return _network_list_request(tenant_id, format, detail=True)
+def network_list_request(tenant_id, format='xml', query_string=None):
+    return _network_list_request(tenant_id, format,
+                                 query_string=query_string)
+
+
+def network_list_detail_request(tenant_id, format='xml', query_string=None):
+    return _network_list_request(tenant_id, format, detail=True,
+                                 query_string=query_string)
 
 
 def _show_network_request(tenant_id, network_id, format='xml', detail=False):
@@ -75,22 +89,29 @@ def network_delete_request(tenant_id, network_id, format='xml'):
     return create_request(path, None, content_type, method)
 
 
-def _port_list_request(tenant_id, network_id, format='xml', detail=False):
+def _port_list_request(tenant_id, network_id, format='xml', detail=False,
+                       query_string=None):
     method = 'GET'
     detail_str = detail and '/detail' or ''
     path = "/tenants/%(tenant_id)s/networks/" \
            "%(network_id)s/ports%(detail_str)s.%(format)s" % locals()
+    if query_string:
+        path += "?%s" % query_string
     content_type = "application/%s" % format
     return create_request(path, None, content_type, method)
 
 
-def port_list_request(tenant_id, network_id, format='xml'):
-    return _port_list_request(tenant_id, network_id, format)
+def port_list_request(tenant_id, network_id, format='xml',
+                      query_string=None):
+    return _port_list_request(tenant_id, network_id, format,
+                              query_string=query_string)
 
 
-def port_list_detail_request(tenant_id, network_id, format='xml'):
+def port_list_detail_request(tenant_id, network_id, format='xml',
+                             query_string=None):
     return _port_list_request(tenant_id, network_id,
-                              format, detail=True)
+                              format, detail=True,
+                              query_string=query_string)
 
 
 def _show_port_request(tenant_id, network_id, port_id,
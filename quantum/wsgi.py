@@ -19,6 +19,7 @@
 Utility methods for working with WSGI servers
 """
 
+import itertools
 import logging
 import sys
 import eventlet.wsgi
@@ -28,11 +29,12 @@ import webob.dec
 import webob.exc
 
 from lxml import etree
-from xml.dom import minidom
 from xml.parsers import expat
 
 from quantum.common import exceptions as exception
 from quantum.common import utils
+from quantum.common import xmlreader
+from quantum.common import xmlwriter
 
 LOG = logging.getLogger('quantum.common.wsgi')
 
@@ -129,21 +131,21 @@ class Request(webob.Request):
         parts = self.path.rsplit('.', 1)
         if len(parts) > 1:
             format = parts[1]
-            if format in ['json', 'xml']:
-                return 'application/{0}'.format(parts[1])
+            if format in CONTENT_TYPES.formats:
+                return CONTENT_TYPES.formats[format]
 
         #Then look up content header
         type_from_header = self.get_content_type()
         if type_from_header:
             return type_from_header
-        ctypes = ['application/json', 'application/xml']
+        ctypes = CONTENT_TYPES.content_types
 
         #Finally search in Accept-* headers
         bm = self.accept.best_match(ctypes)
-        return bm or 'application/json'
+        return bm or ctypes[0]
 
     def get_content_type(self):
-        allowed_types = ("application/xml", "application/json")
+        allowed_types = CONTENT_TYPES.content_types
         if not "Content-Type" in self.headers:
             LOG.debug(_("Missing Content-Type"))
             return None
@@ -152,6 +154,18 @@ class Request(webob.Request):
             return type
         return None
 
+    def set_response_etag(self, etag):
+        """Tag the response to this request with etag.
+
+        Resource answers with 304 Not Modified, without serializing
+        the result of the controller, if the client holds the
+        representation tagged with etag already.
+        """
+        self.environ['quantum.response_etag'] = etag
+
+    def get_response_etag(self):
+        return self.environ.get('quantum.response_etag')
+
 
 class ActionDispatcher(object):
     """Maps method name to local methods through action name."""
@@ -169,9 +183,33 @@ class ActionDispatcher(object):
 class DictSerializer(ActionDispatcher):
     """Default request body serialization"""
 
+    def __init__(self, metadata=None, xmlns=None):
+        """
+        :param metadata: information needed to serialize dictionaries.
+        :param xmlns: XML namespace to include with serialized xml
+        """
+        self.metadata = metadata or {}
+        self.xmlns = xmlns
+
     def serialize(self, data, action='default'):
         return self.dispatch(data, action=action)
 
+    # Size of the strings of streamed responses
+    chunk_size = 65536
+
+    def serialize_iter(self, data, action='default'):
+        """Serialize data into an iterable of strings.
+
+        Serializers implementing default_iter produce the strings as
+        they are consumed, unless an action-specific method is defined.
+        """
+        if getattr(self, str(action), self.default) != self.default:
+            return [self.serialize(data, action)]
+        return self.default_iter(data)
+
+    def default_iter(self, data):
+        return [self.default(data)]
+
     def default(self, data):
         return ""
 
@@ -179,6 +217,17 @@ class DictSerializer(ActionDispatcher):
 class JSONDictSerializer(DictSerializer):
     """Default JSON request body serialization"""
 
+    def __init__(self, metadata=None, xmlns=None):
+        """
+        :param metadata: information needed to stream the lists of
+                         serialized dictionaries.
+        """
+        super(JSONDictSerializer, self).__init__(metadata, xmlns)
+        self._plan = utils.JSONPlan(self.metadata.get('plurals', {}))
+
+    def default_iter(self, data):
+        return self._plan.iter_encode(data, self.chunk_size)
+
     def default(self, data):
         return utils.dumps(data)
 
@@ -191,96 +240,44 @@ class XMLDictSerializer(DictSerializer):
                          a dictionary.
         :param xmlns: XML namespace to include with serialized xml
         """
-        super(XMLDictSerializer, self).__init__()
-        self.metadata = metadata or {}
-        self.xmlns = xmlns
+        super(XMLDictSerializer, self).__init__(metadata, xmlns)
+        self._plan = xmlwriter.Plan(self.metadata)
+
+    def default_iter(self, data):
+        """Write data as UTF-8 XML, in strings of about chunk_size."""
+        # We expect data to contain a single key which is the XML root,
+        # along with the links of the root, if any.
+        root_key = [key for key in data if not key.endswith('_links')][0]
+        links = data.get('%s_links' % root_key)
+        parts = self._plan.iter_element(root_key, data[root_key],
+                                        attrs=self._xmlns_attrs(bool(links)),
+                                        tail=self._link_parts(links or []))
+        return (chunk.encode('UTF-8')
+                for chunk in utils.iter_chunks(parts, self.chunk_size))
 
     def default(self, data):
-        # We expect data to contain a single key which is the XML root.
-        root_key = data.keys()[0]
-        doc = minidom.Document()
-        node = self._to_xml_node(doc, self.metadata, root_key, data[root_key])
-
-        return self.to_xml_string(node)
-
-    def to_xml_string(self, node, has_atom=False):
-        self._add_xmlns(node, has_atom)
-        return node.toxml('UTF-8')
+        return "".join(self.default_iter(data))
 
     #NOTE (ameade): the has_atom should be removed after all of the
     # xml serializers and view builders have been updated to the current
     # spec that required all responses include the xmlns:atom, the has_atom
     # flag is to prevent current tests from breaking
-    def _add_xmlns(self, node, has_atom=False):
+    def _xmlns_attrs(self, has_atom=False):
+        attrs = {}
         if self.xmlns is not None:
-            node.setAttribute('xmlns', self.xmlns)
+            attrs['xmlns'] = self.xmlns
         if has_atom:
-            node.setAttribute('xmlns:atom', "http://www.w3.org/2005/Atom")
-
-    def _to_xml_node(self, doc, metadata, nodename, data):
-        """Recursive method to convert data members to XML nodes."""
-        result = doc.createElement(nodename)
-
-        # Set the xml namespace if one is specified
-        # TODO(justinsb): We could also use prefixes on the keys
-        xmlns = metadata.get('xmlns', None)
-        if xmlns:
-            result.setAttribute('xmlns', xmlns)
-
-        #TODO(bcwaldon): accomplish this without a type-check
-        if isinstance(data, list):
-            collections = metadata.get('list_collections', {})
-            if nodename in collections:
-                metadata = collections[nodename]
-                for item in data:
-                    node = doc.createElement(metadata['item_name'])
-                    node.setAttribute(metadata['item_key'], str(item))
-                    result.appendChild(node)
-                return result
-            singular = metadata.get('plurals', {}).get(nodename, None)
-            if singular is None:
-                if nodename.endswith('s'):
-                    singular = nodename[:-1]
-                else:
-                    singular = 'item'
-            for item in data:
-                node = self._to_xml_node(doc, metadata, singular, item)
-                result.appendChild(node)
-        #TODO(bcwaldon): accomplish this without a type-check
-        elif isinstance(data, dict):
-            collections = metadata.get('dict_collections', {})
-            if nodename in collections:
-                metadata = collections[nodename]
-                for k, v in data.items():
-                    node = doc.createElement(metadata['item_name'])
-                    node.setAttribute(metadata['item_key'], str(k))
-                    text = doc.createTextNode(str(v))
-                    node.appendChild(text)
-                    result.appendChild(node)
-                return result
-            attrs = metadata.get('attributes', {}).get(nodename, {})
-            for k, v in data.items():
-                if k in attrs:
-                    result.setAttribute(k, str(v))
-                else:
-                    node = self._to_xml_node(doc, metadata, k, v)
-                    result.appendChild(node)
-        else:
-            # Type is atom
-            node = doc.createTextNode(str(data))
-            result.appendChild(node)
-        return result
+            attrs['xmlns:atom'] = "http://www.w3.org/2005/Atom"
+        return attrs
 
-    def _create_link_nodes(self, xml_doc, links):
-        link_nodes = []
+    def _link_parts(self, links):
+        parts = []
         for link in links:
-            link_node = xml_doc.createElement('atom:link')
-            link_node.setAttribute('rel', link['rel'])
-            link_node.setAttribute('href', link['href'])
+            attrs = {'rel': link['rel'], 'href': link['href']}
             if 'type' in link:
-                link_node.setAttribute('type', link['type'])
-            link_nodes.append(link_node)
-        return link_nodes
+                attrs['type'] = link['type']
+            parts.extend(xmlwriter.iter_empty_element('atom:link', attrs))
+        return parts
 
     def _to_xml(self, root):
         """Convert the xml object to an xml string."""
@@ -301,14 +298,11 @@ class ResponseSerializer(object):
     """Encode the necessary pieces into a response object"""
 
     def __init__(self, body_serializers=None, headers_serializer=None):
-        self.body_serializers = {
-            'application/xml': XMLDictSerializer(),
-            'application/json': JSONDictSerializer(),
-        }
+        self.body_serializers = dict(CONTENT_TYPES.get_serializers())
         self.body_serializers.update(body_serializers or {})
 
         self.headers_serializer = headers_serializer or \
-                                    ResponseHeadersSerializer()
+                                    ResponseHeaderSerializer()
 
     def serialize(self, response_data, content_type, action='default'):
         """Serialize a dict into a string and wrap in a wsgi.Request object.
@@ -329,7 +323,15 @@ class ResponseSerializer(object):
         response.headers['Content-Type'] = content_type
         if data is not None:
             serializer = self.get_body_serializer(content_type)
-            response.body = serializer.serialize(data, action)
+            chunks = iter(serializer.serialize_iter(data, action))
+            # A body of a single string keeps its Content-Length, longer
+            # ones are sent while they are serialized
+            head = list(itertools.islice(chunks, 2))
+            if len(head) < 2:
+                response.body = ''.join(head)
+            else:
+                response.app_iter = itertools.chain(head, chunks)
+                response.content_length = None
 
     def get_body_serializer(self, content_type):
         try:
@@ -341,6 +343,13 @@ class ResponseSerializer(object):
 class TextDeserializer(ActionDispatcher):
     """Default request body deserialization"""
 
+    def __init__(self, metadata=None):
+        """
+        :param metadata: information needed to deserialize text into
+                         a dictionary.
+        """
+        self.metadata = metadata or {}
+
     def deserialize(self, datastring, action='default'):
         return self.dispatch(datastring, action=action)
 
@@ -368,62 +377,96 @@ class XMLDeserializer(TextDeserializer):
         :param metadata: information needed to deserialize xml into
                          a dictionary.
         """
-        super(XMLDeserializer, self).__init__()
-        self.metadata = metadata or {}
+        super(XMLDeserializer, self).__init__(metadata)
+        self._plurals = frozenset(self.metadata.get('plurals', {}))
 
     def _from_xml(self, datastring):
-        plurals = set(self.metadata.get('plurals', {}))
         try:
-            node = minidom.parseString(datastring).childNodes[0]
-            return {node.nodeName: self._from_xml_node(node, plurals)}
+            name, value, links = xmlreader.parse(datastring, self._plurals,
+                                                 'atom:link')
         except expat.ExpatError:
             msg = _("cannot understand XML")
             raise exception.MalformedRequestBody(reason=msg)
+        result = {name: value}
+        if links:
+            result['%s_links' % name] = links
+        return result
 
-    def _from_xml_node(self, node, listnames):
-        """Convert a minidom node to a simple Python type.
-
-        :param listnames: list of XML node names whose subnodes should
-                          be considered list items.
+    def default(self, datastring):
+        return {'body': self._from_xml(datastring)}
 
-        """
-        if len(node.childNodes) == 1 and node.childNodes[0].nodeType == 3:
-            return node.childNodes[0].nodeValue
-        elif node.nodeName in listnames:
-            return [self._from_xml_node(n, listnames) for n in node.childNodes]
-        else:
-            result = dict()
-            for attr in node.attributes.keys():
-                result[attr] = node.attributes[attr].nodeValue
-            for child in node.childNodes:
-                if child.nodeType != node.TEXT_NODE:
-                    result[child.nodeName] = self._from_xml_node(child,
-                                                                 listnames)
-            return result
 
-    def find_first_child_named(self, parent, name):
-        """Search a nodes children for the first child with a given name"""
-        for node in parent.childNodes:
-            if node.nodeName == name:
-                return node
-        return None
+class ContentTypeRegistry(object):
+    """Body serializers and deserializers, by content type.
 
-    def find_children_named(self, parent, name):
-        """Return all of a nodes children who have the given name"""
-        for node in parent.childNodes:
-            if node.nodeName == name:
-                yield node
-
-    def extract_text(self, node):
-        """Get the text field contained by the given node"""
-        if len(node.childNodes) == 1:
-            child = node.childNodes[0]
-            if child.nodeType == child.TEXT_NODE:
-                return child.nodeValue
-        return ""
+    The serializers and deserializers of some serialization metadata
+    are built once, when they are first asked for, and shared by every
+    resource and request using them afterwards: neither they nor the
+    metadata they were built from may be modified.
+    """
 
-    def default(self, datastring):
-        return {'body': self._from_xml(datastring)}
+    def __init__(self):
+        # content types in order of preference
+        self.content_types = []
+        # content types by URI extension
+        self.formats = {}
+        self._serializer_classes = {}
+        self._deserializer_classes = {}
+        # (metadata, objects) by id of metadata, the metadata is kept
+        # so that its id is not reused
+        self._serializers = {}
+        self._deserializers = {}
+        self._legacy_serializers = {}
+
+    def register(self, format, content_type, serializer_class,
+                 deserializer_class):
+        """Handle content_type, named format in URIs, with the classes
+        of its body serializer and deserializer."""
+        if content_type not in self.content_types:
+            self.content_types.append(content_type)
+        self.formats[format] = content_type
+        self._serializer_classes[content_type] = serializer_class
+        self._deserializer_classes[content_type] = deserializer_class
+        self._serializers.clear()
+        self._deserializers.clear()
+
+    def _get(self, cache, key, metadata, build):
+        try:
+            return cache[key][1]
+        except KeyError:
+            pass
+        value = build()
+        cache[key] = (metadata, value)
+        return value
+
+    def get_serializers(self, metadata=None, xmlns=None):
+        """Return the shared body serializers for metadata and xmlns,
+        by content type."""
+        return self._get(self._serializers, (id(metadata), xmlns), metadata,
+                         lambda: dict((content_type, cls(metadata, xmlns))
+                                      for content_type, cls
+                                      in self._serializer_classes.items()))
+
+    def get_deserializers(self, metadata=None):
+        """Return the shared body deserializers for metadata, by content
+        type."""
+        return self._get(self._deserializers, id(metadata), metadata,
+                         lambda: dict((content_type, cls(metadata))
+                                      for content_type, cls
+                                      in self._deserializer_classes.items()))
+
+    def get_legacy_serializer(self, metadata=None, default_xmlns=None):
+        """Return the shared Serializer of metadata and default_xmlns."""
+        return self._get(self._legacy_serializers,
+                         (id(metadata), default_xmlns), metadata,
+                         lambda: Serializer(metadata, default_xmlns))
+
+
+CONTENT_TYPES = ContentTypeRegistry()
+CONTENT_TYPES.register('json', 'application/json', JSONDictSerializer,
+                       JSONDeserializer)
+CONTENT_TYPES.register('xml', 'application/xml', XMLDictSerializer,
+                       XMLDeserializer)
 
 
 class RequestHeadersDeserializer(ActionDispatcher):
@@ -440,10 +483,7 @@ class RequestDeserializer(object):
     """Break up a Request object into more useful pieces."""
 
     def __init__(self, body_deserializers=None, headers_deserializer=None):
-        self.body_deserializers = {
-            'application/xml': XMLDeserializer(),
-            'application/json': JSONDeserializer(),
-        }
+        self.body_deserializers = dict(CONTENT_TYPES.get_deserializers())
         self.body_deserializers.update(body_deserializers or {})
 
         self.headers_deserializer = headers_deserializer or \
@@ -745,9 +785,16 @@ class Resource(Application):
             action_result = Fault(ex, self._xmlns)
 
         if isinstance(action_result, dict) or action_result is None:
-            response = self.serializer.serialize(action_result,
-                                                 accept,
-                                                 action=action)
+            etag = request.get_response_etag()
+            if etag is not None and etag in request.if_none_match:
+                response = webob.Response(status=304)
+                del response.headers['Content-Type']
+            else:
+                response = self.serializer.serialize(action_result,
+                                                     accept,
+                                                     action=action)
+            if etag is not None:
+                response.etag = etag
         else:
             response = action_result
 
@@ -799,12 +846,11 @@ class Fault(webob.exc.HTTPException):
                 'detail': str(self.wrapped_exc.detail)}}
         # 'code' is an attribute on the fault tag itself
         metadata = {'application/xml': {'attributes': {fault_name: 'code'}}}
-        xml_serializer = XMLDictSerializer(metadata, self._xmlns)
         content_type = req.best_match_content_type()
-        serializer = {
-            'application/xml': xml_serializer,
-            'application/json': JSONDictSerializer(),
-        }[content_type]
+        if content_type == 'application/xml':
+            serializer = XMLDictSerializer(metadata, self._xmlns)
+        else:
+            serializer = CONTENT_TYPES.get_serializers()[content_type]
 
         self.wrapped_exc.body = serializer.serialize(fault_data)
         self.wrapped_exc.content_type = content_type
@@ -861,9 +907,10 @@ class Controller(object):
         MIME types to information needed to serialize to that type.
 
         """
-        _metadata = getattr(type(self), '_serialization_metadata', {})
+        _metadata = getattr(type(self), '_serialization_metadata', None)
 
-        serializer = Serializer(_metadata, default_xmlns)
+        serializer = CONTENT_TYPES.get_legacy_serializer(_metadata,
+                                                         default_xmlns)
         try:
             return serializer.serialize(data, content_type)
         except exception.InvalidContentType:
@@ -876,8 +923,8 @@ class Controller(object):
         MIME types to information needed to serialize to that type.
 
         """
-        _metadata = getattr(type(self), '_serialization_metadata', {})
-        serializer = Serializer(_metadata)
+        _metadata = getattr(type(self), '_serialization_metadata', None)
+        serializer = CONTENT_TYPES.get_legacy_serializer(_metadata)
         return serializer.deserialize(data, content_type)
 
     def get_default_xmlns(self, req):
@@ -899,6 +946,12 @@ class Serializer(object):
         """
         self.metadata = metadata or {}
         self.default_xmlns = default_xmlns
+        xmldata = self.metadata.get('application/xml', {})
+        self._xml_plan = xmlwriter.Plan(xmldata)
+        self._plurals = frozenset(xmldata.get('plurals', {}))
+        self._default_attrs = {}
+        if default_xmlns:
+            self._default_attrs['xmlns'] = default_xmlns
 
     def _get_serialize_handler(self, content_type):
         handlers = {
@@ -941,96 +994,14 @@ class Serializer(object):
         return utils.loads(datastring)
 
     def _from_xml(self, datastring):
-        xmldata = self.metadata.get('application/xml', {})
-        plurals = set(xmldata.get('plurals', {}))
-        node = minidom.parseString(datastring).childNodes[0]
-        return {node.nodeName: self._from_xml_node(node, plurals)}
-
-    def _from_xml_node(self, node, listnames):
-        """Convert a minidom node to a simple Python type.
-
-        listnames is a collection of names of XML nodes whose subnodes should
-        be considered list items.
-
-        """
-        if len(node.childNodes) == 1 and node.childNodes[0].nodeType == 3:
-            return node.childNodes[0].nodeValue
-        elif node.nodeName in listnames:
-            return [self._from_xml_node(n, listnames)
-                    for n in node.childNodes if n.nodeType != node.TEXT_NODE]
-        else:
-            result = dict()
-            for attr in node.attributes.keys():
-                result[attr] = node.attributes[attr].nodeValue
-            for child in node.childNodes:
-                if child.nodeType != node.TEXT_NODE:
-                    result[child.nodeName] = self._from_xml_node(child,
-                                                                 listnames)
-            return result
+        name, value, _links = xmlreader.parse(datastring, self._plurals)
+        return {name: value}
 
     def _to_json(self, data):
         return utils.dumps(data)
 
     def _to_xml(self, data):
-        metadata = self.metadata.get('application/xml', {})
         # We expect data to contain a single key which is the XML root.
         root_key = data.keys()[0]
-        doc = minidom.Document()
-        node = self._to_xml_node(doc, metadata, root_key, data[root_key])
-
-        xmlns = node.getAttribute('xmlns')
-        if not xmlns and self.default_xmlns:
-            node.setAttribute('xmlns', self.default_xmlns)
-
-        return node.toprettyxml(indent='', newl='')
-
-    def _to_xml_node(self, doc, metadata, nodename, data):
-        """Recursive method to convert data members to XML nodes."""
-        result = doc.createElement(nodename)
-
-        # Set the xml namespace if one is specified
-        # TODO(justinsb): We could also use prefixes on the keys
-        xmlns = metadata.get('xmlns', None)
-        if xmlns:
-            result.setAttribute('xmlns', xmlns)
-        if isinstance(data, list):
-            collections = metadata.get('list_collections', {})
-            if nodename in collections:
-                metadata = collections[nodename]
-                for item in data:
-                    node = doc.createElement(metadata['item_name'])
-                    node.setAttribute(metadata['item_key'], str(item))
-                    result.appendChild(node)
-                return result
-            singular = metadata.get('plurals', {}).get(nodename, None)
-            if singular is None:
-                if nodename.endswith('s'):
-                    singular = nodename[:-1]
-                else:
-                    singular = 'item'
-            for item in data:
-                node = self._to_xml_node(doc, metadata, singular, item)
-                result.appendChild(node)
-        elif isinstance(data, dict):
-            collections = metadata.get('dict_collections', {})
-            if nodename in collections:
-                metadata = collections[nodename]
-                for k, v in data.items():
-                    node = doc.createElement(metadata['item_name'])
-                    node.setAttribute(metadata['item_key'], str(k))
-                    text = doc.createTextNode(str(v))
-                    node.appendChild(text)
-                    result.appendChild(node)
-                return result
-            attrs = metadata.get('attributes', {}).get(nodename, {})
-            for k, v in data.items():
-                if k in attrs:
-                    result.setAttribute(k, str(v))
-                else:
-                    node = self._to_xml_node(doc, metadata, k, v)
-                    result.appendChild(node)
-        else:
-            # Type is atom.
-            node = doc.createTextNode(str(data))
-            result.appendChild(node)
-        return result
+        return self._xml_plan.to_xml(root_key, data[root_key],
+                                     default_attrs=self._default_attrs)
@@ -47,9 +47,11 @@ def create_net_with_attachments(client, net_name, iface_ids):
         nid = res["networks"]["network"]["id"]
         print "Created a new Virtual Network %s with ID:%s" % (net_name, nid)
 
-        for iface_id in iface_ids:
-            res = client.create_port(nid)
-            new_port_id = res["ports"]["port"]["id"]
+        # create all of the ports with a single request
+        data = {'ports': [{} for iface_id in iface_ids]}
+        res = client.create_port(nid, data)
+        for port, iface_id in zip(res["ports"], iface_ids):
+            new_port_id = port["id"]
             print "Created Virtual Port:%s " \
                 "on Virtual Network:%s" % (new_port_id, nid)
             data = {'port': {'attachment-id': '%s' % iface_id}}
@@ -0,0 +1,101 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2011 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Compares the XML serialization of network listings by
+wsgi.XMLDictSerializer with the minidom documents it used to build,
+and checks that both produce the same output.
+"""
+
+from optparse import OptionParser
+import sys
+import timeit
+from xml.dom import minidom
+
+from quantum.api import api_common as common
+from quantum.api import networks
+from quantum import wsgi
+
+
+def _to_xml_node(doc, metadata, nodename, data):
+    """The minidom serialization XMLDictSerializer used to implement"""
+    result = doc.createElement(nodename)
+    if isinstance(data, list):
+        singular = metadata.get('plurals', {}).get(nodename, None)
+        if singular is None:
+            singular = nodename.endswith('s') and nodename[:-1] or 'item'
+        for item in data:
+            result.appendChild(_to_xml_node(doc, metadata, singular, item))
+    elif isinstance(data, dict):
+        attrs = metadata.get('attributes', {}).get(nodename, {})
+        for k, v in data.items():
+            if k in attrs:
+                result.setAttribute(k, str(v))
+            else:
+                result.appendChild(_to_xml_node(doc, metadata, k, v))
+    else:
+        result.appendChild(doc.createTextNode(str(data)))
+    return result
+
+
+def minidom_serialize(metadata, data):
+    doc = minidom.Document()
+    node = _to_xml_node(doc, metadata, 'networks', data['networks'])
+    node.setAttribute('xmlns', common.XML_NS_V11)
+    return node.toxml('UTF-8')
+
+
+def networks_data(count, ports):
+    return {'networks': [{'id': "net-%d" % i,
+                          'name': "network %d" % i,
+                          'op-status': "UP",
+                          'ports': [{'id': "port-%d-%d" % (i, j),
+                                     'state': "ACTIVE",
+                                     'op-status': "UP",
+                                     'attachment': {'id': "vif-%d" % j}}
+                                    for j in range(ports)]}
+                         for i in range(count)]}
+
+
+def main():
+    usagestr = "Usage: %prog [OPTIONS]"
+    parser = OptionParser(usage=usagestr)
+    parser.add_option("-n", "--networks", dest="networks", type="int",
+                      default=1000, help="networks in the listing")
+    parser.add_option("-p", "--ports", dest="ports", type="int",
+                      default=4, help="ports per network")
+    parser.add_option("-r", "--repeat", dest="repeat", type="int",
+                      default=10, help="serializations timed")
+    options, args = parser.parse_args()
+
+    metadata = networks.ControllerV11._serialization_metadata
+    data = networks_data(options.networks, options.ports)
+    serializer = wsgi.XMLDictSerializer(metadata, common.XML_NS_V11)
+    if serializer.serialize(data) != minidom_serialize(metadata, data):
+        print "The serializations differ"
+        sys.exit(1)
+    for name, serialize in (("minidom", minidom_serialize),
+                            ("XMLDictSerializer",
+                             lambda metadata, data:
+                             serializer.serialize(data))):
+        seconds = timeit.timeit(lambda: serialize(metadata, data),
+                                number=options.repeat)
+        print "%-20s %8.2f ms" % (name, seconds * 1000 / options.repeat)
+
+
+if __name__ == "__main__":
+    main()